@@ -1,16 +1,26 @@
 import sys
 import json
-from typing import Dict, List
+from typing import Any, Dict, List
 import random
-from PySide6.QtCore import Qt, QPoint, Property, QThread, Signal, QSize
+import re
+from PySide6.QtCore import (
+    Qt, QPoint, Property, QThread, Signal, QSize, QAbstractTableModel, QModelIndex, QTimer
+)
 from PySide6.QtGui import QMouseEvent, QColor, QFont, QPainter, QPainterPath, QLinearGradient, QIcon
 from PySide6.QtWidgets import (
     QApplication, QWidget, QPushButton, QVBoxLayout, QHBoxLayout, QLabel,
     QFrame, QStackedWidget, QScrollArea, QTextEdit, QFileDialog, QSpinBox,
-    QGraphicsDropShadowEffect, QMessageBox, QDialog, QLineEdit, QProgressDialog
+    QGraphicsDropShadowEffect, QMessageBox, QDialog, QLineEdit, QProgressDialog, QCheckBox,
+    QDoubleSpinBox, QTableView, QHeaderView, QAbstractItemView
 )
-from openai import OpenAI
 import os
+import threading
+from evaluator_core import engine, clients, ratelimit, cache, backends, costs, resilience
+from evaluator_core.journal import RunJournal, journal_path, load_journal, count_records
+from evaluator_core.dataset import QuestionSource
+from evaluator_core.sink import write_combined, write_stream
+from evaluator_core import stages, batch
+from evaluator_core.runner import StageRunner
 
 class APIKeyDialog(QDialog):
     def __init__(self, parent=None):
@@ -98,6 +108,126 @@ class APIKeyDialog(QDialog):
         base_layout.addWidget(self.openai_base)
         openai_layout.addLayout(base_layout)
         
+        # 后端池配置文件：多个 base URL / key 之间负载均衡
+        backends_layout = QHBoxLayout()
+        backends_label = QLabel("后端池:")
+        backends_label.setFixedWidth(80)
+        self.backends_file = QLineEdit()
+        self.backends_file.setPlaceholderText("后端池配置文件（JSON，可选，配置后忽略上面的 key 和 base URL）")
+        self.backends_file.setText(os.getenv("OPENAI_BACKENDS_FILE", ""))
+        backends_browse = QPushButton("浏览")
+        backends_browse.clicked.connect(self.browse_backends_file)
+        backends_layout.addWidget(backends_label)
+        backends_layout.addWidget(self.backends_file)
+        backends_layout.addWidget(backends_browse)
+        openai_layout.addLayout(backends_layout)
+        
+        # 最大并发请求数
+        concurrency_layout = QHBoxLayout()
+        concurrency_label = QLabel("并发数:")
+        concurrency_label.setFixedWidth(80)
+        self.max_in_flight = QSpinBox()
+        self.max_in_flight.setRange(1, 256)
+        self.max_in_flight.setValue(engine.get_max_in_flight())
+        self.max_in_flight.setToolTip("同时在途的最大请求数")
+        concurrency_layout.addWidget(concurrency_label)
+        concurrency_layout.addWidget(self.max_in_flight)
+        pool_label = QLabel("连接池:")
+        self.pool_size = QSpinBox()
+        self.pool_size.setRange(1, 1024)
+        self.pool_size.setValue(clients.get_pool_size())
+        self.pool_size.setToolTip("每个 API 端点保持的最大连接数")
+        concurrency_layout.addWidget(pool_label)
+        concurrency_layout.addWidget(self.pool_size)
+        concurrency_layout.addStretch()
+        openai_layout.addLayout(concurrency_layout)
+        
+        # 单次运行的预算
+        cost_layout = QHBoxLayout()
+        cost_label = QLabel("预算:")
+        cost_label.setFixedWidth(80)
+        self.run_budget = QDoubleSpinBox()
+        self.run_budget.setRange(0, 1000000)
+        self.run_budget.setDecimals(2)
+        self.run_budget.setPrefix("$")
+        self.run_budget.setValue(costs.get_budget() or 0)
+        self.run_budget.setToolTip("每次运行的费用上限（美元），0 表示不限制。接近上限时不再开始新的问题、"
+                                   "有分歧的问题不再质检，用尽后停止；推迟的问题可在提高预算后继续")
+        cost_layout.addWidget(cost_label)
+        cost_layout.addWidget(self.run_budget)
+        cost_layout.addStretch()
+        openai_layout.addLayout(cost_layout)
+        
+        # 响应缓存
+        cache_layout = QHBoxLayout()
+        cache_label = QLabel("缓存:")
+        cache_label.setFixedWidth(80)
+        self.cache_enabled = QCheckBox("使用响应缓存")
+        self.cache_enabled.setChecked(cache.cache_enabled())
+        self.cache_enabled.setToolTip("相同模型、提示词和参数的请求直接复用本地缓存的结果")
+        self.cache_bypass = QCheckBox("刷新缓存")
+        self.cache_bypass.setChecked(cache.bypass_enabled())
+        self.cache_bypass.setToolTip("不读取缓存，重新请求并覆盖缓存中的结果")
+        cache_layout.addWidget(cache_label)
+        cache_layout.addWidget(self.cache_enabled)
+        cache_layout.addWidget(self.cache_bypass)
+        cache_layout.addStretch()
+        openai_layout.addLayout(cache_layout)
+        
+        # 批处理模式
+        batch_layout = QHBoxLayout()
+        batch_label = QLabel("批处理:")
+        batch_label.setFixedWidth(80)
+        self.batch_mode = QCheckBox("使用 Batch API（费用更低，结果通常在 24 小时内返回）")
+        self.batch_mode.setChecked(batch.batch_enabled())
+        self.batch_mode.setToolTip("适合不需要即时结果的大批量任务，提交后按固定间隔轮询结果")
+        batch_layout.addWidget(batch_label)
+        batch_layout.addWidget(self.batch_mode)
+        batch_layout.addStretch()
+        openai_layout.addLayout(batch_layout)
+        
+        # 合并评测请求
+        sample_layout = QHBoxLayout()
+        sample_label = QLabel("评测:")
+        sample_label.setFixedWidth(80)
+        self.multi_sample = QCheckBox("两位评测员合并为一次请求（n=2）")
+        self.multi_sample.setChecked(stages.multi_sample_enabled())
+        self.multi_sample.setToolTip("一次请求返回两份独立评分，提示词只计费一次；后端不支持 n 参数时自动改为分别请求")
+        self.structured_scores = QCheckBox("结构化评分输出")
+        self.structured_scores.setChecked(stages.structured_enabled())
+        self.structured_scores.setToolTip("评分请求使用 JSON schema 约束回复格式，避免格式错误重新请求；后端不支持时自动改用文本格式")
+        sample_layout.addWidget(sample_label)
+        sample_layout.addWidget(self.multi_sample)
+        sample_layout.addWidget(self.structured_scores)
+        sample_layout.addStretch()
+        openai_layout.addLayout(sample_layout)
+        
+        # 自适应评测组
+        panel_layout = QHBoxLayout()
+        panel_label = QLabel("评测组:")
+        panel_label.setFixedWidth(80)
+        max_judges, se_target = stages.panel_settings()
+        self.panel_adaptive = QCheckBox("自适应追加评测员（代替质检模型）")
+        self.panel_adaptive.setChecked(stages.panel_enabled())
+        self.panel_adaptive.setToolTip("评分分歧超过目标时逐个追加评测员，最终分数取评测组均值")
+        self.panel_max_judges = QSpinBox()
+        self.panel_max_judges.setRange(2, 20)
+        self.panel_max_judges.setValue(max_judges)
+        self.panel_max_judges.setToolTip("每个问题最多使用的评测员数量")
+        self.panel_se_target = QDoubleSpinBox()
+        self.panel_se_target.setRange(0.01, 5.0)
+        self.panel_se_target.setSingleStep(0.05)
+        self.panel_se_target.setValue(se_target)
+        self.panel_se_target.setToolTip("评分均值的标准误低于该值时停止追加评测员")
+        panel_layout.addWidget(panel_label)
+        panel_layout.addWidget(self.panel_adaptive)
+        panel_layout.addWidget(QLabel("上限:"))
+        panel_layout.addWidget(self.panel_max_judges)
+        panel_layout.addWidget(QLabel("标准误:"))
+        panel_layout.addWidget(self.panel_se_target)
+        panel_layout.addStretch()
+        openai_layout.addLayout(panel_layout)
+        
         # Model Selection and System Content
         models_group = QFrame()
         models_group.setObjectName("config-group")
@@ -122,6 +252,8 @@ class APIKeyDialog(QDialog):
         answer_header.addWidget(answer_label)
         answer_header.addWidget(self.answer_model)
         answer_layout.addLayout(answer_header)
+        budget_layout, self.answer_rpm, self.answer_tpm = self.create_budget_layout("answer")
+        answer_layout.addLayout(budget_layout)
         
         answer_content_label = QLabel("System Content:")
         self.answer_content = QTextEdit()
@@ -148,6 +280,8 @@ class APIKeyDialog(QDialog):
         eval_header.addWidget(eval_label)
         eval_header.addWidget(self.eval_model)
         eval_layout.addLayout(eval_header)
+        budget_layout, self.eval_rpm, self.eval_tpm = self.create_budget_layout("evaluate")
+        eval_layout.addLayout(budget_layout)
         
         eval_content_label = QLabel("System Content:")
         self.eval_content = QTextEdit()
@@ -197,6 +331,8 @@ class APIKeyDialog(QDialog):
         quality_header.addWidget(quality_label)
         quality_header.addWidget(self.quality_model)
         quality_layout.addLayout(quality_header)
+        budget_layout, self.quality_rpm, self.quality_tpm = self.create_budget_layout("quality")
+        quality_layout.addLayout(budget_layout)
         
         quality_content_label = QLabel("System Content:")
         self.quality_content = QTextEdit()
@@ -273,10 +409,10 @@ class APIKeyDialog(QDialog):
                 font-weight: bold;
                 margin-bottom: 10px;
             }
-            QLabel {
+            QLabel, QCheckBox {
                 color: #ecf0f1;
             }
-            QLineEdit {
+            QLineEdit, QSpinBox {
                 background-color: #2c3e50;
                 color: #ecf0f1;
                 border: 2px solid #34495e;
@@ -310,6 +446,33 @@ class APIKeyDialog(QDialog):
             }
         """)
 
+    def browse_backends_file(self):
+        file_name, _ = QFileDialog.getOpenFileName(self, "选择后端池配置", "", "JSON Files (*.json)")
+        if file_name:
+            self.backends_file.setText(file_name)
+
+    def create_budget_layout(self, stage):
+        # 每个模型的 RPM/TPM 配额，0 表示不限制
+        rpm, tpm = ratelimit.stage_budget(stage)
+        layout = QHBoxLayout()
+        rpm_label = QLabel("RPM:")
+        rpm_label.setFixedWidth(80)
+        rpm_input = QSpinBox()
+        rpm_input.setRange(0, 10000000)
+        rpm_input.setValue(rpm)
+        rpm_input.setToolTip("每分钟请求数上限，0 表示不限制")
+        tpm_label = QLabel("TPM:")
+        tpm_input = QSpinBox()
+        tpm_input.setRange(0, 100000000)
+        tpm_input.setValue(tpm)
+        tpm_input.setToolTip("每分钟 token 数上限，0 表示不限制")
+        layout.addWidget(rpm_label)
+        layout.addWidget(rpm_input)
+        layout.addWidget(tpm_label)
+        layout.addWidget(tpm_input)
+        layout.addStretch()
+        return layout, rpm_input, tpm_input
+
     def import_settings(self):
         try:
             file_name, _ = QFileDialog.getOpenFileName(self, "导入配置", "", "JSON Files (*.json)")
@@ -320,12 +483,29 @@ class APIKeyDialog(QDialog):
                     # Load API settings
                     self.openai_key.setText(settings.get('openai_api_key', ''))
                     self.openai_base.setText(settings.get('openai_api_base', ''))
+                    self.backends_file.setText(settings.get('backends_file', ''))
+                    self.max_in_flight.setValue(int(settings.get('max_in_flight', engine.DEFAULT_MAX_IN_FLIGHT)))
+                    self.pool_size.setValue(int(settings.get('pool_size', clients.DEFAULT_POOL_SIZE)))
+                    self.run_budget.setValue(float(settings.get('run_budget', 0)))
+                    self.cache_enabled.setChecked(bool(settings.get('cache_enabled', True)))
+                    self.cache_bypass.setChecked(bool(settings.get('cache_bypass', False)))
+                    self.batch_mode.setChecked(bool(settings.get('batch_mode', False)))
+                    self.multi_sample.setChecked(bool(settings.get('multi_sample', True)))
+                    self.structured_scores.setChecked(bool(settings.get('structured_scores', True)))
+                    self.panel_adaptive.setChecked(bool(settings.get('panel_adaptive', False)))
+                    self.panel_max_judges.setValue(int(settings.get('panel_max_judges', stages.DEFAULT_PANEL_MAX_JUDGES)))
+                    self.panel_se_target.setValue(float(settings.get('panel_se_target', stages.DEFAULT_PANEL_SE_TARGET)))
                     
                     # Load model settings
                     self.answer_model.setText(settings.get('answer_model', 'gpt-3.5-turbo'))
                     self.eval_model.setText(settings.get('eval_model', 'gpt-4'))
                     self.quality_model.setText(settings.get('quality_model', 'gpt-4'))
                     
+                    # Load rate limits
+                    for name in ['answer', 'eval', 'quality']:
+                        getattr(self, f'{name}_rpm').setValue(int(settings.get(f'{name}_rpm', 0)))
+                        getattr(self, f'{name}_tpm').setValue(int(settings.get(f'{name}_tpm', 0)))
+                    
                     # Load system contents
                     self.answer_content.setText(settings.get('answer_content', ''))
                     self.eval_content.setText(settings.get('eval_content', ''))
@@ -342,9 +522,27 @@ class APIKeyDialog(QDialog):
                 settings = {
                     'openai_api_key': self.openai_key.text(),
                     'openai_api_base': self.openai_base.text(),
+                    'backends_file': self.backends_file.text(),
+                    'max_in_flight': self.max_in_flight.value(),
+                    'pool_size': self.pool_size.value(),
+                    'run_budget': self.run_budget.value(),
+                    'cache_enabled': self.cache_enabled.isChecked(),
+                    'cache_bypass': self.cache_bypass.isChecked(),
+                    'batch_mode': self.batch_mode.isChecked(),
+                    'multi_sample': self.multi_sample.isChecked(),
+                    'structured_scores': self.structured_scores.isChecked(),
+                    'panel_adaptive': self.panel_adaptive.isChecked(),
+                    'panel_max_judges': self.panel_max_judges.value(),
+                    'panel_se_target': self.panel_se_target.value(),
                     'answer_model': self.answer_model.text(),
                     'eval_model': self.eval_model.text(),
                     'quality_model': self.quality_model.text(),
+                    'answer_rpm': self.answer_rpm.value(),
+                    'answer_tpm': self.answer_tpm.value(),
+                    'eval_rpm': self.eval_rpm.value(),
+                    'eval_tpm': self.eval_tpm.value(),
+                    'quality_rpm': self.quality_rpm.value(),
+                    'quality_tpm': self.quality_tpm.value(),
                     'answer_content': self.answer_content.toPlainText(),
                     'eval_content': self.eval_content.toPlainText(),
                     'quality_content': self.quality_content.toPlainText()
@@ -422,216 +620,380 @@ class AITextEdit(QTextEdit):
         """)
         self.setFont(QFont("Consolas", 10))
 
+# 结果表格中问题、答案和理由列显示的字符数，完整内容见悬停提示或双击一行后的详情
+PREVIEW_CHARS = 120
+# 结果先在模型中累积，按这个间隔（毫秒）成批刷新到表格，避免每条结果都触发一次重绘
+RESULT_FLUSH_INTERVAL = 200
+
+def _preview(text) -> str:
+    return " ".join(str(text).split())[:PREVIEW_CHARS] if text is not None else ""
+
+def _natural_key(text: str):
+    # 按自然顺序排序问题 ID，q2 排在 q10 之前
+    return [int(part) if part.isdigit() else part for part in re.split(r"(\d+)", text)]
+
+class ResultTableModel(QAbstractTableModel):
+    # 结果表格的数据模型：每个问题一行，表格只读取可见的单元格，数据量大时界面也不会卡住。
+    # 运行中的结果经 record 逐条写入，按 RESULT_FLUSH_INTERVAL 成批刷新；支持排序和按两位评测员的分数差筛选
+    COLUMNS = ("ID", "问题", "答案", "评分 1", "评分 2", "最终分数", "理由")
+    # 每行保存的字段
+    ANSWER, SCORE1, SCORE2, FINAL, REASON1, REASON2, FINAL_REASON = range(7)
+    # 阶段 -> (分数字段, 理由字段)，答案阶段只有答案
+    STAGE_FIELDS = {
+        "answers": (ANSWER, None),
+        "scores1": (SCORE1, REASON1),
+        "scores2": (SCORE2, REASON2),
+        "final_scores": (FINAL, FINAL_REASON),
+    }
+    SCORE_COLUMNS = {3: SCORE1, 4: SCORE2, 5: FINAL}
+    rows_changed = Signal(int, int)  # (显示的行数, 总行数)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.questions = {}
+        self.rows: Dict[str, list] = {}
+        self.qids: List[str] = []  # 所有问题，按结果到达的顺序
+        self.order: List[str] = []  # 表格中显示的问题，已筛选和排序
+        self.position: Dict[str, int] = {}
+        self.arrival: Dict[str, int] = {}  # 问题到达的序号，排序键相同时按到达顺序排列
+        self.keys: Dict[str, Any] = {}  # 排序或筛选时，表格中每个问题当前的排序键
+        self.question_previews: Dict[str, str] = {}
+        self.id_keys: Dict[str, list] = {}  # 问题 ID 的自然排序键，排序时按需计算并缓存
+        self.sort_column = -1
+        self.sort_order = Qt.AscendingOrder
+        self.min_gap = 0.0  # 只显示分数差不小于该值的问题，0 表示不筛选
+        self.dirty = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(RESULT_FLUSH_INTERVAL)
+        self.timer.timeout.connect(self.flush)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.order)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.COLUMNS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        qid = self.order[index.row()]
+        column = index.column()
+        row = self.rows[qid]
+        if role == Qt.DisplayRole:
+            if column == 0:
+                return qid
+            if column == 1:
+                return self.question_preview(qid)
+            if column == 2:
+                return _preview(row[self.ANSWER])
+            if column in self.SCORE_COLUMNS:
+                value = row[self.SCORE_COLUMNS[column]]
+                return "" if value is None else f"{value:g}"
+            return _preview(self.reason(row))
+        if role == Qt.ToolTipRole:
+            if column == 2:
+                return row[self.ANSWER]
+            if column == 6:
+                return self.reason(row) or None
+        if role == Qt.TextAlignmentRole and column in self.SCORE_COLUMNS:
+            return Qt.AlignCenter
+        return None
+
+    def reason(self, row) -> str:
+        # 有最终评分时显示质检的分析，否则显示评测员的理由
+        for field in (self.FINAL_REASON, self.REASON1, self.REASON2):
+            if row[field]:
+                return row[field]
+        return ""
+
+    def question_preview(self, qid: str) -> str:
+        # 问题集可能是按需从文件读取的 QuestionSource，只在单元格可见时读取并缓存预览
+        preview = self.question_previews.get(qid)
+        if preview is None:
+            preview = self.question_previews[qid] = _preview(self.questions.get(qid))
+        return preview
+
+    def load_question_previews(self):
+        # 按问题排序时需要全部问题，顺序读一遍问题集，比逐条随机读取快得多
+        if len(self.question_previews) >= len(self.qids):
+            return
+        wanted = {qid for qid in self.qids if qid not in self.question_previews}
+        if not wanted:
+            return
+        for qid, question in self.questions.items():
+            if qid in wanted:
+                self.question_previews[qid] = _preview(question)
+        for qid in wanted:
+            self.question_previews.setdefault(qid, "")
+
+    def new_row(self, qid: str) -> list:
+        row = self.rows.get(qid)
+        if row is None:
+            row = self.rows[qid] = [None] * 7
+            self.arrival[qid] = len(self.qids)
+            self.qids.append(qid)
+        return row
+
+    def set_field(self, stage: str, qid: str, value):
+        field, reason_field = self.STAGE_FIELDS[stage]
+        row = self.new_row(qid)
+        if reason_field is None:
+            row[field] = value
+        else:
+            row[field] = value["score"]
+            row[reason_field] = value["reason"]
+
+    def load(self, data: dict):
+        # 整体替换为 current_data 中的结果，用于加载问题集和恢复进度
+        self.timer.stop()
+        self.dirty.clear()
+        self.beginResetModel()
+        self.questions = data.get("questions") or {}
+        self.rows = {}
+        self.qids = []
+        self.arrival = {}
+        self.question_previews = {}
+        self.id_keys = {}
+        for stage, (field, reason_field) in self.STAGE_FIELDS.items():
+            value = data.get(stage)
+            if not value:
+                continue
+            if reason_field is None:
+                for qid, answer in value.items():
+                    self.new_row(qid)[field] = answer
+            else:
+                reasons = value.get("reasons", {})
+                for qid, score in value["scores"].items():
+                    row = self.new_row(qid)
+                    row[field] = score
+                    row[reason_field] = reasons.get(qid)
+        self.order = self.visible()
+        self.position = {qid: n for n, qid in enumerate(self.order)}
+        self.endResetModel()
+        self.rows_changed.emit(len(self.order), len(self.qids))
+
+    def record(self, stage: str, qid: str, value):
+        # 连接到 ModelThread.result_recorded，在界面线程中执行
+        if stage not in self.STAGE_FIELDS:
+            return
+        self.set_field(stage, qid, value)
+        self.dirty.add(qid)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def flush(self):
+        # 把累积的结果刷新到表格：没有排序和筛选时只追加新行、通知变化的行，
+        # 否则只把变化的行插入、移动到排序后的位置，不重新排列整个表格
+        self.timer.stop()
+        if not self.dirty:
+            return
+        dirty, self.dirty = self.dirty, set()
+        if self.sort_column >= 0 or self.min_gap > 0:
+            self.place(dirty)
+            return
+        start = len(self.order)
+        if len(self.qids) > start:
+            self.beginInsertRows(QModelIndex(), start, len(self.qids) - 1)
+            for n, qid in enumerate(self.qids[start:], start):
+                self.order.append(qid)
+                self.position[qid] = n
+            self.endInsertRows()
+        changed = [self.position[qid] for qid in dirty if self.position[qid] < start]
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), len(self.COLUMNS) - 1))
+        self.rows_changed.emit(len(self.order), len(self.qids))
+
+    def shown(self, qid: str) -> bool:
+        if self.min_gap <= 0:
+            return True
+        row = self.rows[qid]
+        s1, s2 = row[self.SCORE1], row[self.SCORE2]
+        return s1 is not None and s2 is not None and abs(s1 - s2) >= self.min_gap
+
+    def sort_key(self):
+        # 返回当前排序列的排序键函数；None 表示没有分数，无论升序降序都排在最后
+        rows = self.rows
+        column = self.sort_column
+        if column < 0:
+            return lambda qid: 0
+        if column == 0:
+            keys = self.id_keys
+
+            def key(qid):
+                value = keys.get(qid)
+                if value is None:
+                    value = keys[qid] = _natural_key(qid)
+                return value
+            return key
+        if column in self.SCORE_COLUMNS:
+            field = self.SCORE_COLUMNS[column]
+            return lambda qid: rows[qid][field]
+        if column == 1:
+            return self.question_preview
+        if column == 2:
+            return lambda qid: rows[qid][self.ANSWER] or ""
+        return lambda qid: self.reason(rows[qid])
+
+    def visible(self) -> List[str]:
+        qids = self.qids
+        if self.min_gap > 0:
+            qids = [qid for qid in qids if self.shown(qid)]
+        if self.sort_column < 0 and self.min_gap <= 0:
+            self.keys = {}
+            return list(qids)
+        if self.sort_column == 1:
+            self.load_question_previews()
+        key = self.sort_key()
+        keys = self.keys = {qid: key(qid) for qid in qids}
+        if self.sort_column < 0:
+            return list(qids)
+        # sorted 是稳定的，排序键相同的问题保持到达顺序，与 locate 的比较规则一致
+        scored = [qid for qid in qids if keys[qid] is not None]
+        missing = [qid for qid in qids if keys[qid] is None]
+        return sorted(scored, key=keys.__getitem__, reverse=self.sort_order == Qt.DescendingOrder) + missing
+
+    def locate(self, qid: str, key, skip: int = -1) -> int:
+        # 二分查找 qid 按排序键 key 应插入 order 的位置，skip 为查找时跳过的行（该问题原来的位置）
+        order, keys, arrival = self.order, self.keys, self.arrival
+        reverse = self.sort_order == Qt.DescendingOrder
+        rank = arrival[qid]
+        lo, hi = 0, len(order) - (skip >= 0)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = order[mid + 1 if 0 <= skip <= mid else mid]
+            other_key = keys[other]
+            if key == other_key:
+                before = rank < arrival[other]
+            elif key is None or other_key is None:
+                before = other_key is None
+            else:
+                before = key > other_key if reverse else key < other_key
+            if before:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def place(self, dirty):
+        # 排序或筛选时逐行更新：新问题插入到排序后的位置，分数变化的问题移动到新位置，
+        # 不再满足筛选条件的问题移除。选中的行跟随问题移动
+        key = self.sort_key()
+        keys = self.keys
+        parent = QModelIndex()
+        for qid in sorted(dirty, key=self.arrival.__getitem__):
+            if qid in keys:
+                # 用旧的排序键找到当前位置：qid 本身排在插入位置的前一行
+                row = self.locate(qid, keys[qid]) - 1
+                if not self.shown(qid):
+                    self.beginRemoveRows(parent, row, row)
+                    del self.order[row]
+                    del keys[qid]
+                    self.endRemoveRows()
+                    continue
+                value = key(qid)
+                target = self.locate(qid, value, row)
+                keys[qid] = value
+                if target != row:
+                    self.beginMoveRows(parent, row, row, parent, target if target < row else target + 1)
+                    del self.order[row]
+                    self.order.insert(target, qid)
+                    self.endMoveRows()
+            elif self.shown(qid):
+                value = key(qid)
+                target = self.locate(qid, value)
+                self.beginInsertRows(parent, target, target)
+                self.order.insert(target, qid)
+                keys[qid] = value
+                self.endInsertRows()
+        changed = [self.locate(qid, keys[qid]) - 1 for qid in dirty if qid in keys]
+        if changed:
+            self.dataChanged.emit(self.index(min(changed), 0), self.index(max(changed), len(self.COLUMNS) - 1))
+        self.rows_changed.emit(len(self.order), len(self.qids))
+
+    def relayout(self):
+        # 排序或筛选条件改变时重新筛选和排序，选中的行跟随问题移动
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        moved = [(self.order[index.row()], index.column()) for index in old]
+        self.order = self.visible()
+        # position 只在没有排序和筛选时由 flush 增量维护，排序或筛选时由 keys 和 locate 定位
+        self.position = {qid: n for n, qid in enumerate(self.order)}
+        self.changePersistentIndexList(old, [
+            self.index(self.position[qid], column) if qid in self.position else QModelIndex()
+            for qid, column in moved
+        ])
+        self.layoutChanged.emit()
+        self.rows_changed.emit(len(self.order), len(self.qids))
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # 表头点击时调用，column 为 -1 时恢复结果到达的顺序
+        self.flush()
+        self.sort_column = column
+        self.sort_order = order
+        self.relayout()
+
+    def set_min_gap(self, gap: float):
+        self.flush()
+        self.min_gap = gap
+        self.relayout()
+
+    def qid_at(self, row: int) -> str:
+        return self.order[row]
+
+    def detail(self, qid: str) -> str:
+        # 双击一行时在下方显示该问题的完整内容
+        row = self.rows[qid]
+        parts = [f"问题 {qid}:\n{self.questions.get(qid, '')}"]
+        if row[self.ANSWER] is not None:
+            parts.append(f"答案:\n{row[self.ANSWER]}")
+        for title, field, reason_field in (("评测员 1", self.SCORE1, self.REASON1),
+                                           ("评测员 2", self.SCORE2, self.REASON2),
+                                           ("质量检查", self.FINAL, self.FINAL_REASON)):
+            if row[field] is not None:
+                parts.append(f"{title} 分数: {row[field]}\n原因: {row[reason_field]}")
+        return "\n\n".join(parts)
+
 class ModelThread(QThread):
+    # 在 Qt 线程中执行 StageRunner，把回调转成信号
     result_ready = Signal(dict)
     error_occurred = Signal(str)
+    warning_occurred = Signal(str)  # 个别问题失败等不影响其余问题的提示
     progress_updated = Signal(int)  # 新增进度信号
+    result_recorded = Signal(str, str, object)  # 每完成一个问题的一个阶段发出 (阶段, 问题 ID, 结果)
 
-    def __init__(self, input_data: dict, model_type: str):
+    def __init__(self, input_data: dict, model_type: str, evaluator_num: int = 1, journal=None, resume=None,
+                 use_batch=None, tracker=None):
         super().__init__()
-        self.input_data = input_data
-        self.model_type = model_type
-        self.openai_client = None
         self.result = None  # 添加result属性
-        self.setup_clients()
-
-    def setup_clients(self):
-        try:
-            # Initialize OpenAI client with custom base URL
-            openai_api_key = os.getenv("OPENAI_API_KEY")
-            openai_api_base = os.getenv("OPENAI_API_BASE")
-            
-            if openai_api_key:
-                client_args = {"api_key": openai_api_key}
-                if openai_api_base:
-                    client_args["base_url"] = openai_api_base
-                self.openai_client = OpenAI(**client_args)
-        except Exception as e:
-            self.error_occurred.emit(f"Error setting up API clients: {str(e)}")
+        self.runner = StageRunner(
+            input_data, model_type, evaluator_num, journal, resume, use_batch,
+            on_progress=self.progress_updated.emit,
+            on_error=self.error_occurred.emit,
+            on_result=self.result_recorded.emit,
+            tracker=tracker,
+            on_warning=self.warning_occurred.emit,
+        )
 
     def run(self):
-        try:
-            if not self.openai_client:
-                self.error_occurred.emit("API client not initialized. Please set up API keys.")
-                return
-
-            if self.model_type == "answer":
-                self.result = self.generate_answers()
-            elif self.model_type == "evaluate":
-                self.result = self.evaluate_answers()
-            elif self.model_type == "quality":
-                self.result = self.quality_check()
+        self.result = self.runner.run()
+        if self.result is not None:
             self.result_ready.emit(self.result)
-        except Exception as e:
-            self.error_occurred.emit(str(e))
+
+    def cancel(self):
+        self.runner.cancel()
 
     def wait(self) -> None:
         super().wait()
         return self.result  # 返回结果
 
-    def generate_answers(self) -> dict:
-        answers = {}
-        try:
-            model_name = os.getenv("OPENAI_ANSWER_MODEL", "gpt-3.5-turbo")
-            system_content = os.getenv("OPENAI_ANSWER_CONTENT", "You are a helpful assistant that provides clear and concise answers.")
-            total = len(self.input_data)
-            for i, (qid, question) in enumerate(self.input_data.items(), 1):
-                completion = self.openai_client.chat.completions.create(
-                    model=model_name,
-                    messages=[
-                        {"role": "system", "content": system_content},
-                        {"role": "user", "content": question}
-                    ]
-                )
-                answers[qid] = completion.choices[0].message.content
-                self.progress_updated.emit(int(i * 100 / total))
-        except Exception as e:
-            self.error_occurred.emit(f"Error generating answers: {str(e)}")
-        return answers
-
-    def evaluate_answers(self) -> dict:
-        scores = {}
-        reasons = {}
-        try:
-            model_name = os.getenv("OPENAI_EVAL_MODEL", "gpt-4")
-            system_content = os.getenv("OPENAI_EVAL_CONTENT", """你是一位专业的评测专家。请严格按照以下格式对答案进行评分。注意：你必须严格遵守格式要求，否则评分将被拒绝并要求重新评分。
-
-格式要求：
-1. 必须首先输出"[分析理由]"标记，后跟详细分析
-2. 必须最后输出"[评分]"标记，后跟0-5之间的分数（可带一位小数）
-3. 不允许输出任何其他格式的内容
-4. 不允许更改标记的文字或格式
-
-评分标准：
-- 5分：完美的答案，准确、完整、清晰
-- 4分：很好的答案，有小的改进空间
-- 3分：基本合格的答案，但有明显缺陷
-- 2分：答案不够好，有重要内容缺失
-- 1分：答案质量差，大部分内容有问题
-- 0分：完全错误或文不对题
-
-分析要求：
-1. 分析必须具体指出答案的优点和缺点
-2. 分析必须与最终评分相符
-3. 分析必须客观公正，有理有据
-
-示例格式：
-[分析理由]该答案结构清晰，论述准确，但在细节描述上略有不足。优点：1. 主要概念解释准确；2. 逻辑性强。缺点：1. 缺少具体示例；2. 部分专业术语解释不够详细。
-[评分]4.5""")
-            total = len(self.input_data)
-            for i, (qid, answer) in enumerate(self.input_data.items(), 1):
-                max_retries = 3
-                retry_count = 0
-                while retry_count < max_retries:
-                    completion = self.openai_client.chat.completions.create(
-                        model=model_name,
-                        messages=[
-                            {"role": "system", "content": system_content},
-                            {"role": "user", "content": f"需要评分的答案: {answer}"}
-                        ]
-                    )
-                    response = completion.choices[0].message.content.strip()
-                    try:
-                        if '[分析理由]' in response and '[评分]' in response:
-                            reason = response.split('[评分]')[0].replace('[分析理由]', '').strip()
-                            score_text = response.split('[评分]')[1].strip()
-                            score = float(score_text)
-                            if 0 <= score <= 5:
-                                scores[qid] = score
-                                reasons[qid] = reason
-                                break
-                        retry_count += 1
-                        if retry_count == max_retries:
-                            scores[qid] = 2.5
-                            reasons[qid] = "多次评分格式错误，使用默认分数"
-                    except ValueError:
-                        retry_count += 1
-                        if retry_count == max_retries:
-                            scores[qid] = 2.5
-                            reasons[qid] = "多次评分格式错误，使用默认分数"
-                self.progress_updated.emit(int(i * 100 / total))
-        except Exception as e:
-            self.error_occurred.emit(f"评测过程出错: {str(e)}")
-        return {"scores": scores, "reasons": reasons}
-
-    def quality_check(self) -> dict:
-        final_scores = {}
-        reasons = {}
-        try:
-            model_name = os.getenv("OPENAI_QUALITY_MODEL", "gpt-4")
-            system_content = os.getenv("OPENAI_QUALITY_CONTENT", """你是一位资深的质量控制专家。请严格按照以下格式对存在分歧的评分进行分析。注意：你必须严格遵守格式要求，否则分析将被拒绝并要求重新评分。
-
-格式要求：
-1. 必须首先输出"[分析理由]"标记，后跟详细分析
-2. 必须最后输出"[评分]"标记，后跟0-5之间的分数（可带一位小数）
-3. 不允许输出任何其他格式的内容
-4. 不允许更改标记的文字或格式
-
-分析要求：
-1. 必须分析两位评分员的观点差异
-2. 必须结合问题和答案进行综合判断
-3. 必须给出详细的理由支持你的最终评分
-4. 分析必须客观公正，有理有据
-
-评分标准：
-- 5分：完美的答案，准确、完整、清晰
-- 4分：很好的答案，有小的改进空间
-- 3分：基本合格的答案，但有明显缺陷
-- 2分：答案不够好，有重要内容缺失
-- 1分：答案质量差，大部分内容有问题
-- 0分：完全错误或文不对题
-
-示例格式：
-[分析理由]评分员1给出4.5分，认为答案结构清晰但细节不足；评分员2给出3.5分，认为答案有明显疏漏。经过分析，我同意评分员1的观点，因为：1. 答案确实结构完整；2. 细节虽有不足但不影响整体质量；3. 评分员2对细节问题的考虑过重。
-[评分]4.2""")
-            questions = self.input_data['questions']
-            answers = self.input_data['answers']
-            scores1 = self.input_data['scores1']['scores']
-            scores2 = self.input_data['scores2']['scores']
-            reasons1 = self.input_data['scores1']['reasons']
-            reasons2 = self.input_data['scores2']['reasons']
-
-            total = len(questions)
-            for i, qid in enumerate(questions, 1):
-                score1 = scores1[qid]
-                score2 = scores2[qid]
-                if abs(score1 - score2) < 0.5:
-                    final_scores[qid] = (score1 + score2) / 2
-                    reasons[qid] = f"评分接近，取平均值。\n评分1原因：{reasons1[qid]}\n评分2原因：{reasons2[qid]}"
-                else:
-                    max_retries = 3
-                    retry_count = 0
-                    while retry_count < max_retries:
-                        completion = self.openai_client.chat.completions.create(
-                            model=model_name,
-                            messages=[
-                                {"role": "system", "content": system_content},
-                                {"role": "user", "content": f"Question: {questions[qid]}\nAnswer: {answers[qid]}\nScore 1: {score1} (Reason: {reasons1[qid]})\nScore 2: {score2} (Reason: {reasons2[qid]})\nAnalyze the scores and provide your final score with reasoning."}
-                            ]
-                        )
-                        response = completion.choices[0].message.content.strip()
-                        try:
-                            if '[分析理由]' in response and '[评分]' in response:
-                                reason = response.split('[评分]')[0].replace('[分析理由]', '').strip()
-                                score_text = response.split('[评分]')[1].strip()
-                                score = float(score_text)
-                                if 0 <= score <= 5:
-                                    final_scores[qid] = score
-                                    reasons[qid] = f"质检分析：{reason}\n原评分1原因：{reasons1[qid]}\n原评分2原因：{reasons2[qid]}"
-                                    break
-                            retry_count += 1
-                            if retry_count == max_retries:
-                                final_scores[qid] = (score1 + score2) / 2
-                                reasons[qid] = "多次质检格式错误，取平均值"
-                        except ValueError:
-                            retry_count += 1
-                            if retry_count == max_retries:
-                                final_scores[qid] = (score1 + score2) / 2
-                                reasons[qid] = "多次质检格式错误，取平均值"
-                self.progress_updated.emit(int(i * 100 / total))
-        except Exception as e:
-            self.error_occurred.emit(f"Error in quality check: {str(e)}")
-        return {"scores": final_scores, "reasons": reasons}
+# 加载问题集时在输入框中预览的条数
+PREVIEW_LIMIT = 200
 
 class MainWindow(QWidget):
     def __init__(self):
@@ -642,6 +1004,10 @@ class MainWindow(QWidget):
 
         self._drag_pos = None
         self.current_data = {}
+        self.journal = None  # 当前问题集的检查点日志
+        self.tracker = None  # 当前运行的费用统计，两位评测员共用一个
+        self.active_threads = []  # 当前运行的 ModelThread，取消时逐个中止
+        self.cancelled = False
         self.setup_ui()
         self.check_api_keys()
         
@@ -649,9 +1015,12 @@ class MainWindow(QWidget):
         self.progress = QProgressDialog(self)
         self.progress.setWindowModality(Qt.WindowModal)
         self.progress.setWindowTitle("处理中")
-        self.progress.setCancelButton(None)
+        self.progress.setCancelButtonText("取消")
+        self.progress.setAutoClose(False)
+        self.progress.setAutoReset(False)
         self.progress.setMinimumDuration(0)
         self.progress.setRange(0, 100)
+        self.progress.canceled.connect(self.cancel_run)
         self.progress.setStyleSheet("""
             QProgressDialog {
                 background-color: #1a1a2e;
@@ -671,7 +1040,7 @@ class MainWindow(QWidget):
         """)
 
     def check_api_keys(self):
-        if not os.getenv("OPENAI_API_KEY"):
+        if not any(os.getenv(name) for name in ("OPENAI_API_KEY", "OPENAI_BACKENDS", "OPENAI_BACKENDS_FILE")):
             self.show_api_key_dialog()
 
     def show_api_key_dialog(self):
@@ -683,11 +1052,35 @@ class MainWindow(QWidget):
                 os.environ["OPENAI_API_BASE"] = dialog.openai_base.text().strip()
             elif "OPENAI_API_BASE" in os.environ:
                 del os.environ["OPENAI_API_BASE"]
+            if dialog.backends_file.text().strip():
+                os.environ["OPENAI_BACKENDS_FILE"] = dialog.backends_file.text().strip()
+            elif "OPENAI_BACKENDS_FILE" in os.environ:
+                del os.environ["OPENAI_BACKENDS_FILE"]
             
             # Save model configurations
             os.environ["OPENAI_ANSWER_MODEL"] = dialog.answer_model.text().strip()
             os.environ["OPENAI_EVAL_MODEL"] = dialog.eval_model.text().strip()
             os.environ["OPENAI_QUALITY_MODEL"] = dialog.quality_model.text().strip()
+            os.environ["OPENAI_MAX_IN_FLIGHT"] = str(dialog.max_in_flight.value())
+            
+            # Save rate limits
+            for name, prefix in [("answer", "OPENAI_ANSWER"), ("eval", "OPENAI_EVAL"), ("quality", "OPENAI_QUALITY")]:
+                os.environ[f"{prefix}_RPM"] = str(getattr(dialog, f"{name}_rpm").value())
+                os.environ[f"{prefix}_TPM"] = str(getattr(dialog, f"{name}_tpm").value())
+            os.environ["OPENAI_POOL_SIZE"] = str(dialog.pool_size.value())
+            os.environ["OPENAI_RUN_BUDGET"] = str(dialog.run_budget.value())
+            os.environ["OPENAI_CACHE_ENABLED"] = "1" if dialog.cache_enabled.isChecked() else "0"
+            os.environ["OPENAI_CACHE_BYPASS"] = "1" if dialog.cache_bypass.isChecked() else "0"
+            os.environ["OPENAI_BATCH_MODE"] = "1" if dialog.batch_mode.isChecked() else "0"
+            os.environ["OPENAI_EVAL_MULTI_SAMPLE"] = "1" if dialog.multi_sample.isChecked() else "0"
+            os.environ["OPENAI_STRUCTURED_SCORES"] = "1" if dialog.structured_scores.isChecked() else "0"
+            os.environ["OPENAI_PANEL_ADAPTIVE"] = "1" if dialog.panel_adaptive.isChecked() else "0"
+            os.environ["OPENAI_PANEL_MAX_JUDGES"] = str(dialog.panel_max_judges.value())
+            os.environ["OPENAI_PANEL_SE_TARGET"] = str(dialog.panel_se_target.value())
+            # 密钥、地址或连接池大小可能已变化，之后的请求按新配置重新建立客户端
+            clients.reset()
+            backends.reset()
+            resilience.reset()
             
             # Save system contents
             os.environ["OPENAI_ANSWER_CONTENT"] = dialog.answer_content.toPlainText().strip()
@@ -793,10 +1186,50 @@ class MainWindow(QWidget):
         output_header.setObjectName("panel-header")
         output_layout.addWidget(output_header)
 
+        # 结果表格：支持排序（点击表头）和按两位评测员的分数差筛选
+        filter_layout = QHBoxLayout()
+        self.gap_filter = QDoubleSpinBox()
+        self.gap_filter.setRange(0, 5)
+        self.gap_filter.setSingleStep(0.5)
+        self.gap_filter.setPrefix("分歧 ≥ ")
+        self.gap_filter.setSpecialValueText("显示全部")
+        self.gap_filter.setToolTip("只显示两位评测员分数相差不少于该值的问题")
+        filter_layout.addWidget(self.gap_filter)
+        filter_layout.addStretch(1)
+        self.result_count = QLabel("")
+        filter_layout.addWidget(self.result_count)
+        output_layout.addLayout(filter_layout)
+
+        self.results_model = ResultTableModel(self)
+        self.results_model.rows_changed.connect(
+            lambda shown, total: self.result_count.setText(f"显示 {shown} / {total}")
+        )
+        self.gap_filter.valueChanged.connect(self.results_model.set_min_gap)
+        self.results_view = QTableView()
+        self.results_view.setModel(self.results_model)
+        self.results_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.results_view.setAlternatingRowColors(True)
+        self.results_view.setWordWrap(False)
+        self.results_view.setToolTip("双击一行查看完整内容")
+        # 固定行高、不按内容调整列宽，避免数据量大时逐行测量
+        self.results_view.verticalHeader().hide()
+        self.results_view.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.results_view.verticalHeader().setDefaultSectionSize(26)
+        header = self.results_view.horizontalHeader()
+        header.setStretchLastSection(True)
+        for column, width in enumerate((60, 120, 120, 55, 55, 65)):
+            header.resizeSection(column, width)
+        header.setSortIndicator(-1, Qt.AscendingOrder)
+        self.results_view.setSortingEnabled(True)
+        self.results_view.activated.connect(
+            lambda index: self.output_text.setText(self.results_model.detail(self.results_model.qid_at(index.row())))
+        )
+        output_layout.addWidget(self.results_view, 3)
+
         self.output_text = AITextEdit()
         self.output_text.setReadOnly(True)
-        self.output_text.setPlaceholderText("结果将在此显示...")
-        output_layout.addWidget(self.output_text)
+        self.output_text.setPlaceholderText("运行状态和费用将在此显示，双击表格中的一行查看完整内容...")
+        output_layout.addWidget(self.output_text, 1)
 
         save_btn = AIButton("保存结果")
         save_btn.clicked.connect(self.save_results)
@@ -821,6 +1254,11 @@ class MainWindow(QWidget):
         quality_btn.clicked.connect(self.quality_check)
         process_layout.addWidget(quality_btn)
 
+        pipeline_btn = AIButton("一键评测")
+        pipeline_btn.setToolTip("按问题流水线执行生成、评测和质检，三个模型同时工作")
+        pipeline_btn.clicked.connect(self.run_pipeline)
+        process_layout.addWidget(pipeline_btn)
+
         content_layout.addLayout(process_layout)
         container_layout.addWidget(content)
         
@@ -838,52 +1276,107 @@ class MainWindow(QWidget):
 
     def load_questions(self):
         try:
-            file_name, _ = QFileDialog.getOpenFileName(self, "加载问题", "", "JSON Files (*.json)")
+            file_name, _ = QFileDialog.getOpenFileName(
+                self, "加载问题", "", "Question Files (*.json *.jsonl *.ndjson);;JSON Files (*.json);;JSON Lines (*.jsonl *.ndjson)"
+            )
             if file_name:
-                with open(file_name, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    # 确保显示为UTF-8格式
-                    formatted_data = {}
-                    for key, value in data.items():
-                        formatted_data[key] = value
-                    self.current_data = {'questions': formatted_data}
-                    self.input_text.setText(json.dumps(formatted_data, ensure_ascii=False, indent=2))
+                # 问题集按需从文件中流式读取，界面上只预览前几条，避免大文件占满内存和卡住界面
+                questions = QuestionSource(file_name)
+                preview = questions.preview(PREVIEW_LIMIT)
+                self.current_data = {'questions': questions}
+                text = json.dumps(preview, ensure_ascii=False, indent=2)
+                if len(preview) == PREVIEW_LIMIT:
+                    text = f"// 仅预览前 {PREVIEW_LIMIT} 条问题，完整内容将在处理时从文件中读取\n{text}"
+                self.input_text.setText(text)
+                self.open_journal(file_name)
         except Exception as e:
             self.output_text.setText(f"加载文件出错: {str(e)}")
 
+    def open_journal(self, questions_file):
+        # 每个问题集对应一个检查点日志，发现上次未完成的进度时询问是否恢复
+        if self.journal:
+            self.journal.close()
+        path = journal_path(questions_file)
+        resumed = {}
+        if os.path.exists(path):
+            resumed = load_journal(path, self.current_data.get('questions'))
+            counts = count_records(resumed)
+            if any(counts.values()):
+                summary = "，".join(f"{stage} {count} 条" for stage, count in counts.items() if count)
+                reply = QMessageBox.question(
+                    self, "恢复进度",
+                    f"发现该问题集上次运行的进度（{summary}），是否恢复？\n选择“否”将清空进度重新开始。"
+                )
+                if reply != QMessageBox.Yes:
+                    resumed = {}
+        for stage, value in resumed.items():
+            if value:
+                self.current_data[stage] = value
+        self.journal = RunJournal(path, fresh=not resumed)
+        self.results_model.load(self.current_data)
+        if resumed:
+            self.output_text.setText("已恢复上次的进度，继续执行各阶段时只会处理未完成的问题。")
+
     def generate_answers(self):
         if not self.current_data.get('questions'):
             self.output_text.setText("请先加载问题。")
             return
 
-        # 设置进度条
-        self.progress.setLabelText("正在生成答案...")
-        self.progress.setValue(0)
-        self.progress.show()
+        self.start_run("正在生成答案...")
 
-        self.thread = ModelThread(self.current_data['questions'], "answer")
+        self.thread = ModelThread(
+            self.current_data['questions'], "answer",
+            journal=self.journal, resume=self.current_data.get('answers'), tracker=self.tracker
+        )
         self.thread.result_ready.connect(self.handle_answers)
         self.thread.error_occurred.connect(self.handle_error)
         
         # 更新进度条
         def update_progress(value):
-            self.progress.setValue(value)
+            self.set_progress(value)
         
         self.thread.progress_updated.connect(update_progress)
-        self.thread.start()
+        self.start_thread(self.thread)
 
     def evaluate_answers(self):
         if not self.current_data.get('answers'):
             self.output_text.setText("请先生成答案。")
             return
 
-        # 设置进度条
-        self.progress.setLabelText("正在评测答案...")
-        self.progress.setValue(0)
-        self.progress.show()
+        self.start_run("正在评测答案...")
+
+        if stages.panel_enabled():
+            # 自适应评测组只需第一位评测员，第二位评测员在质检阶段需要时才请求
+            self.eval_thread1 = ModelThread(
+                self.current_data['answers'], "evaluate", evaluator_num=1,
+                journal=self.journal, resume=self.current_data.get('scores1'), tracker=self.tracker
+            )
+            self.eval_thread1.result_ready.connect(lambda x: self.handle_evaluation(x, 1))
+            self.eval_thread1.error_occurred.connect(self.handle_error)
+            self.eval_thread1.progress_updated.connect(self.set_progress)
+            self.start_thread(self.eval_thread1)
+            return
+
+        if stages.multi_sample_enabled():
+            # 两位评测员的评分由一次 n=2 的请求取得，只需一个线程
+            self.eval_thread = ModelThread(
+                self.current_data['answers'], "evaluate_panel", journal=self.journal,
+                resume={k: self.current_data.get(k) for k in ('scores1', 'scores2')}, tracker=self.tracker
+            )
+            self.eval_thread.result_ready.connect(self.handle_panel_evaluation)
+            self.eval_thread.error_occurred.connect(self.handle_error)
+            self.eval_thread.progress_updated.connect(self.set_progress)
+            self.start_thread(self.eval_thread)
+            return
 
-        self.eval_thread1 = ModelThread(self.current_data['answers'], "evaluate")
-        self.eval_thread2 = ModelThread(self.current_data['answers'], "evaluate")
+        self.eval_thread1 = ModelThread(
+            self.current_data['answers'], "evaluate", evaluator_num=1,
+            journal=self.journal, resume=self.current_data.get('scores1'), tracker=self.tracker
+        )
+        self.eval_thread2 = ModelThread(
+            self.current_data['answers'], "evaluate", evaluator_num=2,
+            journal=self.journal, resume=self.current_data.get('scores2'), tracker=self.tracker
+        )
         
         self.eval_thread1.result_ready.connect(lambda x: self.handle_evaluation(x, 1))
         self.eval_thread2.result_ready.connect(lambda x: self.handle_evaluation(x, 2))
@@ -892,80 +1385,155 @@ class MainWindow(QWidget):
         
         # 更新进度条
         def update_progress(value):
-            self.progress.setValue(value // 2)  # 两个线程各占50%进度
+            self.set_progress(value // 2)  # 两个线程各占50%进度
         
         self.eval_thread1.progress_updated.connect(update_progress)
         self.eval_thread2.progress_updated.connect(lambda x: update_progress(x + 50))
         
-        self.eval_thread1.start()
-        self.eval_thread2.start()
+        self.start_thread(self.eval_thread1)
+        self.start_thread(self.eval_thread2)
 
     def quality_check(self):
-        if not all(k in self.current_data for k in ['questions', 'answers', 'scores1', 'scores2']):
+        required = ['questions', 'answers', 'scores1'] + ([] if stages.panel_enabled() else ['scores2'])
+        if not all(k in self.current_data for k in required):
             self.output_text.setText("请先完成评测。")
             return
 
-        # 设置进度条
-        self.progress.setLabelText("正在进行质量检查...")
-        self.progress.setValue(0)
-        self.progress.show()
+        self.start_run("正在进行质量检查...")
 
-        self.thread = ModelThread(self.current_data, "quality")
+        self.thread = ModelThread(
+            self.current_data, "quality",
+            journal=self.journal, resume=self.current_data.get('final_scores'), tracker=self.tracker
+        )
         self.thread.result_ready.connect(self.handle_quality)
         self.thread.error_occurred.connect(self.handle_error)
         
         # 更新进进度条
         def update_progress(value):
-            self.progress.setValue(value)
+            self.set_progress(value)
+        
+        self.thread.progress_updated.connect(update_progress)
+        self.start_thread(self.thread)
+
+    def run_pipeline(self):
+        if not self.current_data.get('questions'):
+            self.output_text.setText("请先加载问题。")
+            return
+
+        self.start_run("正在流水线评测...")
+
+        self.thread = ModelThread(
+            self.current_data['questions'], "pipeline",
+            journal=self.journal, resume=self.current_data, tracker=self.tracker
+        )
+        self.thread.result_ready.connect(self.handle_pipeline)
+        self.thread.error_occurred.connect(self.handle_error)
+        
+        # 更新进度条
+        def update_progress(value):
+            self.set_progress(value)
         
         self.thread.progress_updated.connect(update_progress)
-        self.thread.start()
+        self.start_thread(self.thread)
+
+    def start_run(self, label):
+        # 每次运行开始时重置进度条、取消状态和费用统计
+        self.progress.reset()
+        self.progress.setLabelText(label)
+        self.progress.setValue(0)
+        self.progress.show()
+        self.tracker = costs.CostTracker()
+        self.active_threads = []
+        self.cancelled = False
+        self.output_text.clear()
+
+    def start_thread(self, thread):
+        # 每完成一个问题的一个阶段，结果就写入表格；所有线程结束后才显示费用并关闭进度框
+        thread.result_recorded.connect(self.results_model.record)
+        thread.warning_occurred.connect(self.handle_warning)
+        thread.finished.connect(self.thread_finished)
+        self.active_threads.append(thread)
+        thread.start()
+
+    def thread_finished(self):
+        thread = self.sender()
+        if thread in self.active_threads:
+            self.active_threads.remove(thread)
+        if not self.active_threads:
+            # 线程的结果信号先于 finished 送达，费用显示在各线程的结果之后
+            self.show_costs()
+            self.progress.hide()
+
+    def set_progress(self, value):
+        # 取消后进度条显示"正在取消"，不再更新
+        if not self.cancelled:
+            self.progress.setValue(value)
+
+    def cancel_run(self):
+        # 停止供给新的问题并中止在途的请求；各线程返回已完成的部分结果，照常经 handle_* 显示和保存
+        if self.cancelled:
+            return
+        self.cancelled = True
+        self.progress.setLabelText("正在取消，已完成的结果会保留...")
+        self.progress.show()
+        for thread in self.active_threads:
+            if thread.isRunning():
+                thread.cancel()
+
+    def show_costs(self):
+        # 在结果后面附上本次运行的费用，预算不足时提示推迟的问题数
+        if self.tracker is None:
+            return
+        lines = [self.tracker.describe()]
+        if self.tracker.deferred_notice():
+            lines.append(self.tracker.deferred_notice())
+        if self.cancelled:
+            lines.append("已取消：已完成的结果已保留，重新运行即可从检查点继续")
+        self.output_text.append("\n" + "\n".join(lines))
 
     def handle_answers(self, result):
         self.current_data['answers'] = result
-        self.output_text.setText(json.dumps(result, ensure_ascii=False, indent=2))
-        self.progress.hide()
+        self.results_model.flush()
+        self.output_text.append(f"已生成 {len(result)} 个答案")
 
     def handle_evaluation(self, result, evaluator_num):
         self.current_data[f'scores{evaluator_num}'] = result
-        current_text = self.output_text.toPlainText()
-        formatted_output = []
-        for qid, score in result['scores'].items():
-            reason = result['reasons'][qid]
-            formatted_output.append(f"问题 {qid}:\n分数: {score}\n原因: {reason}\n")
-        
-        self.output_text.setText(f"{current_text}\n\n评测员 {evaluator_num} 评分:\n" + "\n".join(formatted_output))
-        if evaluator_num == 2:  # 当两个评测都完成时
-            self.progress.hide()
+        self.results_model.flush()
+        self.output_text.append(f"评测员 {evaluator_num} 已完成 {len(result['scores'])} 条评分")
+
+    def handle_panel_evaluation(self, result):
+        self.handle_evaluation(result['scores1'], 1)
+        self.handle_evaluation(result['scores2'], 2)
 
     def handle_quality(self, result):
         self.current_data['final_scores'] = result
-        formatted_output = []
-        for qid, score in result['scores'].items():
-            reason = result['reasons'][qid]
-            formatted_output.append(f"问题 {qid}:\n最终分数: {score}\n分析过程:\n{reason}\n")
-        
-        self.output_text.setText("质量检查结果:\n" + "\n".join(formatted_output))
-        self.progress.hide()
+        self.results_model.flush()
+        self.output_text.append(f"质量检查已完成 {len(result['scores'])} 条最终评分")
+
+    def handle_pipeline(self, result):
+        for stage, value in result.items():
+            self.current_data[stage] = value
+        self.handle_quality(result['final_scores'])
 
     def handle_error(self, error_msg):
-        self.output_text.setText(f"错误: {error_msg}")
-        self.progress.hide()
+        # 运行中的线程可能还会返回部分结果，进度框在所有线程结束时关闭
+        self.output_text.append(f"错误: {error_msg}")
+
+    def handle_warning(self, message):
+        self.output_text.append(f"警告: {message}")
 
     def save_results(self):
         try:
-            file_name, _ = QFileDialog.getSaveFileName(self, "保存结果", "", "JSON Files (*.json)")
+            file_name, _ = QFileDialog.getSaveFileName(
+                self, "保存结果", "", "JSON Files (*.json);;JSON Lines (*.jsonl)"
+            )
             if file_name:
-                # 格式化保存数据，包含所有评分和原因
-                save_data = {
-                    "questions": self.current_data['questions'],
-                    "answers": self.current_data['answers'],
-                    "evaluation_1": self.current_data['scores1'],
-                    "evaluation_2": self.current_data['scores2'],
-                    "final_evaluation": self.current_data['final_scores']
-                }
-                with open(file_name, 'w', encoding='utf-8') as f:
-                    json.dump(save_data, f, ensure_ascii=False, indent=2)
+                if file_name.lower().endswith(('.jsonl', '.ndjson')):
+                    # 结果流格式：每个问题的每个阶段一行
+                    write_stream(file_name, self.current_data)
+                else:
+                    # 按原有格式（questions/answers/evaluation_1/evaluation_2/final_evaluation）逐条写出
+                    write_combined(file_name, self.current_data.get('questions'), self.current_data.get)
         except Exception as e:
             self.output_text.setText(f"保存文件出错: {str(e)}")
 
@@ -981,6 +1549,16 @@ class MainWindow(QWidget):
     def mouseReleaseEvent(self, event: QMouseEvent):
         self._drag_pos = None
 
+    def closeEvent(self, event):
+        # 关闭窗口时中止仍在运行的请求，等线程写完检查点后再关闭日志
+        for thread in self.active_threads:
+            if thread.isRunning():
+                thread.cancel()
+                thread.wait()
+        if self.journal:
+            self.journal.close()
+        event.accept()
+
     def get_stylesheet(self):
         return """
         QWidget {
@@ -1038,6 +1616,24 @@ class MainWindow(QWidget):
             margin-bottom: 10px;
         }
         
+        QTableView {
+            background-color: #2c3e50;
+            alternate-background-color: #34495e;
+            color: #ecf0f1;
+            border: 2px solid #34495e;
+            border-radius: 8px;
+            gridline-color: #34495e;
+            selection-background-color: #3498db;
+        }
+        
+        QHeaderView::section {
+            background-color: #16213e;
+            color: #3498db;
+            border: none;
+            padding: 4px;
+            font-weight: bold;
+        }
+        
         QScrollBar:vertical {
             border: none;
             background: #2c3e50;
@@ -1169,6 +1765,10 @@ POST /quality-check
         "question_id": "问题内容",
         ...
     },
+    "answers": {
+        "question_id": "被评分的答案（可选，缺少时使用参考答案库或重新生成）",
+        ...
+    },
     "evaluation_1": {
         "scores": { ... },
         "reasons": { ... }
@@ -1179,6 +1779,36 @@ POST /quality-check
     }
 }
 
+4. 流水线评测（生成、两次评测、质检一次完成）
+POST /pipeline
+请求体：
+{
+    "questions": {
+        "question_id": "问题内容",
+        ...
+    }
+}
+响应 data 包含 answers、evaluation_1、evaluation_2、final_evaluation
+
+5. 异步任务（适合大批量数据，避免请求超时）
+POST /jobs/generate | /jobs/evaluate | /jobs/quality-check | /jobs/pipeline
+请求体与对应的同步接口相同，立即返回 202 和 job_id；任务队列已满时返回 429
+GET /jobs/<job_id>            查询状态（queued/running/succeeded/failed/cancelled）和进度
+GET /jobs/<job_id>/result     获取结果（未完成时返回 409，已取消的任务返回部分结果）
+POST /jobs/<job_id>/cancel    取消任务（在途的请求立即中止）
+GET /jobs                     列出任务
+GET /jobs/<job_id>/events     逐题结果和进度事件流（SSE；?format=ndjson 为每行一个 JSON）
+POST /jobs/<类型>?stream=ndjson  提交并直接以事件流作为响应（也可以是 stream=sse）
+
+6. 运行指标
+GET /metrics                  Prometheus 文本格式的调用次数、耗时、首字节时间、token、重试、缓存命中率和队列深度
+
+7. 费用与预算
+所有接口的请求体都可以带 budget（美元），接近预算时不再开始新的问题、有分歧的问题不再质检，用尽后停止。
+同步接口响应中的 costs、任务状态中的 costs 为按阶段、模型和问题汇总的 token 数和费用，
+其中 scoring 为评分回复的解析方式（结构化/容错解析）和格式错误重新请求的比例。
+请求体中已有的 answers、evaluation_1、evaluation_2、final_evaluation 视为已完成，不再重新请求。
+
 所有响应格式均为 JSON，包含状态码和数据：
 {
     "status": "success/error",
@@ -1265,131 +1895,10 @@ POST /quality-check
             self.stop_server()
 
     def start_server(self):
-        from flask import Flask, request, jsonify
-        import threading
-        
-        app = Flask(__name__)
+        # 接口实现在 evaluator_core.server 中，与命令行的 serve 子命令共用；Flask 只在启动服务时导入
+        from evaluator_core.server import create_app
         
-        @app.route('/generate', methods=['POST'])
-        def generate():
-            try:
-                data = request.get_json()
-                thread = ModelThread(data['questions'], "answer")
-                thread.start()
-                result = thread.wait()  # 等待并获取结果
-                if result is None:
-                    return jsonify({"status": "error", "message": "Failed to generate answers"}), 500
-                return jsonify({"status": "success", "data": result})
-            except Exception as e:
-                return jsonify({"status": "error", "message": str(e)}), 400
-        
-        @app.route('/evaluate', methods=['POST'])
-        def evaluate():
-            try:
-                data = request.get_json()
-                # 创建两个评测线程
-                thread1 = ModelThread(data['answers'], "evaluate")
-                thread2 = ModelThread(data['answers'], "evaluate")
-                
-                # 启动两个线程
-                thread1.start()
-                thread2.start()
-                
-                # 等待并获取两个评测结果
-                result1 = thread1.wait()
-                result2 = thread2.wait()
-                
-                if result1 is None or result2 is None:
-                    return jsonify({
-                        "status": "error", 
-                        "message": "Failed to evaluate answers"
-                    }), 500
-                
-                # 返回两个评测结果
-                return jsonify({
-                    "status": "success", 
-                    "data": {
-                        "evaluation_1": result1,
-                        "evaluation_2": result2
-                    }
-                })
-            except Exception as e:
-                return jsonify({
-                    "status": "error", 
-                    "message": str(e)
-                }), 400
-        
-        @app.route('/quality-check', methods=['POST'])
-        def quality_check():
-            try:
-                data = request.get_json()
-                
-                # 验证必要的数据是否存在
-                required_fields = ['questions', 'evaluation_1', 'evaluation_2']
-                if not all(field in data for field in required_fields):
-                    return jsonify({
-                        "status": "error",
-                        "message": f"Missing required fields. Need: {', '.join(required_fields)}"
-                    }), 400
-                
-                # 首先根据问题生成答案
-                answer_thread = ModelThread(data['questions'], "answer")
-                answer_thread.start()
-                answers = answer_thread.wait()
-                
-                if answers is None:
-                    return jsonify({
-                        "status": "error",
-                        "message": "Failed to generate answers"
-                    }), 500
-                
-                # 重新组织数据结构以匹配质量检查的处理逻辑
-                check_data = {
-                    'questions': data['questions'],
-                    'answers': answers,
-                    'scores1': data['evaluation_1'],
-                    'scores2': data['evaluation_2']
-                }
-                
-                # 进行质量检查
-                thread = ModelThread(check_data, "quality")
-                thread.start()
-                result = thread.wait()
-                
-                if result is None:
-                    return jsonify({
-                        "status": "error",
-                        "message": "Failed to perform quality check"
-                    }), 500
-                
-                # 返回质检结果，包含生成的答案
-                return jsonify({
-                    "status": "success",
-                    "data": {
-                        "answers": answers,  # 包含生成的答案
-                        "scores": result["scores"],
-                        "reasons": result["reasons"]
-                    }
-                })
-            except KeyError as e:
-                return jsonify({
-                    "status": "error",
-                    "message": f"Missing required field: {str(e)}"
-                }), 400
-            except Exception as e:
-                return jsonify({
-                    "status": "error",
-                    "message": str(e)
-                }), 400
-        
-        # 添加关闭服务器的路由
-        @app.route('/shutdown', methods=['GET'])
-        def shutdown():
-            func = request.environ.get('werkzeug.server.shutdown')
-            if func is None:
-                return jsonify({"status": "error", "message": "Not running with werkzeug server"}), 500
-            func()
-            return jsonify({"status": "success", "message": "Server shutting down..."})
+        app = create_app()
         
         def run_server():
             app.run(host='0.0.0.0', port=self.port_input.value())
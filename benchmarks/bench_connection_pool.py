@@ -0,0 +1,103 @@
+# 连接复用基准测试：统计 1000 次调用中建立的 TCP 连接数
+#
+# 在本地启动一个兼容 chat.completions 的假服务并统计它接受的连接数，分别模拟：
+#   before - 每个任务（一次 GUI 操作或一次 API 请求）都新建 OpenAI 客户端
+#   after  - 通过 evaluator_core.clients 复用进程级共享客户端
+#
+# 用法：python benchmarks/bench_connection_pool.py [--calls 1000] [--job-size 10]
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openai import AsyncOpenAI  # noqa: E402
+from evaluator_core import clients, engine  # noqa: E402
+
+RESPONSE = json.dumps({
+    "id": "chatcmpl-bench",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "bench",
+    "choices": [{"index": 0, "message": {"role": "assistant", "content": "ok"}, "finish_reason": "stop"}],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode()
+
+
+class CountingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    connections = 0
+
+    def process_request(self, request, client_address):
+        # 每接受一个新的 TCP 连接调用一次
+        self.connections += 1
+        super().process_request(request, client_address)
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(RESPONSE)))
+        self.end_headers()
+        self.wfile.write(RESPONSE)
+
+
+async def run_job(client, job_size):
+    async def call(qid, _):
+        await client.chat.completions.create(model="bench", messages=[{"role": "user", "content": qid}])
+
+    await engine.run_bounded(((f"q{i}", None) for i in range(job_size)), call, {})
+
+
+async def run_before(base_url, jobs, job_size):
+    for _ in range(jobs):
+        client = AsyncOpenAI(api_key="bench", base_url=base_url)
+        try:
+            await run_job(client, job_size)
+        finally:
+            await client.close()
+
+
+async def run_after(base_url, jobs, job_size):
+    for _ in range(jobs):
+        await run_job(clients.get_async_client("bench", base_url), job_size)
+
+
+def measure(name, runner, calls, job_size):
+    server = CountingServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    start = time.perf_counter()
+    engine.run(runner(base_url, calls // job_size, job_size))
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+    server.server_close()
+    per_1000 = server.connections * 1000 / calls
+    print(f"{name:<8}{calls:>8}{server.connections:>14}{per_1000:>18.1f}{elapsed:>12.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="统计每 1000 次调用的连接建立次数")
+    parser.add_argument("--calls", type=int, default=1000)
+    parser.add_argument("--job-size", type=int, default=10, help="每个任务包含的问题数")
+    args = parser.parse_args()
+
+    print(f"并发数 {engine.get_max_in_flight()}，连接池 {clients.get_pool_size()}，每个任务 {args.job_size} 个问题")
+    print(f"{'mode':<8}{'calls':>8}{'connections':>14}{'conn/1000 calls':>18}{'seconds':>12}")
+    measure("before", run_before, args.calls, args.job_size)
+    measure("after", run_after, args.calls, args.job_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+# 启动时间基准测试：比较命令行入口与 GUI 模块的冷启动导入耗时
+#
+# 每个场景在新的 Python 进程中执行，多次运行取中位数，同时检查是否加载了 Qt 和 Flask：
+#   cli-help   - python -m evaluator_core --help（只解析参数）
+#   cli-engine - 导入命令行执行评测时用到的引擎模块（evaluator_core.service）
+#   cli-serve  - 导入 HTTP 服务模块（会加载 Flask）
+#   gui        - 导入 ai_cluster_evaluator（加载 PySide6）
+#
+# 用法：python benchmarks/bench_startup.py [--runs 10] [--json]
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHECK = "import sys; print('loaded:' + ','.join(m for m in ('PySide6', 'flask', 'openai') if m in sys.modules))"
+
+SCENARIOS = {
+    "cli-help": ["-c", f"import sys; sys.argv = ['evaluator_core', '--help']; import runpy\n"
+                       f"try:\n    runpy.run_module('evaluator_core', run_name='__main__')\n"
+                       f"except SystemExit:\n    pass\n{CHECK}"],
+    "cli-engine": ["-c", f"import evaluator_core.cli, evaluator_core.service; {CHECK}"],
+    "cli-serve": ["-c", f"import evaluator_core.cli, evaluator_core.server; {CHECK}"],
+    "gui": ["-c", f"import ai_cluster_evaluator; {CHECK}"],
+}
+
+
+def measure(args, runs: int):
+    env = dict(os.environ, QT_QPA_PLATFORM=os.getenv("QT_QPA_PLATFORM", "offscreen"), PYTHONDONTWRITEBYTECODE="1")
+    timings = []
+    loaded = ""
+    for _ in range(runs):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, *args], cwd=ROOT, env=env, capture_output=True, text=True)
+        timings.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip())
+        lines = [line for line in proc.stdout.splitlines() if line.startswith("loaded:")]
+        loaded = lines[-1][len("loaded:"):] if lines else ""
+    return statistics.median(timings), min(timings), loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比较命令行与 GUI 的冷启动导入耗时")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    # 基线：空解释器的启动时间
+    baseline, _, _ = measure(["-c", "pass"], args.runs)
+    results = {}
+    for name, scenario in SCENARIOS.items():
+        median, best, loaded = measure(scenario, args.runs)
+        results[name] = {
+            "median_s": round(median, 4),
+            "min_s": round(best, 4),
+            "import_s": round(median - baseline, 4),
+            "loaded": loaded.split(",") if loaded else [],
+        }
+
+    if args.json:
+        print(json.dumps({"python_startup_s": round(baseline, 4), "scenarios": results}, indent=2))
+        return
+    print(f"空解释器启动：{baseline * 1000:.0f} ms（{args.runs} 次取中位数）")
+    print(f"{'场景':<12}{'中位数':>10}{'最快':>10}{'导入耗时':>10}  已加载")
+    for name, r in results.items():
+        print(f"{name:<12}{r['median_s'] * 1000:>8.0f}ms{r['min_s'] * 1000:>8.0f}ms"
+              f"{r['import_s'] * 1000:>8.0f}ms  {', '.join(r['loaded']) or '-'}")
+
+
+if __name__ == "__main__":
+    main()
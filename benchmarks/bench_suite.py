@@ -0,0 +1,238 @@
+# 吞吐量基准测试：在本地模拟服务上运行各阶段和 HTTP 接口，不消耗 API 费用
+#
+# 对每个数据集规模和并发数组合分别运行：
+#   stage:answer / stage:evaluate / stage:quality / stage:pipeline - 各阶段的执行逻辑（GUI 的 ModelThread 使用同一个 StageRunner）
+#   route:/generate / route:/evaluate / route:/quality-check / route:/pipeline - Flask 接口（测试客户端，不经过网络）
+# 模拟服务可设置延迟分布、429/5xx 比例、格式错误和接近正确格式的比例，以及是否支持结构化输出，见 mock_openai_server.py。
+# format_retries 为格式错误后重新请求的次数，recovered 为容错解析直接取出分数（省下重新请求）的回复数。
+# 结果写入 JSON（完整结果）和 CSV（每行一个场景），指定 --baseline 时与之前的结果对比吞吐量。
+#
+# 用法：python benchmarks/bench_suite.py [--sizes 20,100] [--concurrency 4,16] [--latency lognormal:0.05,0.5]
+#                                        [--rate-429 0.02] [--rate-5xx 0.01] [--malformed-rate 0.05]
+#                                        [--near-miss-rate 0.1] [--no-structured]
+#                                        [--output benchmarks/results] [--baseline old.json]
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 基准测试只使用模拟服务：关闭缓存、答案库和后端池，避免结果受本地状态影响
+for name in ("OPENAI_BACKENDS", "OPENAI_BACKENDS_FILE", "OPENAI_BATCH_MODE"):
+    os.environ.pop(name, None)
+os.environ.update(OPENAI_CACHE_ENABLED="0", OPENAI_ANSWER_STORE_ENABLED="0")
+
+from benchmarks import mock_openai_server as mock  # noqa: E402
+from evaluator_core import backends, clients, metrics, resilience, service, stages  # noqa: E402
+from evaluator_core.runner import StageRunner  # noqa: E402
+
+STAGES = ("answer", "evaluate", "quality", "pipeline")
+ROUTES = ("/generate", "/evaluate", "/quality-check", "/pipeline")
+CSV_FIELDS = (
+    "scenario", "size", "concurrency", "seconds", "questions_per_second", "requests", "requests_per_second",
+    "completions", "errors_429", "errors_5xx", "malformed", "near_miss", "format_retries", "recovered",
+    "prompt_tokens", "completion_tokens", "warnings", "complete",
+)
+
+
+def make_dataset(size: int, seed: int):
+    # 合成的问题、答案和两份评分，约一半问题两份评分分歧较大，会触发质检请求
+    rng = random.Random(seed)
+    questions = {f"q{i}": f"第 {i} 个测试问题：请解释 {rng.choice(['缓存', '并发', '限流', '重试'])} 的作用" for i in range(size)}
+    answers = {qid: f"模拟回答：{question}" for qid, question in questions.items()}
+    scores = {1: {"scores": {}, "reasons": {}}, 2: {"scores": {}, "reasons": {}}}
+    for qid in questions:
+        score = rng.choice([2.0, 3.0, 4.0])
+        gap = rng.choice([0.0, 2.0])
+        for n, value in ((1, score), (2, min(5.0, score + gap))):
+            scores[n]["scores"][qid] = value
+            scores[n]["reasons"][qid] = f"评测员{n}的理由"
+    return questions, answers, scores[1], scores[2]
+
+
+def stage_runners(stage: str, questions, answers, scores1, scores2):
+    if stage == "answer":
+        return [StageRunner(questions, "answer", use_batch=False)]
+    if stage == "evaluate":
+        if stages.multi_sample_enabled():
+            return [StageRunner(answers, "evaluate_panel", use_batch=False)]
+        return [StageRunner(answers, "evaluate", evaluator_num=n, use_batch=False) for n in (1, 2)]
+    if stage == "quality":
+        data = {"questions": questions, "answers": answers, "scores1": scores1, "scores2": scores2}
+        return [StageRunner(data, "quality", use_batch=False)]
+    return [StageRunner(questions, "pipeline", use_batch=False)]
+
+
+def count_results(result) -> int:
+    # 完成的问题数：含评分的结果取各份评分中最少的，只有答案时取答案数
+    if not isinstance(result, dict):
+        return 0
+    if "scores" in result:
+        return len(result["scores"])
+    sections = [v["scores"] for v in result.values() if isinstance(v, dict) and "scores" in v]
+    return min(len(scores) for scores in sections) if sections else len(result)
+
+
+def run_stage(stage: str, dataset):
+    warnings = []
+    runners = stage_runners(stage, *dataset)
+    for runner in runners:
+        runner.on_error = warnings.append
+    results = service.run_runners(runners)
+    complete = min(count_results(r) for r in results)
+    return complete, warnings
+
+
+def run_route(app, route: str, dataset):
+    questions, answers, scores1, scores2 = dataset
+    body = {
+        "/generate": {"questions": questions},
+        "/evaluate": {"answers": answers},
+        "/quality-check": {"questions": questions, "answers": answers,
+                           "evaluation_1": scores1, "evaluation_2": scores2},
+        "/pipeline": {"questions": questions},
+    }[route]
+    response = app.test_client().post(route, json=body)
+    payload = response.get_json() or {}
+    if response.status_code != 200:
+        return 0, [payload.get("message", f"HTTP {response.status_code}")]
+    return count_results(payload.get("data")), []
+
+
+def measure(server, scenario: str, size: int, concurrency: int, fn):
+    os.environ["OPENAI_MAX_IN_FLIGHT"] = str(concurrency)
+    server.state.reset_stats()
+    retries = metrics.FORMAT_RETRIES.total()
+    recovered = metrics.SCORE_PARSES.total(outcome="recovered")
+    start = time.perf_counter()
+    complete, warnings = fn()
+    seconds = time.perf_counter() - start
+    with server.state.lock:
+        stats = dict(server.state.stats)
+    return {
+        "scenario": scenario,
+        "size": size,
+        "concurrency": concurrency,
+        "seconds": round(seconds, 4),
+        "questions_per_second": round(size / seconds, 2) if seconds else None,
+        "requests": stats["requests"],
+        "requests_per_second": round(stats["requests"] / seconds, 2) if seconds else None,
+        "completions": stats["completions"],
+        "errors_429": stats["errors_429"],
+        "errors_5xx": stats["errors_5xx"],
+        "malformed": stats["malformed"],
+        "near_miss": stats["near_miss"],
+        "format_retries": int(metrics.FORMAT_RETRIES.total() - retries),
+        "recovered": int(metrics.SCORE_PARSES.total(outcome="recovered") - recovered),
+        "prompt_tokens": stats["prompt_tokens"],
+        "completion_tokens": stats["completion_tokens"],
+        "warnings": len(warnings),
+        "complete": complete,
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(results, baseline_path: str):
+    # 按 (场景, 规模, 并发数) 对比吞吐量变化
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {(r["scenario"], r["size"], r["concurrency"]): r for r in json.load(f)["results"]}
+    print(f"\n与 {baseline_path} 对比（questions/s）：")
+    for r in results:
+        old = baseline.get((r["scenario"], r["size"], r["concurrency"]))
+        if not old or not old["questions_per_second"]:
+            continue
+        change = (r["questions_per_second"] - old["questions_per_second"]) / old["questions_per_second"] * 100
+        print(f"{r['scenario']:<22}{r['size']:>6}{r['concurrency']:>6}"
+              f"{old['questions_per_second']:>10.2f} -> {r['questions_per_second']:<10.2f}{change:+.1f}%")
+
+
+def parse_ints(text: str):
+    return [int(v) for v in text.split(",") if v.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在本地模拟服务上测量各阶段和 HTTP 接口的吞吐量")
+    parser.add_argument("--sizes", default="20,100", help="数据集规模，逗号分隔")
+    parser.add_argument("--concurrency", default="4,16", help="并发数（OPENAI_MAX_IN_FLIGHT），逗号分隔")
+    parser.add_argument("--only", default="", help="只运行名称包含该字符串的场景，如 stage: 或 /pipeline")
+    parser.add_argument("--latency", default="lognormal:0.05,0.5", help="模拟服务的延迟分布")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-5xx", type=float, default=0.0)
+    parser.add_argument("--malformed-rate", type=float, default=0.05)
+    parser.add_argument("--near-miss-rate", type=float, default=0.0)
+    parser.add_argument("--no-structured", action="store_true", help="模拟不支持结构化输出的后端")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="429 响应中 Retry-After 的秒数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "results"), help="结果目录")
+    parser.add_argument("--baseline", help="之前的 JSON 结果，用于对比")
+    args = parser.parse_args()
+
+    profile = {
+        "latency": args.latency, "rate_429": args.rate_429, "rate_5xx": args.rate_5xx,
+        "malformed_rate": args.malformed_rate, "near_miss_rate": args.near_miss_rate,
+        "structured": not args.no_structured, "retry_after": args.retry_after, "seed": args.seed,
+    }
+    server = mock.start_server(**profile)
+    os.environ.update(OPENAI_API_KEY="bench", OPENAI_API_BASE=server.base_url)
+    clients.reset()
+    backends.reset()
+    resilience.reset()
+    from evaluator_core.server import create_app
+    app = create_app()
+
+    scenarios = [(f"stage:{stage}", lambda d, stage=stage: run_stage(stage, d)) for stage in STAGES]
+    scenarios += [(f"route:{route}", lambda d, route=route: run_route(app, route, d)) for route in ROUTES]
+    scenarios = [(name, fn) for name, fn in scenarios if args.only in name]
+
+    results = []
+    print(f"{'scenario':<22}{'size':>6}{'conc':>6}{'seconds':>10}{'q/s':>10}{'req':>8}{'429':>6}{'5xx':>6}{'bad':>6}{'retry':>6}{'fixed':>6}{'done':>6}")
+    for size in parse_ints(args.sizes):
+        dataset = make_dataset(size, args.seed)
+        for concurrency in parse_ints(args.concurrency):
+            for name, fn in scenarios:
+                r = measure(server, name, size, concurrency, lambda: fn(dataset))
+                results.append(r)
+                print(f"{r['scenario']:<22}{r['size']:>6}{r['concurrency']:>6}{r['seconds']:>10.2f}"
+                      f"{r['questions_per_second']:>10.2f}{r['requests']:>8}{r['errors_429']:>6}"
+                      f"{r['errors_5xx']:>6}{r['malformed']:>6}{r['format_retries']:>6}{r['recovered']:>6}"
+                      f"{r['complete']:>6}")
+
+    os.makedirs(args.output, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    json_path = os.path.join(args.output, f"bench-{stamp}.json")
+    csv_path = os.path.join(args.output, f"bench-{stamp}.csv")
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "revision": git_revision(),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "profile": profile,
+            "results": results,
+        }, f, ensure_ascii=False, indent=2)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS)
+        writer.writeheader()
+        writer.writerows(results)
+    print(f"\n结果已写入 {json_path} 和 {csv_path}")
+    if args.baseline:
+        compare(results, args.baseline)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
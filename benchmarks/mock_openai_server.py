@@ -0,0 +1,447 @@
+# 本地模拟的 OpenAI 兼容服务，用于在不消耗真实 API 费用的情况下测试和压测
+#
+# 支持的接口：
+#   POST /v1/chat/completions
+#   POST /v1/files, GET /v1/files/{id}, GET /v1/files/{id}/content
+#   POST /v1/batches, GET /v1/batches/{id}, POST /v1/batches/{id}/cancel
+#
+#   GET  /v1/mock/stats（请求数、注入的错误数、格式错误数和客户端中止的请求数），POST /v1/mock/reset（清零统计）
+#
+# 可模拟真实服务的延迟和故障：
+#   --latency        响应延迟分布：fixed:0.2、uniform:0.1,0.5、normal:0.3,0.1、lognormal:0.3,0.5（中位数,σ）、exp:0.3
+#   --rate-429       返回 429（带 Retry-After）的比例
+#   --rate-5xx       返回 500/502/503 的比例
+#   --malformed-rate 评测/质检回复不符合 "[分析理由]...[评分]x.x" 格式、无法解析的比例
+#   --near-miss-rate 评测/质检回复接近正确格式（全角括号、"4.5分"、多余文字等）的比例
+#   --no-structured  不支持 response_format（结构化输出），带该参数的请求返回 400
+#   --batch-expire-after  批处理任务执行这么多条请求后即过期（expired），其余请求没有结果
+# 批处理中失败的请求与真实服务一样写入错误文件（error_file_id），每行带 response.status_code
+#
+# 用法：python benchmarks/mock_openai_server.py --port 8001 [--latency lognormal:0.3,0.5 --rate-429 0.02]
+# 然后把 API Base 设置为 http://127.0.0.1:8001/v1 （API Key 任意）
+import argparse
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# 格式错误、无法取出分数的评分回复
+MALFORMED_OUTPUTS = (
+    "模拟分析：{user}",  # 缺少标记
+    "[分析理由]模拟分析：{user}\n[评分]",  # 缺少分数
+    "[分析理由]模拟分析：{user}\n[评分]满分",  # 分数不是数字
+)
+# 接近正确格式的评分回复，容错解析可以直接取出分数
+NEAR_MISS_OUTPUTS = (
+    "【分析理由】模拟分析：{user}\n【评分】{score}",  # 全角括号
+    "[分析理由]模拟分析：{user}\n[评分]：{score}分",  # 冒号和"分"
+    "[分析理由]模拟分析：{user}\n[评分]{score}\n以上评分仅供参考。",  # 评分后有多余文字
+    "**[分析理由]** 模拟分析：{user}\n**[评分]** {score}/5",  # Markdown 加粗和"/5"
+    "[评分]{score}",  # 缺少理由
+)
+SCORES = (1.5, 2.0, 3.0, 3.5, 4.0, 4.5, 5.0)
+
+
+class UnsupportedParameter(ValueError):
+    pass
+
+
+def parse_latency(spec: str):
+    # 返回 f(rng)，每次调用产生一个延迟（秒）；spec 为空或 0 时没有延迟
+    if not spec or spec in ("0", "none"):
+        return lambda rng: 0.0
+    kind, _, args = spec.partition(":")
+    try:
+        values = [float(v) for v in args.split(",")] if args else []
+        if kind == "fixed":
+            value, = values
+            return lambda rng: value
+        if kind == "uniform":
+            low, high = values
+            return lambda rng: rng.uniform(low, high)
+        if kind == "normal":
+            mean, std = values
+            return lambda rng: max(0.0, rng.gauss(mean, std))
+        if kind == "lognormal":
+            median, sigma = values
+            return lambda rng: median * math.exp(rng.gauss(0.0, sigma))
+        if kind == "exp":
+            mean, = values
+            return lambda rng: rng.expovariate(1.0 / mean)
+    except ValueError:
+        pass
+    raise ValueError(f"无法识别的延迟分布：{spec}")
+
+
+class MockState:
+    def __init__(self, batch_delay: float = 0.0, seed=None, latency: str = "", rate_429: float = 0.0,
+                 rate_5xx: float = 0.0, malformed_rate: float = 0.0, retry_after: float = 1.0,
+                 near_miss_rate: float = 0.0, structured: bool = True, batch_expire_after=None):
+        self.files = {}
+        self.batches = {}
+        self.batch_delay = batch_delay
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counter = itertools.count()
+        self.latency = parse_latency(latency)
+        self.rate_429 = rate_429
+        self.rate_5xx = rate_5xx
+        self.malformed_rate = malformed_rate
+        self.near_miss_rate = near_miss_rate
+        self.structured = structured
+        self.batch_expire_after = batch_expire_after
+        self.retry_after = retry_after
+        self.reset_stats()
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}-{uuid.uuid4().hex[:24]}"
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {
+                "requests": 0, "completions": 0, "choices": 0, "errors_429": 0, "errors_5xx": 0,
+                "malformed": 0, "near_miss": 0, "structured": 0, "aborted": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0,
+            }
+
+    def count(self, **amounts):
+        with self.lock:
+            for name, amount in amounts.items():
+                self.stats[name] += amount
+
+    def roll(self, rate: float) -> bool:
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.random.random() < rate
+
+    def next_latency(self) -> float:
+        with self.lock:
+            return self.latency(self.random)
+
+    def injected_error(self):
+        # 按配置的比例返回 (状态码, 消息)，不注入错误时返回 None
+        if self.roll(self.rate_429):
+            self.count(errors_429=1)
+            return 429, "Rate limit reached (injected by mock server)"
+        if self.roll(self.rate_5xx):
+            self.count(errors_5xx=1)
+            with self.lock:
+                status = self.random.choice([500, 502, 503])
+            return status, "Upstream error (injected by mock server)"
+        return None
+
+
+def chat_completion(state: MockState, body: dict) -> dict:
+    messages = body.get("messages") or []
+    system = next((m.get("content") or "" for m in messages if m.get("role") == "system"), "")
+    user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+    n = int(body.get("n") or 1)
+    structured = (body.get("response_format") or {}).get("type") == "json_schema"
+    if structured and not state.structured:
+        raise UnsupportedParameter("response_format is not supported by this server")
+    choices = []
+    for index in range(n):
+        if "[评分]" in system:
+            # 评测/质检类提示词要求 "[分析理由]...[评分]x.x" 格式，结构化输出时回复总是符合 JSON schema
+            with state.lock:
+                score = state.random.choice(SCORES)
+            if structured:
+                state.count(structured=1)
+                content = json.dumps({"reason": f"模拟分析：{user[:40]}", "score": score}, ensure_ascii=False)
+            elif state.roll(state.malformed_rate):
+                state.count(malformed=1)
+                with state.lock:
+                    template = state.random.choice(MALFORMED_OUTPUTS)
+                content = template.format(user=user[:40])
+            elif state.roll(state.near_miss_rate):
+                state.count(near_miss=1)
+                with state.lock:
+                    template = state.random.choice(NEAR_MISS_OUTPUTS)
+                content = template.format(user=user[:40], score=score)
+            else:
+                content = f"[分析理由]模拟分析：{user[:40]}\n[评分]{score}"
+        else:
+            content = f"模拟回答：{user[:200]}"
+        choices.append({
+            "index": index,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop",
+        })
+    prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 2 + 1
+    completion_tokens = sum(len(c["message"]["content"]) for c in choices) // 2 + 1
+    state.count(completions=1, choices=n, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+    return {
+        "id": f"chatcmpl-mock-{next(state.counter)}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": choices,
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def file_object(file_id: str, record: dict) -> dict:
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(record["content"]),
+        "created_at": record["created_at"],
+        "filename": record["filename"],
+        "purpose": record["purpose"],
+        "status": "processed",
+    }
+
+
+def run_batch(state: MockState, batch_id: str):
+    # 在后台线程中逐条执行批处理请求，生成输出文件后把任务标记为 completed
+    batch = state.batches[batch_id]
+    time.sleep(state.batch_delay)
+    batch["status"] = "in_progress"
+    lines = state.files[batch["input_file_id"]]["content"].decode("utf-8").splitlines()
+    outputs = []
+    errors = []
+    final_status = "completed"
+    for line in lines:
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if batch["status"] == "cancelling":
+            final_status = "cancelled"
+            break
+        if state.batch_expire_after is not None and len(outputs) + len(errors) >= state.batch_expire_after:
+            final_status = "expired"
+            break
+        status, error = 200, None
+        if state.roll(state.rate_5xx):
+            state.count(errors_5xx=1)
+            status, error = 500, {"message": "Upstream error (injected by mock server)", "type": "server_error"}
+        else:
+            try:
+                body = chat_completion(state, request["body"])
+            except UnsupportedParameter as e:
+                status, error = 400, {"message": str(e), "type": "invalid_request_error", "param": "response_format"}
+        record = {
+            "id": state.new_id("batch_req"),
+            "custom_id": request["custom_id"],
+            "response": {"status_code": status, "request_id": state.new_id("req"),
+                         "body": body if error is None else {"error": error}},
+            "error": None,
+        }
+        (outputs if error is None else errors).append(record)
+    for kind, records in (("output", outputs), ("error", errors)):
+        if not records:
+            continue
+        file_id = state.new_id("file")
+        state.files[file_id] = {
+            "content": "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8"),
+            "filename": f"{batch_id}_{kind}.jsonl",
+            "purpose": f"batch_{kind}",
+            "created_at": int(time.time()),
+        }
+        batch[f"{kind}_file_id"] = file_id
+    batch["request_counts"] = {"total": len(lines), "completed": len(outputs), "failed": len(errors)}
+    batch["status"] = final_status
+    batch[f"{final_status}_at"] = int(time.time())
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "MockOpenAI/1.0"
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def state(self) -> MockState:
+        return self.server.state
+
+    def send_json(self, payload, status: int = 200, headers=None):
+        data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        try:
+            self.end_headers()
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端取消了请求（例如运行被取消时中止的在途请求）
+            self.state.count(aborted=1)
+            self.close_connection = True
+
+    def send_error_json(self, status: int, message: str):
+        self.send_json({"error": {"message": message, "type": "invalid_request_error"}}, status)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        body = self.read_body()
+        path = self.path.split("?")[0]
+        if path.endswith("/chat/completions"):
+            self.chat_completions(json.loads(body))
+        elif path.endswith("/mock/reset"):
+            self.state.reset_stats()
+            self.send_json(self.state.stats)
+        elif path.endswith("/files"):
+            self.upload_file(body)
+        elif path.endswith("/batches"):
+            self.create_batch(json.loads(body))
+        elif re.search(r"/batches/[^/]+/cancel$", path):
+            batch = self.state.batches.get(path.split("/")[-2])
+            if batch is None:
+                return self.send_error_json(404, "batch not found")
+            if batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+                batch["status"] = "cancelling"
+            self.send_json(batch)
+        else:
+            self.send_error_json(404, f"unknown endpoint {path}")
+
+    def chat_completions(self, body: dict):
+        self.state.count(requests=1)
+        delay = self.state.next_latency()
+        if delay > 0:
+            self.state.count(latency_seconds=delay)
+            time.sleep(delay)
+        error = self.state.injected_error()
+        if error is not None:
+            status, message = error
+            headers = {"Retry-After": f"{self.state.retry_after:g}"} if status == 429 else None
+            error_type = "rate_limit_error" if status == 429 else "server_error"
+            return self.send_json({"error": {"message": message, "type": error_type}}, status, headers)
+        try:
+            self.send_json(chat_completion(self.state, body))
+        except UnsupportedParameter as e:
+            self.send_error_json(400, str(e))
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path.endswith("/mock/stats"):
+            with self.state.lock:
+                return self.send_json(dict(self.state.stats))
+        match = re.search(r"/files/([^/]+)(/content)?$", path)
+        if match:
+            record = self.state.files.get(match.group(1))
+            if record is None:
+                return self.send_error_json(404, "file not found")
+            if match.group(2):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(len(record["content"])))
+                self.end_headers()
+                self.wfile.write(record["content"])
+            else:
+                self.send_json(file_object(match.group(1), record))
+            return
+        match = re.search(r"/batches/([^/]+)$", path)
+        if match:
+            batch = self.state.batches.get(match.group(1))
+            if batch is None:
+                return self.send_error_json(404, "batch not found")
+            return self.send_json(batch)
+        self.send_error_json(404, f"unknown endpoint {path}")
+
+    def upload_file(self, body: bytes):
+        message = BytesParser(policy=HTTP).parsebytes(
+            f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode("utf-8") + body
+        )
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+        filename, content = fields.get("file", (None, b""))
+        purpose = (fields.get("purpose", (None, b"batch"))[1] or b"batch").decode("utf-8")
+        file_id = self.state.new_id("file")
+        self.state.files[file_id] = {
+            "content": content,
+            "filename": filename or "upload.jsonl",
+            "purpose": purpose,
+            "created_at": int(time.time()),
+        }
+        self.send_json(file_object(file_id, self.state.files[file_id]))
+
+    def create_batch(self, body: dict):
+        if body.get("input_file_id") not in self.state.files:
+            return self.send_error_json(400, "input file not found")
+        batch_id = self.state.new_id("batch")
+        self.state.batches[batch_id] = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": body.get("endpoint"),
+            "input_file_id": body["input_file_id"],
+            "completion_window": body.get("completion_window", "24h"),
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": body.get("metadata"),
+            "output_file_id": None,
+            "error_file_id": None,
+        }
+        threading.Thread(target=run_batch, args=(self.state, batch_id), daemon=True).start()
+        self.send_json(self.state.batches[batch_id])
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, state: MockState):
+        super().__init__(address, MockHandler)
+        self.state = state
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+
+def start_server(port: int = 0, host: str = "127.0.0.1", **options) -> MockServer:
+    # 在后台线程中启动，port=0 时自动选择空闲端口，通过 server.base_url 获取地址
+    server = MockServer((host, port), MockState(**options))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的 OpenAI 兼容服务（chat.completions 与 batch）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--batch-delay", type=float, default=0.0, help="批处理任务开始执行前等待的秒数")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--latency", default="", help="响应延迟分布，如 fixed:0.2、uniform:0.1,0.5、lognormal:0.3,0.5")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="返回 429 的比例（0-1）")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="返回 500/502/503 的比例（0-1）")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="评分回复格式错误的比例（0-1）")
+    parser.add_argument("--near-miss-rate", type=float, default=0.0,
+                        help="评分回复接近正确格式、可容错解析的比例（0-1）")
+    parser.add_argument("--no-structured", action="store_true", help="不支持结构化输出（response_format）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 响应中 Retry-After 的秒数")
+    parser.add_argument("--batch-expire-after", type=int, default=None,
+                        help="批处理任务执行这么多条请求后即过期，其余请求没有结果")
+    args = parser.parse_args()
+
+    state = MockState(batch_delay=args.batch_delay, seed=args.seed, latency=args.latency, rate_429=args.rate_429,
+                      rate_5xx=args.rate_5xx, malformed_rate=args.malformed_rate, retry_after=args.retry_after,
+                      near_miss_rate=args.near_miss_rate, structured=not args.no_structured,
+                      batch_expire_after=args.batch_expire_after)
+    server = MockServer((args.host, args.port), state)
+    print(f"模拟服务已启动：{server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
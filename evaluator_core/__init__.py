@@ -0,0 +1,9 @@
+# AI 集群评测系统的核心执行引擎（不依赖 Qt）
+
+
+def __getattr__(name):
+    # from evaluator_core import Evaluator；按需导入，命令行等只用到部分模块的场景不必加载 openai
+    if name == "Evaluator":
+        from evaluator_core.sdk import Evaluator
+        return Evaluator
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,117 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Mapping, Optional
+
+# 参考答案库：记录每个问题在某个回答模型下生成过的答案，质检时直接复用被评分的那份答案。
+# 与响应缓存不同，这里不按容量淘汰，也不受"刷新缓存"影响。同一个键保留最近一次生成的答案：
+# 重新生成答案后评分针对的是新答案，质检也应当拿到这一份
+DEFAULT_STORE_PATH = os.path.join(os.path.expanduser("~"), ".ai_cluster_evaluator", "answers.sqlite")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+logger = logging.getLogger(__name__)
+
+
+def answer_key(question: str, model: str, system_content: str) -> str:
+    # 同一问题、同一模型和回答提示词视为同一份参考答案
+    payload = json.dumps([model, system_content, question], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class AnswerStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, question: str, model: str, system_content: str) -> Optional[str]:
+        row = self._connect().execute(
+            "SELECT answer FROM answers WHERE key = ?", (answer_key(question, model, system_content),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def put(self, question: str, model: str, system_content: str, answer: str):
+        self._connect().execute(
+            "INSERT INTO answers (key, model, question, answer, created_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET answer = excluded.answer, created_at = excluded.created_at",
+            (answer_key(question, model, system_content), model, question, answer, time.time()),
+        )
+
+    def lookup(self, questions: Mapping[str, str], model: str, system_content: str) -> Dict[str, str]:
+        # 返回 {qid: 参考答案}，没有记录的问题不出现在结果中
+        found = {}
+        for qid, question in questions.items():
+            answer = self.get(question, model, system_content)
+            if answer is not None:
+                found[qid] = answer
+        return found
+
+
+def store_enabled() -> bool:
+    return os.getenv("OPENAI_ANSWER_STORE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+
+def get_store() -> Optional[AnswerStore]:
+    # 答案库只是附带的记录，无法创建（目录不可写、文件损坏等）时返回 None，按未启用处理
+    if not store_enabled():
+        return None
+    path = os.getenv("OPENAI_ANSWER_STORE_PATH") or DEFAULT_STORE_PATH
+    with _stores_lock:
+        if path not in _stores:
+            try:
+                _stores[path] = AnswerStore(path)
+            except (OSError, sqlite3.Error) as e:
+                # 只提示一次，本进程内不再尝试
+                logger.warning("参考答案库 %s 不可用：%s", path, e)
+                _stores[path] = None
+        return _stores[path]
+
+
+def lookup(questions: Mapping[str, str], model: str, system_content: str) -> Dict[str, str]:
+    # 查询参考答案，答案库不可用或出错时返回空结果
+    store = get_store()
+    if store is None:
+        return {}
+    try:
+        return store.lookup(questions, model, system_content)
+    except sqlite3.Error as e:
+        logger.warning("读取参考答案库失败：%s", e)
+        return {}
+
+
+def remember(question: str, model: str, system_content: str, answer: str):
+    # 记录新生成的答案；答案库出错不影响正常流程
+    store = get_store()
+    if store is None or answer is None:
+        return
+    try:
+        store.put(question, model, system_content, answer)
+    except sqlite3.Error as e:
+        logger.warning("写入参考答案库失败：%s", e)
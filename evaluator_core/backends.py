@@ -0,0 +1,286 @@
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import openai
+
+from evaluator_core import clients, engine
+from evaluator_core.ratelimit import RateLimiter
+
+# 后端池配置：OPENAI_BACKENDS 为 JSON 字符串，或 OPENAI_BACKENDS_FILE 指向 JSON 文件，内容为后端列表：
+# [
+#   {"name": "vllm-1", "base_url": "http://10.0.0.1:8000/v1", "api_key": "EMPTY",
+#    "weight": 2, "models": ["qwen2-72b"]},
+#   {"name": "openai", "api_key_env": "OPENAI_API_KEY", "models": ["gpt-4", "gpt-3.5-turbo"],
+#    "rpm": 500, "tpm": 80000, "limits": {"gpt-4": {"rpm": 100, "tpm": 40000}}}
+# ]
+# models 省略表示支持所有模型；rpm/tpm 为该后端每个模型的配额，limits 可按模型单独设置，0 表示不限制。
+# 没有配置后端池时沿用 OPENAI_API_KEY / OPENAI_API_BASE 单一端点。
+
+# 连续失败多少次后摘除，摘除时长（秒）按次数翻倍，最长 MAX_EJECT_SECONDS
+DEFAULT_EJECT_AFTER = 3
+DEFAULT_EJECT_SECONDS = 30.0
+MAX_EJECT_SECONDS = 300.0
+# 主动健康检查间隔（秒），0 表示只在摘除时间到期后用下一个真实请求试探
+DEFAULT_HEALTH_INTERVAL = 15.0
+
+# 这些错误说明后端本身不可用，计入失败次数并换一个后端重试；其余错误（如 400）与后端无关，直接抛出
+BACKEND_ERRORS = (openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+
+class NoBackendAvailable(RuntimeError):
+    pass
+
+
+class Backend:
+    def __init__(self, name: str, api_key: str, base_url: Optional[str] = None, weight: float = 1.0,
+                 models: Optional[Iterable[str]] = None, rpm: int = 0, tpm: int = 0,
+                 limits: Optional[Dict[str, Dict[str, int]]] = None):
+        self.name = name
+        self.api_key = api_key
+        self.base_url = base_url or None
+        self.weight = max(float(weight), 0.001)
+        self.models = set(models) if models else None
+        self.rpm = rpm
+        self.tpm = tpm
+        self.limits = limits or {}
+        self.outstanding = 0
+        self.failures = 0  # 连续失败次数
+        self.ejections = 0  # 连续摘除次数，决定下一次摘除时长
+        self.ejected_until = 0.0
+        self.requests = 0
+        self.errors = 0
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    @property
+    def client(self):
+        return clients.get_async_client(self.api_key, self.base_url)
+
+    @property
+    def sync_client(self):
+        return clients.get_client(self.api_key, self.base_url)
+
+    @property
+    def ejected(self) -> bool:
+        return self.ejections > 0
+
+    def supports(self, model: Optional[str]) -> bool:
+        return self.models is None or model in self.models
+
+    def available(self, now: float) -> bool:
+        # 摘除时间到期后允许一个试探请求通过，成功即恢复
+        if not self.ejected:
+            return True
+        return now >= self.ejected_until and self.outstanding == 0
+
+    def limiter(self, model: str) -> RateLimiter:
+        limits = self.limits.get(model, {})
+        rpm, tpm = int(limits.get("rpm", self.rpm)), int(limits.get("tpm", self.tpm))
+        limiter = self._limiters.get(model)
+        if limiter is None:
+            limiter = self._limiters[model] = RateLimiter(rpm, tpm)
+        return limiter
+
+    def record_success(self):
+        self.failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    def record_failure(self, eject_after: int, eject_seconds: float):
+        self.errors += 1
+        self.failures += 1
+        # 试探请求失败或连续失败达到阈值时摘除
+        if self.ejected or self.failures >= eject_after:
+            self.ejections += 1
+            self.failures = 0
+            duration = min(MAX_EJECT_SECONDS, eject_seconds * 2 ** (self.ejections - 1))
+            self.ejected_until = time.monotonic() + duration
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "base_url": self.base_url,
+            "weight": self.weight,
+            "models": sorted(self.models) if self.models else None,
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "ejected": self.ejected,
+            "ejected_for": max(0.0, self.ejected_until - time.monotonic()) if self.ejected else 0.0,
+        }
+
+
+class BackendPool:
+    # 按"在途请求数 / 权重"最小的原则选择后端；只在 engine 的共享事件循环上使用，不需要加锁
+
+    base_url = "backend-pool"
+
+    def __init__(self, backends: List[Backend], eject_after: int = DEFAULT_EJECT_AFTER,
+                 eject_seconds: float = DEFAULT_EJECT_SECONDS, health_interval: float = DEFAULT_HEALTH_INTERVAL):
+        if not backends:
+            raise ValueError("后端池中至少需要一个后端")
+        self.backends = backends
+        self.eject_after = eject_after
+        self.eject_seconds = eject_seconds
+        self.health_interval = health_interval
+        self._health_task = None
+
+    @property
+    def primary(self) -> Backend:
+        # 批处理等不经过负载均衡的调用使用第一个后端
+        return self.backends[0]
+
+    def select(self, model: Optional[str], exclude: Iterable[Backend] = ()) -> Backend:
+        candidates = [b for b in self.backends if b.supports(model) and b not in exclude]
+        if not candidates:
+            raise NoBackendAvailable(f"没有可用于模型 {model} 的后端")
+        now = time.monotonic()
+        healthy = [b for b in candidates if b.available(now)]
+        if not healthy:
+            # 全部被摘除时不直接失败，选最早到期的后端试一试
+            return min(candidates, key=lambda b: b.ejected_until)
+        best = min((b.outstanding + 1) / b.weight for b in healthy)
+        return random.choice([b for b in healthy if (b.outstanding + 1) / b.weight == best])
+
+    async def create(self, estimated_tokens: int, **params):
+        # 后端不可用时换一个支持该模型的后端重试，每个后端最多试一次
+        model = params.get("model")
+        tried: List[Backend] = []
+        while True:
+            backend = self.select(model, tried)
+            tried.append(backend)
+            backend.outstanding += 1
+            backend.requests += 1
+            try:
+                limiter = backend.limiter(model)
+                await limiter.acquire(estimated_tokens)
+                completion = await backend.client.chat.completions.create(**params)
+            except BACKEND_ERRORS:
+                backend.record_failure(self.eject_after, self.eject_seconds)
+                if not any(b.supports(model) and b not in tried for b in self.backends):
+                    raise
+                continue
+            finally:
+                backend.outstanding -= 1
+            backend.record_success()
+            usage = getattr(completion, "usage", None)
+            limiter.record(estimated_tokens, usage.total_tokens if usage else estimated_tokens)
+            return completion
+
+    async def check(self, backend: Backend) -> bool:
+        try:
+            await backend.client.models.list()
+        except Exception:
+            return False
+        return True
+
+    async def health_loop(self):
+        # 定期检查被摘除的后端，检查通过即提前恢复
+        while True:
+            await asyncio.sleep(self.health_interval)
+            for backend in self.backends:
+                if backend.ejected and await self.check(backend):
+                    backend.record_success()
+
+    def start(self):
+        if self.health_interval > 0 and self._health_task is None:
+            self._health_task = asyncio.run_coroutine_threadsafe(self.health_loop(), engine.get_loop())
+
+    def stop(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            self._health_task = None
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [backend.status() for backend in self.backends]
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def load_config() -> Optional[str]:
+    # 返回后端池配置的 JSON 文本，没有配置时返回 None
+    text = os.getenv("OPENAI_BACKENDS")
+    if text:
+        return text
+    path = os.getenv("OPENAI_BACKENDS_FILE")
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    return None
+
+
+def parse_backends(text: str) -> List[Backend]:
+    entries = json.loads(text)
+    if isinstance(entries, dict):
+        entries = entries.get("backends", [])
+    backends = []
+    for i, entry in enumerate(entries):
+        api_key = entry.get("api_key")
+        if api_key is None and entry.get("api_key_env"):
+            api_key = os.getenv(entry["api_key_env"])
+        backends.append(Backend(
+            name=entry.get("name") or entry.get("base_url") or f"backend-{i + 1}",
+            api_key=api_key or "EMPTY",
+            base_url=entry.get("base_url"),
+            weight=entry.get("weight", 1),
+            models=entry.get("models"),
+            rpm=int(entry.get("rpm", 0)),
+            tpm=int(entry.get("tpm", 0)),
+            limits=entry.get("limits"),
+        ))
+    return backends
+
+
+_pool: Optional[BackendPool] = None
+_pool_config: Optional[str] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> Optional[BackendPool]:
+    # 配置不变时整个进程共用一个后端池，在途计数和摘除状态因此在所有线程间共享
+    global _pool, _pool_config
+    text = load_config()
+    with _pool_lock:
+        if text != _pool_config:
+            if _pool is not None:
+                _pool.stop()
+            _pool = None
+            if text:
+                _pool = BackendPool(
+                    parse_backends(text),
+                    eject_after=int(_float_env("OPENAI_EJECT_AFTER", DEFAULT_EJECT_AFTER)),
+                    eject_seconds=_float_env("OPENAI_EJECT_SECONDS", DEFAULT_EJECT_SECONDS),
+                    health_interval=_float_env("OPENAI_HEALTH_INTERVAL", DEFAULT_HEALTH_INTERVAL),
+                )
+                _pool.start()
+            _pool_config = text
+    return _pool
+
+
+def reset():
+    global _pool, _pool_config
+    with _pool_lock:
+        if _pool is not None:
+            _pool.stop()
+        _pool = None
+        _pool_config = None
+
+
+def default_client():
+    # 不依赖 GUI 的调用方（工作进程、命令行）使用的异步客户端：有后端池时用后端池，否则用单一端点
+    pool = get_pool()
+    if pool is not None:
+        return pool
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise RuntimeError("未配置 OPENAI_API_KEY 或后端池（OPENAI_BACKENDS / OPENAI_BACKENDS_FILE）")
+    return clients.get_async_client(api_key, os.getenv("OPENAI_API_BASE"))
@@ -0,0 +1,452 @@
+import json
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from openai.types.chat import ChatCompletion
+
+from evaluator_core import answers as answer_store
+from evaluator_core import cache as completion_cache
+from evaluator_core import costs, metrics, stages
+
+# 批处理请求统一走 chat.completions 接口，请求文件每行格式为
+# {"custom_id": ..., "method": "POST", "url": "/v1/chat/completions", "body": {...}}
+BATCH_ENDPOINT = "/v1/chat/completions"
+COMPLETION_WINDOW = "24h"
+# 单个批处理任务的请求数上限（OpenAI 限制为 50000），超出后拆成多个任务同时提交
+MAX_REQUESTS_PER_BATCH = 50000
+DEFAULT_POLL_INTERVAL = 30
+DEFAULT_BATCH_DIR = os.path.join(os.path.expanduser("~"), ".ai_cluster_evaluator", "batches")
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# (custom_id, 请求参数, 缓存 salt)
+BatchRequest = Tuple[str, dict, Optional[str]]
+# 失败条目的 (HTTP 状态码, 错误信息)，没有返回结果的条目状态码为 None
+BatchFailure = Tuple[Optional[int], str]
+
+
+def batch_enabled() -> bool:
+    return os.getenv("OPENAI_BATCH_MODE", "0").lower() in ("1", "true", "yes")
+
+
+def get_poll_interval() -> float:
+    try:
+        return max(0.0, float(os.getenv("OPENAI_BATCH_POLL_INTERVAL", DEFAULT_POLL_INTERVAL)))
+    except ValueError:
+        return DEFAULT_POLL_INTERVAL
+
+
+def write_batch_requests(path: str, requests: Iterable[BatchRequest]) -> int:
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for custom_id, params, _ in requests:
+            line = {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": params}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+
+def _failure(record: dict) -> BatchFailure:
+    response = record.get("response") or {}
+    error = record.get("error") or (response.get("body") or {}).get("error") or {}
+    message = error.get("message") if isinstance(error, dict) else str(error)
+    return response.get("status_code"), message or "批处理请求失败"
+
+
+def read_batch_output(text: str, errors: Optional[Dict[str, BatchFailure]] = None) -> Dict[str, Optional[ChatCompletion]]:
+    # 解析输出文件；请求失败（非 200 或带 error）的条目记为 None，失败原因写入 errors
+    outputs: Dict[str, Optional[ChatCompletion]] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        custom_id = record.get("custom_id")
+        response = record.get("response") or {}
+        if custom_id is None:
+            continue
+        if record.get("error") or response.get("status_code") != 200:
+            outputs[custom_id] = None
+            if errors is not None:
+                errors[custom_id] = _failure(record)
+            continue
+        try:
+            outputs[custom_id] = ChatCompletion.model_validate(response["body"])
+        except (KeyError, ValueError):
+            outputs[custom_id] = None
+            if errors is not None:
+                errors[custom_id] = (response.get("status_code"), "无法解析批处理返回的结果")
+    return outputs
+
+
+def structured_rejected(failure: Optional[BatchFailure]) -> bool:
+    # 与在线模式一致：返回 400 或明确提到 response_format 的错误说明后端不支持结构化输出，
+    # 指向 n 参数的 400 除外（由 batch_evaluate_panel 改为逐个请求）
+    if failure is None:
+        return False
+    status, message = failure
+    if "response_format" in (message or ""):
+        return True
+    return status == 400 and not stages.n_rejected(message)
+
+
+class BatchRunner:
+    # 把一组请求写成批处理文件、上传、提交、轮询，并取回输出。
+    # 与在线调用共用响应缓存：已缓存的请求不再提交，取回的结果也写入缓存。
+    # 失败或没有返回的请求在结果中记为 None，原因见 errors
+
+    def __init__(self, client, stage: str, poll_interval: Optional[float] = None,
+                 work_dir: Optional[str] = None, on_status: Optional[Callable[[Any], None]] = None,
+                 tracker: Optional[costs.CostTracker] = None, cancel_event: Optional[threading.Event] = None):
+        self.client = client
+        self.stage = stage
+        self.tracker = tracker  # 费用统计和预算，custom_id 即问题 ID
+        self.cancel_event = cancel_event  # 设置后不再提交新的任务，已提交的任务在服务端取消
+        self.poll_interval = get_poll_interval() if poll_interval is None else poll_interval
+        self.work_dir = work_dir or os.getenv("OPENAI_BATCH_DIR") or DEFAULT_BATCH_DIR
+        self.on_status = on_status
+        self.errors: Dict[str, BatchFailure] = {}  # 最近一次请求失败的 {custom_id: (状态码, 错误信息)}
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event is not None and self.cancel_event.is_set()
+
+    def error(self, custom_id: str) -> str:
+        status, message = self.errors.get(custom_id, (None, "批处理请求失败"))
+        return f"{status}: {message}" if status else message
+
+    def labels(self, params: dict) -> Dict[str, str]:
+        # 指标标签与在线调用一致，合并评测（evaluate_panel）计入 evaluate 阶段
+        stage = "evaluate" if self.stage == "evaluate_panel" else self.stage
+        return {"stage": stage, "model": params.get("model") or ""}
+
+    def complete(self, requests: List[BatchRequest]) -> Dict[str, Optional[ChatCompletion]]:
+        cache = completion_cache.get_cache()
+        bypass = completion_cache.bypass_enabled()
+        results: Dict[str, Optional[ChatCompletion]] = {}
+        to_submit = []
+        for custom_id, params, salt in requests:
+            cached = None
+            if cache is not None and not bypass:
+                cached = completion_cache.lookup(cache, completion_cache.make_key(params, salt))
+                metrics.CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit", **self.labels(params))
+            if cached is not None:
+                metrics.REQUESTS.inc(outcome="cached", **self.labels(params))
+                results[custom_id] = ChatCompletion.model_validate_json(cached)
+                if self.tracker is not None:
+                    self.tracker.record(self.labels(params)["stage"], params.get("model") or "",
+                                        results[custom_id].usage, cached=True, qid=custom_id)
+            else:
+                to_submit.append((custom_id, params, salt))
+        if not to_submit or self.cancelled:
+            # 取消后未提交的请求不出现在结果中，调用方把它们留在未完成的问题里
+            return results
+        if self.tracker is not None and self.tracker.exhausted():
+            # 一个批处理任务提交后无法中途停止，预算用尽时不再提交新的任务
+            raise costs.BudgetExhausted(
+                f"预算 ${self.tracker.budget:.2f} 已用尽，{len(to_submit)} 个请求未提交，提高预算后重新运行即可继续"
+            )
+
+        outputs = self.submit_and_wait(to_submit)
+        for custom_id, params, salt in to_submit:
+            completion = outputs.get(custom_id)
+            results[custom_id] = completion
+            if completion is not None:
+                self.errors.pop(custom_id, None)
+            labels = self.labels(params)
+            metrics.REQUESTS.inc(outcome="error" if completion is None else "ok", **labels)
+            if completion is not None and completion.usage:
+                metrics.TOKENS.inc(completion.usage.prompt_tokens or 0, kind="prompt", **labels)
+                metrics.TOKENS.inc(completion.usage.completion_tokens or 0, kind="completion", **labels)
+            if completion is not None and self.tracker is not None:
+                self.tracker.record(labels["stage"], labels["model"], completion.usage, batch=True, qid=custom_id)
+            if completion is not None and cache is not None:
+                completion_cache.store(cache, completion_cache.make_key(params, salt), completion.model_dump_json())
+        return results
+
+    def complete_scores(self, requests: List[BatchRequest]) -> Dict[str, Optional[ChatCompletion]]:
+        # 评分请求：后端支持时使用结构化输出。错误文件显示结构化输出被拒绝（400）时记住该后端不支持，
+        # 只把被拒绝的条目改用文本格式重新提交；过期、5xx 等其他失败原样返回，由调用方留待下次运行
+        if not requests:
+            return {}
+        base_url = str(getattr(self.client, "base_url", ""))
+        model = requests[0][1].get("model") or ""
+        if not stages.structured_supported(base_url, model):
+            return self.complete(requests)
+        results = self.complete([(cid, stages.structured_params(params), salt) for cid, params, salt in requests])
+        rejected = [(cid, params, salt) for cid, params, salt in requests
+                    if results.get(cid) is None and structured_rejected(self.errors.get(cid))]
+        if not rejected or self.cancelled:
+            return results
+        stages.mark_structured_unsupported(base_url, model)
+        retried = self.complete(rejected)
+        if all(retried.get(cid) is None and structured_rejected(self.errors.get(cid)) for cid, _, _ in rejected):
+            # 文本格式同样被拒绝，说明是其他参数的问题，撤销记录
+            stages.mark_structured_supported(base_url, model)
+        results.update(retried)
+        return results
+
+    def submit_and_wait(self, requests: List[BatchRequest]) -> Dict[str, Optional[ChatCompletion]]:
+        os.makedirs(self.work_dir, exist_ok=True)
+        batches = []
+        for start in range(0, len(requests), MAX_REQUESTS_PER_BATCH):
+            chunk = requests[start:start + MAX_REQUESTS_PER_BATCH]
+            path = os.path.join(self.work_dir, f"{self.stage}-{uuid.uuid4().hex}.jsonl")
+            write_batch_requests(path, chunk)
+            with open(path, "rb") as f:
+                input_file = self.client.files.create(file=f, purpose="batch")
+            batch = self.client.batches.create(
+                input_file_id=input_file.id,
+                endpoint=BATCH_ENDPOINT,
+                completion_window=COMPLETION_WINDOW,
+                metadata={"stage": self.stage, "input": os.path.basename(path)},
+            )
+            batches.append((batch, path))
+
+        # 先取回所有任务的输出，再统计失败的条目：失败、过期或取消的任务也可能带有部分输出，能取回多少算多少，
+        # 不影响其他任务。没有返回的条目记为 None，由调用方留待下次运行
+        outputs: Dict[str, Optional[ChatCompletion]] = {}
+        for (batch, path), start in zip(batches, range(0, len(requests), MAX_REQUESTS_PER_BATCH)):
+            batch = self.wait(batch)
+            for file_id in (batch.output_file_id, batch.error_file_id):
+                if not file_id:
+                    continue
+                text = self.client.files.content(file_id).text
+                with open(f"{path[:-len('.jsonl')]}.{file_id}.jsonl", "w", encoding="utf-8") as f:
+                    f.write(text)
+                errors: Dict[str, BatchFailure] = {}
+                for custom_id, completion in read_batch_output(text, errors).items():
+                    if completion is not None or custom_id not in outputs:
+                        outputs[custom_id] = completion
+                        if custom_id in errors:
+                            self.errors[custom_id] = errors[custom_id]
+            for custom_id, _, _ in requests[start:start + MAX_REQUESTS_PER_BATCH]:
+                if custom_id not in outputs:
+                    outputs[custom_id] = None
+                    self.errors[custom_id] = (None, f"批处理任务 {batch.id} 结束状态为 {batch.status}，没有返回结果")
+        return outputs
+
+    def wait(self, batch):
+        while batch.status not in FINAL_STATUSES:
+            if self.cancelled and batch.status != "cancelling":
+                # 取消服务端的任务，已经完成的请求仍会写入输出文件
+                batch = self.client.batches.cancel(batch.id)
+                continue
+            if self.cancel_event is not None:
+                self.cancel_event.wait(self.poll_interval)
+            else:
+                time.sleep(self.poll_interval)
+            batch = self.client.batches.retrieve(batch.id)
+            if self.on_status:
+                self.on_status(batch)
+        return batch
+
+
+def _content(completion: Optional[ChatCompletion]) -> Optional[str]:
+    if completion is None or not completion.choices:
+        return None
+    return completion.choices[0].message.content
+
+
+def batch_answers(runner: BatchRunner, items: Iterable[Tuple[str, str]], model: str, system_content: str,
+                  on_result: Callable[[str, str], None]) -> Dict[str, str]:
+    # 失败的请求重新提交，最多 MAX_FORMAT_RETRIES 轮。返回仍然失败的 {问题 ID: 原因}，这些问题不写入结果
+    pending = {qid: question for qid, question in items}
+    for _ in range(stages.MAX_FORMAT_RETRIES):
+        if not pending:
+            break
+        requests = [
+            (qid, {"model": model, "messages": stages.answer_messages(system_content, question)}, None)
+            for qid, question in pending.items()
+        ]
+        for qid, completion in runner.complete(requests).items():
+            answer = _content(completion)
+            if answer is not None:
+                answer_store.remember(pending[qid], model, system_content, answer)
+                on_result(qid, answer)
+                del pending[qid]
+    if runner.cancelled:
+        return {}
+    return {qid: runner.error(qid) for qid in pending}
+
+
+def batch_evaluate(runner: BatchRunner, items: Iterable[Tuple[str, str]], model: str, system_content: str,
+                   evaluator_num: int, on_result: Callable[[str, Tuple[float, str]], None]) -> Dict[str, str]:
+    # 每一轮对应在线模式下的一次格式重试，格式错误的回答进入下一轮。
+    # 请求本身失败（服务端错误、任务过期等）的问题与在线模式一样不写入结果，返回 {问题 ID: 原因} 留待下次运行
+    pending = {qid: answer for qid, answer in items}
+    failed = {}
+    for attempt in range(stages.MAX_FORMAT_RETRIES):
+        if not pending:
+            break
+        if attempt:
+            stages.count_retries("evaluate", model, len(pending), runner.tracker)
+        requests = [
+            (qid, {"model": model, "messages": stages.evaluate_messages(system_content, answer)},
+             stages.evaluate_salt(evaluator_num, attempt))
+            for qid, answer in pending.items()
+        ]
+        for qid, completion in runner.complete_scores(requests).items():
+            if completion is None:
+                failed[qid] = runner.error(qid)
+                del pending[qid]
+                continue
+            parsed = stages.score_content(_content(completion), "evaluate", model, runner.tracker)
+            if parsed:
+                reason, score = parsed
+                on_result(qid, (score, reason))
+                del pending[qid]
+    if runner.cancelled:
+        # 取消时未完成的问题不写入默认分数，留待重新运行
+        return {}
+    for qid in pending:
+        stages.count_fallback("evaluate", model, runner.tracker)
+        on_result(qid, (stages.DEFAULT_SCORE, stages.EVAL_FALLBACK_REASON))
+    return failed
+
+
+def batch_evaluate_panel(runner: BatchRunner, items: Iterable[Tuple[str, Iterable[int], str]], model: str,
+                         system_content: str,
+                         on_result: Callable[[str, int, Tuple[float, str]], None]) -> Dict[str, str]:
+    # 多位评测员合并为一个 n>1 的请求；items 为 (qid, 缺少的评测员, 答案)。
+    # 后端忽略 n 或部分回复格式错误时，缺少的评测员进入下一轮；n>1 的请求返回 400 时该问题改为逐个请求，
+    # 错误指向 n 时记住该后端不支持（与在线模式一致）。其他原因失败的问题同 batch_evaluate
+    pending = {qid: (list(evaluator_nums), answer) for qid, evaluator_nums, answer in items}
+    pending = {qid: entry for qid, entry in pending.items() if entry[0]}
+    base_url = str(getattr(runner.client, "base_url", ""))
+    single = set()  # 改为逐个请求的问题
+    failed = {}
+    for attempt in range(stages.MAX_FORMAT_RETRIES):
+        if not pending:
+            break
+        if attempt:
+            stages.count_retries("evaluate", model, len(pending), runner.tracker)
+        requests = []
+        for qid, (missing, answer) in pending.items():
+            body = {"model": model, "messages": stages.evaluate_messages(system_content, answer)}
+            if len(missing) > 1 and qid not in single and stages.multi_sample_supported(base_url, model):
+                body["n"] = len(missing)
+            requests.append((qid, body, stages.panel_salt(missing, attempt)))
+        bodies = {qid: body for qid, body, _ in requests}
+        for qid, completion in runner.complete_scores(requests).items():
+            if completion is None:
+                status, message = runner.errors.get(qid, (None, None))
+                if "n" in bodies[qid] and status == 400:
+                    if stages.n_rejected(message):
+                        stages.mark_multi_sample_unsupported(base_url, model)
+                    single.add(qid)
+                    continue
+                failed[qid] = runner.error(qid)
+                del pending[qid]
+                continue
+            missing = pending[qid][0]
+            choices = completion.choices
+            parsed = [stages.score_content(choice.message.content, "evaluate", model, runner.tracker)
+                      for choice in choices]
+            for reason, score in [p for p in parsed if p][:len(missing)]:
+                on_result(qid, missing.pop(0), (score, reason))
+            if not missing:
+                del pending[qid]
+    if runner.cancelled:
+        return {}
+    for qid, (missing, _) in pending.items():
+        for evaluator_num in missing:
+            stages.count_fallback("evaluate", model, runner.tracker)
+            on_result(qid, evaluator_num, (stages.DEFAULT_SCORE, stages.EVAL_FALLBACK_REASON))
+    return failed
+
+
+def batch_adaptive_panel(runner: BatchRunner, qids: Iterable[str], answers, scores1, reasons1, scores2, reasons2,
+                         model: str, system_content: str,
+                         on_result: Callable[[str, Tuple[float, str]], None]) -> Dict[str, str]:
+    # 评测组从第一位评测员的评分开始，每一轮为所有尚未收敛的问题各追加一位评测员，一轮对应一个（或一组）
+    # 批处理任务；第二轮已有第二份评分的问题直接使用，不再请求。
+    # 追加评测员的请求失败时该问题不写入结果，返回 {问题 ID: 原因}
+    max_judges, target = stages.panel_settings()
+    failed = {}
+    panels = {qid: ([scores1[qid]], [reasons1[qid]]) for qid in qids}
+    judges = 1
+    while judges < max_judges:
+        pending = [qid for qid, (scores, _) in panels.items() if not stages.panel_converged(scores, target)]
+        if not pending:
+            break
+        if judges == 1:
+            for qid in pending:
+                if qid in scores2:
+                    panels[qid][0].append(scores2[qid])
+                    panels[qid][1].append(reasons2[qid])
+            pending = [qid for qid in pending if qid not in scores2]
+            if not pending:
+                judges += 1
+                continue
+        if runner.tracker is not None and runner.tracker.at_risk():
+            # 预算接近上限：尚未收敛的问题不再追加评测员，推迟到下次运行
+            for qid in pending:
+                runner.tracker.defer(qid, "final_scores")
+                del panels[qid]
+            break
+        judges += 1
+
+        def on_score(qid, result):
+            panels[qid][0].append(result[0])
+            panels[qid][1].append(result[1])
+
+        round_failed = batch_evaluate(runner, ((qid, answers[qid]) for qid in pending), model, system_content,
+                                      judges, on_score)
+        for qid in round_failed:
+            del panels[qid]
+        failed.update(round_failed)
+    if runner.cancelled:
+        return {}
+    for qid, (scores, reasons) in panels.items():
+        on_result(qid, stages.panel_result(scores, reasons, stages.panel_converged(scores, target)))
+    return failed
+
+
+def batch_quality(runner: BatchRunner, qids: Iterable[str], questions, answers, scores1, reasons1,
+                  scores2, reasons2, model: str, system_content: str,
+                  on_result: Callable[[str, Tuple[float, str]], None]) -> Dict[str, str]:
+    # 请求失败的问题同 batch_evaluate，不写入平均分，返回 {问题 ID: 原因}
+    pending = []
+    for qid in qids:
+        if stages.scores_agree(scores1[qid], scores2[qid]):
+            on_result(qid, stages.agreement_result(scores1[qid], reasons1[qid], scores2[qid], reasons2[qid]))
+        elif runner.tracker is not None and runner.tracker.at_risk():
+            # 预算接近上限：有分歧的问题不再升级到质检，推迟到下次运行
+            runner.tracker.defer(qid, "final_scores")
+        else:
+            pending.append(qid)
+    pending = dict.fromkeys(pending)
+    failed = {}
+    for attempt in range(stages.MAX_FORMAT_RETRIES):
+        if not pending:
+            break
+        if attempt:
+            stages.count_retries("quality", model, len(pending), runner.tracker)
+        requests = [
+            (qid, {"model": model, "messages": stages.quality_messages(
+                system_content, questions[qid], answers[qid],
+                scores1[qid], reasons1[qid], scores2[qid], reasons2[qid])},
+             stages.quality_salt(attempt))
+            for qid in pending
+        ]
+        for qid, completion in runner.complete_scores(requests).items():
+            if completion is None:
+                failed[qid] = runner.error(qid)
+                del pending[qid]
+                continue
+            parsed = stages.score_content(_content(completion), "quality", model, runner.tracker)
+            if parsed:
+                reason, score = parsed
+                on_result(qid, stages.quality_result(score, reason, reasons1[qid], reasons2[qid]))
+                del pending[qid]
+    if runner.cancelled:
+        return {}
+    for qid in pending:
+        stages.count_fallback("quality", model, runner.tracker)
+        on_result(qid, ((scores1[qid] + scores2[qid]) / 2, stages.QUALITY_FALLBACK_REASON))
+    return failed
@@ -0,0 +1,181 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+# 默认缓存位置和容量上限，可通过 OPENAI_CACHE_PATH、OPENAI_CACHE_MAX_MB 环境变量调整
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".ai_cluster_evaluator", "completions.sqlite")
+DEFAULT_CACHE_MAX_MB = 512
+# 淘汰时每次从数据库读取的候选条目数
+EVICT_BATCH = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS completions (
+    key TEXT PRIMARY KEY,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS completions_last_used ON completions (last_used);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+INSERT OR IGNORE INTO meta (name, value) VALUES ('total_size', 0);
+CREATE TRIGGER IF NOT EXISTS completions_insert AFTER INSERT ON completions BEGIN
+    UPDATE meta SET value = value + NEW.size WHERE name = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS completions_update AFTER UPDATE OF size ON completions BEGIN
+    UPDATE meta SET value = value + NEW.size - OLD.size WHERE name = 'total_size';
+END;
+CREATE TRIGGER IF NOT EXISTS completions_delete AFTER DELETE ON completions BEGIN
+    UPDATE meta SET value = value - OLD.size WHERE name = 'total_size';
+END;
+"""
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+class CompletionCache:
+    # 基于 SQLite（WAL 模式）的模型响应缓存，多线程、多进程共用同一个文件都是安全的
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # sqlite3 连接不能跨线程使用，每个线程各持有一个
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        conn = self._connect()
+        row = conn.execute("SELECT response FROM completions WHERE key = ?", (key,)).fetchone()
+        with self._stats_lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        conn.execute("UPDATE completions SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+
+    def put(self, key: str, response: str):
+        conn = self._connect()
+        size = len(response.encode("utf-8"))
+        conn.execute(
+            "INSERT INTO completions (key, response, size, last_used) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET response = excluded.response, size = excluded.size, "
+            "last_used = excluded.last_used",
+            (key, response, size, time.time()),
+        )
+        self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection):
+        # 按最近使用时间淘汰最久未用的条目，直到总大小回到上限以内
+        excess = self._total_size(conn) - self.max_bytes
+        while excess > 0:
+            rows = conn.execute(
+                "SELECT key, size FROM completions ORDER BY last_used LIMIT ?", (EVICT_BATCH,)
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                victims.append((key,))
+                excess -= size
+                if excess <= 0:
+                    break
+            conn.executemany("DELETE FROM completions WHERE key = ?", victims)
+
+    def _total_size(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE name = 'total_size'").fetchone()[0]
+
+    def stats(self) -> dict:
+        conn = self._connect()
+        entries = conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+        with self._stats_lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "size_bytes": self._total_size(conn),
+            "max_bytes": self.max_bytes,
+        }
+
+    def clear(self):
+        self._connect().execute("DELETE FROM completions")
+
+
+def make_key(params: dict, salt: Optional[str] = None) -> str:
+    # 键由模型、消息（含 system content）和采样参数共同决定；
+    # salt 用来区分本应独立的多次采样（例如两位评测员、格式错误后的重试）
+    payload = json.dumps({"params": params, "salt": salt}, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def cache_enabled() -> bool:
+    return os.getenv("OPENAI_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+
+
+def bypass_enabled() -> bool:
+    # 跳过缓存读取但仍写入新结果，用于强制刷新
+    return os.getenv("OPENAI_CACHE_BYPASS", "0").lower() in ("1", "true", "yes")
+
+
+def get_cache() -> Optional[CompletionCache]:
+    # 无法创建缓存（主目录只读、磁盘已满、文件损坏等）时返回 None，按未启用缓存运行
+    if not cache_enabled():
+        return None
+    path = os.getenv("OPENAI_CACHE_PATH") or DEFAULT_CACHE_PATH
+    try:
+        max_mb = float(os.getenv("OPENAI_CACHE_MAX_MB", DEFAULT_CACHE_MAX_MB))
+    except ValueError:
+        max_mb = DEFAULT_CACHE_MAX_MB
+    with _caches_lock:
+        if path not in _caches:
+            try:
+                _caches[path] = CompletionCache(path, int(max_mb * 1024 * 1024))
+            except (OSError, sqlite3.Error) as e:
+                # 只提示一次，本进程内不再尝试
+                logger.warning("响应缓存 %s 不可用：%s", path, e)
+                _caches[path] = None
+        cache = _caches[path]
+        if cache is not None:
+            cache.max_bytes = int(max_mb * 1024 * 1024)
+    return cache
+
+
+def lookup(cache: CompletionCache, key: str) -> Optional[str]:
+    # 缓存出错（例如文件被锁、损坏或磁盘已满）时按未命中处理，不影响正常调用
+    try:
+        return cache.get(key)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("读取响应缓存失败：%s", e)
+        return None
+
+
+def store(cache: CompletionCache, key: str, response: str):
+    try:
+        cache.put(key, response)
+    except (OSError, sqlite3.Error) as e:
+        logger.warning("写入响应缓存失败：%s", e)
@@ -0,0 +1,174 @@
+import argparse
+import json
+import sys
+import threading
+from typing import Any, Dict, List, Optional
+
+# 不依赖 Qt 的命令行入口：python -m evaluator_core <命令>。
+# 只在顶层导入标准库，评测引擎在执行命令时导入，Flask 只有 serve 命令才会加载
+
+# 命令 -> API 接口名
+COMMANDS = {
+    "answer": "generate",
+    "evaluate": "evaluate",
+    "quality": "quality-check",
+    "all": "pipeline",
+}
+
+
+def load_results(path: str) -> Dict[str, Any]:
+    # 读取 GUI 保存的结果文件（questions/answers/evaluation_1/...）；
+    # evaluate 也接受只有 {qid: 答案} 的文件
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if not isinstance(data, dict):
+        raise ValueError(f"{path} 应为 JSON 对象")
+    return data
+
+
+def build_request(command: str, path: str):
+    # 返回 (请求数据, 问题集)，请求数据与对应 HTTP 接口的请求体相同
+    if command in ("answer", "all"):
+        from evaluator_core.dataset import QuestionSource
+        questions = QuestionSource(path)
+        return {"questions": questions}, questions
+    data = load_results(path)
+    if command == "evaluate" and "answers" not in data:
+        data = {"answers": data}
+    return data, data.get("questions")
+
+
+def merge_output(command: str, data: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+    # 把本次结果并入输入的结果文件，字段名与保存格式一致
+    output = {name: value for name, value in data.items() if name != "questions"}
+    if command == "answer":
+        output["answers"] = result
+    elif command == "quality":
+        output["answers"] = result["answers"]
+        output["final_evaluation"] = {"scores": result["scores"], "reasons": result["reasons"]}
+    else:
+        output.update(result)
+    return output
+
+
+def write_output(path: Optional[str], questions, output: Dict[str, Any]):
+    from evaluator_core.sink import SECTIONS, write_combined
+    if path:
+        # 与 GUI 的保存格式一致，逐条写出
+        stages = {stage: output.get(name) for stage, name in SECTIONS}
+        write_combined(path, questions, stages.get)
+        return
+    document = {"questions": dict(questions.items()) if questions is not None else {}}
+    document.update((name, output[name]) for _, name in SECTIONS if output.get(name))
+    json.dump(document, sys.stdout, ensure_ascii=False, indent=2)
+    sys.stdout.write("\n")
+
+
+def run_command(command: str, path: str, output: Optional[str] = None, stream: Optional[str] = None,
+                quiet: bool = False, budget: Optional[float] = None, resume: bool = False) -> int:
+    from evaluator_core import jobs, service
+    from evaluator_core.journal import load_journal
+    from evaluator_core.sink import SECTIONS, ResultStreamWriter
+
+    kind = COMMANDS[command]
+    data, questions = build_request(command, path)
+    if budget is not None:
+        data["budget"] = budget
+    if resume:
+        # 结果流就是检查点：其中已有的结果不再请求，新结果继续追加
+        if not stream:
+            print("--resume 需要同时指定 --stream", file=sys.stderr)
+            return 2
+        done = load_journal(stream)
+        data.update((name, done[stage]) for stage, name in SECTIONS if done.get(stage))
+    missing = service.missing_fields(kind, data)
+    if missing:
+        print(f"输入文件缺少字段：{', '.join(missing)}", file=sys.stderr)
+        return 2
+
+    # 复用后台任务的事件机制：工作线程执行，主线程输出进度、写结果流，Ctrl+C 取消并保留已完成的部分
+    job = jobs.Job(kind, keep_events=False)
+    outcome: Dict[str, Any] = {}
+
+    def work():
+        job.state = jobs.RUNNING
+        try:
+            outcome["result"] = service.HANDLERS[kind](data, job)
+            job.state = jobs.CANCELLED if job.cancelled else jobs.SUCCEEDED
+        except Exception as e:
+            job.error = str(e)
+            job.state = jobs.FAILED
+        finally:
+            job.publish("end", state=job.state, error=job.error)
+
+    writer = ResultStreamWriter(stream, fresh=not resume) if stream else None
+    stages = {name: stage for stage, name in SECTIONS}
+    thread = threading.Thread(target=work, daemon=True)
+    thread.start()
+    try:
+        since = 0
+        events = job.iter_events(since, heartbeat=1.0)
+        while True:
+            try:
+                event = next(events)
+            except StopIteration:
+                break
+            except KeyboardInterrupt:
+                # 中断会结束当前的事件迭代器，从下一个序号继续读取
+                print("\n正在取消，已完成的结果会照常输出……", file=sys.stderr)
+                job.cancel()
+                events = job.iter_events(since, heartbeat=1.0)
+                continue
+            if event is None:
+                continue
+            since = event["seq"] + 1
+            if event["event"] == "progress" and not quiet:
+                print(f"\r进度：{event['progress']}%", end="", file=sys.stderr, flush=True)
+            elif event["event"] == "warning":
+                print(f"\n{event['message']}", file=sys.stderr)
+            elif event["event"] == "result" and writer is not None:
+                writer.append(stages[event["stage"]], event["qid"], event["value"])
+    finally:
+        if writer is not None:
+            writer.close()
+    if not quiet:
+        print(file=sys.stderr)
+        if job.costs is not None:
+            print(job.costs.describe(), file=sys.stderr)
+
+    if job.state == jobs.FAILED:
+        print(f"执行失败：{job.error}", file=sys.stderr)
+        return 1
+    write_output(output, questions, merge_output(command, data, outcome["result"]))
+    return 130 if job.state == jobs.CANCELLED else 0
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m evaluator_core", description="AI 集群评测系统命令行（无需图形界面）")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    helps = {
+        "answer": ("为问题集生成答案", "问题集文件（.json/.jsonl）"),
+        "evaluate": ("两位评测员为答案评分", "结果文件（含 answers）或 {qid: 答案} 文件"),
+        "quality": ("质量检查", "结果文件（含 questions/evaluation_1/evaluation_2，可含 answers）"),
+        "all": ("按问题流水线执行生成、评测和质检", "问题集文件（.json/.jsonl）"),
+    }
+    for command, (description, input_help) in helps.items():
+        cmd = sub.add_parser(command, help=description)
+        cmd.add_argument("input", help=input_help)
+        cmd.add_argument("-o", "--output", help="输出文件（GUI 的保存格式），默认输出到标准输出")
+        cmd.add_argument("--stream", help="同时把逐题结果写入结果流文件（JSONL）")
+        cmd.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+        cmd.add_argument("--budget", type=float, help="本次运行的预算（美元），接近预算时走最便宜的路径，用尽后停止")
+        cmd.add_argument("--resume", action="store_true", help="从 --stream 指定的结果流继续，已有的结果不再请求")
+
+    serve = sub.add_parser("serve", help="启动 HTTP API 服务")
+    serve.add_argument("--host", default="0.0.0.0")
+    serve.add_argument("--port", type=int, default=5000)
+
+    args = parser.parse_args(argv)
+    if args.command == "serve":
+        from evaluator_core.server import serve as run_server
+        run_server(args.host, args.port)
+        return 0
+    return run_command(args.command, args.input, args.output, args.stream, args.quiet, args.budget, args.resume)
@@ -0,0 +1,89 @@
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, DefaultHttpxClient, DefaultAsyncHttpxClient
+
+from evaluator_core import metrics
+
+# 每个 (api_key, base_url) 对应的连接池大小，可通过 OPENAI_POOL_SIZE 环境变量或设置界面调整
+DEFAULT_POOL_SIZE = 32
+# 空闲连接保活时间（秒）
+KEEPALIVE_EXPIRY = 60
+
+_clients: Dict[Tuple[str, Optional[str]], OpenAI] = {}
+_async_clients: Dict[Tuple[str, Optional[str]], AsyncOpenAI] = {}
+_lock = threading.Lock()
+
+
+def get_pool_size() -> int:
+    try:
+        value = int(os.getenv("OPENAI_POOL_SIZE", DEFAULT_POOL_SIZE))
+    except ValueError:
+        value = DEFAULT_POOL_SIZE
+    return max(1, value)
+
+
+def http2_enabled() -> bool:
+    # HTTP/2 需要安装 h2；对 http:// 端点 httpx 会自动退回 HTTP/1.1，https 端点通过 ALPN 协商
+    if os.getenv("OPENAI_HTTP2", "1").lower() in ("0", "false", "no"):
+        return False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _limits() -> httpx.Limits:
+    pool_size = get_pool_size()
+    return httpx.Limits(
+        max_connections=pool_size,
+        max_keepalive_connections=pool_size,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def _client_args(api_key: str, base_url: Optional[str]) -> dict:
+    client_args = {"api_key": api_key}
+    if base_url:
+        client_args["base_url"] = base_url
+    return client_args
+
+
+def get_client(api_key: str, base_url: Optional[str] = None) -> OpenAI:
+    # 同一个 key 和 base_url 在整个进程内共用一个客户端及其连接池
+    key = (api_key, base_url or None)
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            http_client = DefaultHttpxClient(limits=_limits(), http2=http2_enabled())
+            client = OpenAI(http_client=http_client, **_client_args(api_key, base_url))
+            _clients[key] = client
+    return client
+
+
+def get_async_client(api_key: str, base_url: Optional[str] = None) -> AsyncOpenAI:
+    # 异步客户端只在 engine 的共享事件循环上使用，因此连接池也可以安全地跨线程共享
+    key = (api_key, base_url or None)
+    with _lock:
+        client = _async_clients.get(key)
+        if client is None:
+            # 事件钩子统计每次 HTTP 请求的首字节时间和状态码（包括 SDK 自动重试的请求）
+            http_client = DefaultAsyncHttpxClient(
+                limits=_limits(), http2=http2_enabled(),
+                event_hooks={"request": [metrics.on_request], "response": [metrics.on_response]},
+            )
+            # 重试由 resilience.call_with_retry 统一处理（退避、Retry-After 和熔断），关闭 SDK 自带的重试
+            client = AsyncOpenAI(http_client=http_client, max_retries=0, **_client_args(api_key, base_url))
+            _async_clients[key] = client
+    return client
+
+
+def reset():
+    # 配置变化后丢弃已缓存的客户端，之后的请求会按新配置重新建立连接池。
+    # 旧客户端上可能还有进行中的请求，因此这里不主动关闭，交给垃圾回收处理。
+    with _lock:
+        _clients.clear()
+        _async_clients.clear()
@@ -0,0 +1,90 @@
+import asyncio
+import time
+from typing import Optional
+
+from openai.types.chat import ChatCompletion
+
+from evaluator_core import cache as completion_cache
+from evaluator_core import costs, metrics, ratelimit, resilience
+from evaluator_core.backends import BackendPool
+
+
+async def _cache_get(cache, key):
+    return await asyncio.to_thread(completion_cache.lookup, cache, key)
+
+
+async def _cache_put(cache, key, value):
+    await asyncio.to_thread(completion_cache.store, cache, key, value)
+
+
+def _record_cost(stage: str, model: str, completion, cached: bool = False):
+    tracker = costs.current.get()
+    if tracker is not None:
+        tracker.record(stage, model, getattr(completion, "usage", None), cached=cached)
+
+
+async def create_completion(client, stage: str, cache_salt: Optional[str] = None, **params):
+    # 所有阶段的模型调用都经过这里：先查缓存，未命中再限流并请求。
+    # client 可以是单个客户端，也可以是后端池，后者会再选择具体的后端
+    model = params.get("model") or ""
+    labels = {"stage": stage, "model": model}
+    cache = completion_cache.get_cache()
+    key = None
+    if cache is not None:
+        key = completion_cache.make_key(params, cache_salt)
+        if not completion_cache.bypass_enabled():
+            cached = await _cache_get(cache, key)
+            metrics.CACHE_LOOKUPS.inc(result="miss" if cached is None else "hit", **labels)
+            if cached is not None:
+                metrics.REQUESTS.inc(outcome="cached", **labels)
+                completion = ChatCompletion.model_validate_json(cached)
+                _record_cost(stage, model, completion, cached=True)
+                return completion
+
+    limiter = ratelimit.get_limiter(stage, params.get("model"))
+    estimated = ratelimit.estimate_tokens(params.get("messages", []))
+    waited = time.perf_counter()
+    metrics.WAITING.inc(**labels)
+    try:
+        await limiter.acquire(estimated)
+    finally:
+        metrics.WAITING.dec(**labels)
+    started = time.perf_counter()
+    metrics.RATELIMIT_WAIT.observe(started - waited, **labels)
+    tracker = costs.current.get()
+    reserved = 0.0
+    if tracker is not None:
+        # 输出 token 由 reserve 按该模型的历史平均另行预估，这里只传提示词部分
+        prompt_tokens = estimated - ratelimit.DEFAULT_COMPLETION_TOKENS
+        reserved = tracker.reserve(model, prompt_tokens, params.get("n") or 1)
+    metrics.IN_FLIGHT.inc(**labels)
+    token = metrics.current_call.set((stage, model))
+    try:
+        # 可重试的错误按指数退避重试；后端池自己摘除失败的后端，单一端点由熔断器暂停
+        if isinstance(client, BackendPool):
+            completion = await resilience.call_with_retry(lambda: client.create(estimated, **params), labels)
+        else:
+            breaker = resilience.get_breaker(str(client.base_url))
+            completion = await resilience.call_with_retry(
+                lambda: client.chat.completions.create(**params), labels, breaker
+            )
+    except BaseException:
+        metrics.REQUESTS.inc(outcome="error", **labels)
+        raise
+    finally:
+        if tracker is not None:
+            tracker.release(reserved)
+        metrics.current_call.reset(token)
+        metrics.IN_FLIGHT.dec(**labels)
+        metrics.REQUEST_LATENCY.observe(time.perf_counter() - started, **labels)
+    metrics.REQUESTS.inc(outcome="ok", **labels)
+    usage = getattr(completion, "usage", None)
+    limiter.record(estimated, usage.total_tokens if usage else estimated)
+    if usage:
+        metrics.TOKENS.inc(usage.prompt_tokens or 0, kind="prompt", **labels)
+        metrics.TOKENS.inc(usage.completion_tokens or 0, kind="completion", **labels)
+    _record_cost(stage, model, completion)
+
+    if cache is not None:
+        await _cache_put(cache, key, completion.model_dump_json())
+    return completion
@@ -0,0 +1,233 @@
+import contextvars
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+# 每百万 token 的价格（美元）：(输入, 输出)。按模型名最长前缀匹配，带日期后缀的快照版本使用同一价格。
+# 价格会调整，可通过 OPENAI_PRICES（JSON 字符串）或 OPENAI_PRICES_FILE（JSON 文件）覆盖或补充，例如
+#   {"gpt-4o": [2.5, 10], "qwen2-72b": {"input": 0, "output": 0}}
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-3.5-turbo": (0.5, 1.5),
+    "gpt-4": (30.0, 60.0),
+    "gpt-4-32k": (60.0, 120.0),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4o": (2.5, 10.0),
+    "gpt-4o-mini": (0.15, 0.6),
+    "gpt-4.1": (2.0, 8.0),
+    "gpt-4.1-mini": (0.4, 1.6),
+    "gpt-4.1-nano": (0.1, 0.4),
+    "o1": (15.0, 60.0),
+    "o1-mini": (1.1, 4.4),
+    "o3-mini": (1.1, 4.4),
+}
+# Batch API 按在线价格的一半计费
+BATCH_DISCOUNT = 0.5
+# 花费达到预算的该比例后进入节省模式：不再开始新的问题，也不再升级到质检
+DEFAULT_BUDGET_RISK = 0.8
+# 在途请求按输入 token 的估计值加上输出 token 预留费用，避免并发请求一起超出预算。
+# 输出 token 取该模型已完成调用的平均值，还没有调用时按这个值估计
+RESERVED_COMPLETION_TOKENS = 256
+
+# 当前运行的费用统计和正在处理的问题，由 StageRunner / 流水线在共享事件循环上设置，create_completion 读取
+current: contextvars.ContextVar[Optional["CostTracker"]] = contextvars.ContextVar("evaluator_costs", default=None)
+current_qid: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("evaluator_qid", default=None)
+
+
+class BudgetExhausted(RuntimeError):
+    pass
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def get_budget() -> Optional[float]:
+    # 单次运行的预算（美元），0 或未设置表示不限制
+    budget = _float_env("OPENAI_RUN_BUDGET", 0.0)
+    return budget if budget > 0 else None
+
+
+def get_prices() -> Dict[str, Tuple[float, float]]:
+    prices = dict(DEFAULT_PRICES)
+    text = os.getenv("OPENAI_PRICES")
+    path = os.getenv("OPENAI_PRICES_FILE")
+    if not text and path:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    if text:
+        for model, price in json.loads(text).items():
+            if isinstance(price, dict):
+                price = (price.get("input", 0), price.get("output", 0))
+            prices[model] = (float(price[0]), float(price[1]))
+    return prices
+
+
+def price_for(model: str, prices: Dict[str, Tuple[float, float]]) -> Optional[Tuple[float, float]]:
+    if model in prices:
+        return prices[model]
+    matches = [name for name in prices if model.startswith(name + "-")]
+    return prices[max(matches, key=len)] if matches else None
+
+
+def empty_usage() -> Dict[str, Any]:
+    return {"calls": 0, "cached_calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0}
+
+
+def _add(totals: Dict[str, Any], entry: Dict[str, Any]):
+    for name, value in entry.items():
+        totals[name] += value
+
+
+class CostTracker:
+    # 一次运行（GUI 的一个阶段、一个 API 请求或任务、一次 SDK 调用）的 token 用量和费用，
+    # 按阶段、模型和问题汇总。缓存命中的调用记录 token 但不计费用。
+    # 设置了预算时，花费达到 risk 比例后 at_risk() 为真，调用方据此走最便宜的路径；
+    # 达到预算后 exhausted() 为真，不再发出新的请求。被推迟的问题记录在 deferred 中，
+    # 它们没有写入结果，重新运行（从检查点恢复）时会补齐
+
+    def __init__(self, budget: Optional[float] = None, risk: Optional[float] = None,
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        budget = get_budget() if budget is None else float(budget)
+        self.budget = budget if budget and budget > 0 else None
+        self.risk = _float_env("OPENAI_BUDGET_RISK", DEFAULT_BUDGET_RISK) if risk is None else risk
+        self.prices = get_prices() if prices is None else prices
+        self.total = empty_usage()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self.models: Dict[str, Dict[str, Any]] = {}
+        self.questions: Dict[str, Dict[str, Any]] = {}
+        self.unpriced = set()  # 价格表中没有的模型，按 0 计费
+        self.deferred: Dict[str, str] = {}  # 因预算推迟的 {问题 ID: 停在的阶段}
+        self.reserved = 0.0  # 在途请求的预估费用
+        # 评分回复的解析方式（json/exact/recovered/invalid）、格式错误重新请求和使用默认分数的次数
+        self.scoring = dict.fromkeys(("json", "exact", "recovered", "invalid", "retries", "fallbacks"), 0)
+        self._lock = threading.Lock()
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        price = price_for(model, self.prices)
+        if price is None:
+            self.unpriced.add(model)
+            return 0.0
+        return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+    def record(self, stage: str, model: str, usage, cached: bool = False, batch: bool = False,
+               qid: Optional[str] = None):
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        cost = 0.0
+        if not cached:
+            cost = self.cost(model, prompt_tokens, completion_tokens) * (BATCH_DISCOUNT if batch else 1)
+        entry = {
+            "calls": 1, "cached_calls": int(cached),
+            "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "cost": cost,
+        }
+        qid = current_qid.get() if qid is None else qid
+        with self._lock:
+            _add(self.total, entry)
+            _add(self.stages.setdefault(stage, empty_usage()), entry)
+            _add(self.models.setdefault(model, empty_usage()), entry)
+            if qid is not None:
+                _add(self.questions.setdefault(qid, empty_usage()), entry)
+
+    def reserve(self, model: str, prompt_tokens: int, choices: int = 1) -> float:
+        # 请求发出前预留预估费用，返回值在请求结束后交给 release
+        with self._lock:
+            stats = self.models.get(model)
+            if stats and stats["calls"]:
+                completion_tokens = stats["completion_tokens"] / stats["calls"]
+            else:
+                completion_tokens = RESERVED_COMPLETION_TOKENS
+            # n>1 的请求（多位评测员合并为一次请求）输出 token 按份数计
+            completion_tokens *= choices
+            amount = self.cost(model, prompt_tokens, completion_tokens)
+            self.reserved += amount
+        return amount
+
+    def release(self, amount: float):
+        with self._lock:
+            self.reserved = max(0.0, self.reserved - amount)
+
+    @property
+    def spent(self) -> float:
+        return self.total["cost"]
+
+    @property
+    def committed(self) -> float:
+        # 已花费加上在途请求的预估费用
+        return self.spent + self.reserved
+
+    def at_risk(self) -> bool:
+        return self.budget is not None and self.committed >= self.budget * self.risk
+
+    def exhausted(self) -> bool:
+        return self.budget is not None and self.committed >= self.budget
+
+    def count_scoring(self, name: str, count: int = 1):
+        with self._lock:
+            self.scoring[name] = self.scoring.get(name, 0) + count
+
+    def scoring_summary(self) -> Dict[str, Any]:
+        with self._lock:
+            summary = dict(self.scoring)
+        parsed = sum(summary[name] for name in ("json", "exact", "recovered", "invalid"))
+        summary["retry_rate"] = round(summary["retries"] / parsed, 4) if parsed else 0.0
+        return summary
+
+    def defer(self, qid: str, stage: str):
+        with self._lock:
+            self.deferred.setdefault(qid, stage)
+
+    def summary(self, per_question: bool = True) -> Dict[str, Any]:
+        with self._lock:
+            summary = {
+                "budget": self.budget,
+                "spent": round(self.spent, 6),
+                "total": dict(self.total),
+                "stages": {name: dict(v) for name, v in self.stages.items()},
+                "models": {name: dict(v) for name, v in self.models.items()},
+                "unpriced_models": sorted(self.unpriced),
+                "deferred": dict(self.deferred),
+            }
+            if per_question:
+                summary["questions"] = {qid: dict(v) for qid, v in self.questions.items()}
+        summary["scoring"] = self.scoring_summary()
+        return summary
+
+    def describe(self) -> str:
+        # 一行摘要，供 GUI 和命令行显示
+        total = self.total
+        text = (f"费用 ${self.spent:.4f}（{total['calls']} 次调用，其中缓存 {total['cached_calls']} 次；"
+                f"输入 {total['prompt_tokens']} / 输出 {total['completion_tokens']} token）")
+        if self.budget is not None:
+            text += f"，预算 ${self.budget:.2f}"
+        scoring = self.scoring_summary()
+        parsed = sum(scoring[name] for name in ("json", "exact", "recovered", "invalid"))
+        if parsed:
+            text += (f"；评分回复 {parsed} 条，结构化 {scoring['json']} / 容错解析 {scoring['recovered']}，"
+                     f"格式错误重新请求 {scoring['retries']} 次（{scoring['retry_rate']:.1%}）")
+        if self.unpriced:
+            text += f"；未定价的模型按 0 计：{', '.join(sorted(self.unpriced))}"
+        return text
+
+    def deferred_notice(self) -> Optional[str]:
+        if not self.deferred:
+            return None
+        return (f"花费 ${self.spent:.4f} 已接近预算 ${self.budget:.2f}，{len(self.deferred)} 个问题推迟到下次运行；"
+                f"提高预算后重新运行即可从检查点继续")
+
+
+def set_qid(qid: str):
+    # 在处理一个问题的协程开头调用，之后该协程（及其创建的子任务）发出的请求都计入这个问题
+    current_qid.set(qid)
+
+
+async def bind(tracker: Optional[CostTracker], coro):
+    # 在共享事件循环上执行 coro，期间发出的请求计入 tracker
+    token = current.set(tracker)
+    try:
+        return await coro
+    finally:
+        current.reset(token)
@@ -0,0 +1,208 @@
+import codecs
+import json
+import os
+from itertools import islice
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# 按扩展名识别 JSONL 文件，其余文件按单个 JSON 对象 {"qid": "问题", ...} 流式解析
+JSONL_EXTENSIONS = (".jsonl", ".ndjson")
+CHUNK_SIZE = 1 << 20
+_WHITESPACE = " \t\r\n"
+_UTF8_BOM = codecs.BOM_UTF8
+_decoder = json.JSONDecoder()
+
+
+class DatasetError(ValueError):
+    pass
+
+
+def is_jsonl(path: str) -> bool:
+    return os.path.splitext(path)[1].lower() in JSONL_EXTENSIONS
+
+
+def _parse_jsonl_record(line: str, lineno: int) -> Tuple[str, Any]:
+    # 支持 {"id": "q1", "question": "..."} 和 {"q1": "..."} 两种写法
+    try:
+        record = json.loads(line)
+    except ValueError as e:
+        raise DatasetError(f"第 {lineno} 行不是合法的 JSON: {e}")
+    if isinstance(record, dict):
+        if "question" in record:
+            qid = record.get("id", record.get("qid", lineno))
+            return str(qid), record["question"]
+        if len(record) == 1:
+            (qid, question), = record.items()
+            return qid, question
+    raise DatasetError(f"第 {lineno} 行格式不正确，应为 {{\"id\": ..., \"question\": ...}} 或 {{\"qid\": \"问题\"}}")
+
+
+def iter_jsonl(path: str, offset: int = 0) -> Iterator[Tuple[str, Any, int]]:
+    # 逐行解析，同时返回每条记录在文件中的字节偏移，用于按 qid 随机读取
+    with open(path, "rb") as f:
+        f.seek(offset)
+        lineno = 0
+        for raw in f:
+            lineno += 1
+            start = offset
+            offset += len(raw)
+            if start == 0 and raw.startswith(_UTF8_BOM):
+                raw = raw[len(_UTF8_BOM):]
+            line = raw.decode("utf-8").strip()
+            if line:
+                qid, question = _parse_jsonl_record(line, lineno)
+                yield qid, question, start
+
+
+class _JSONStream:
+    # 在按块读入的文本缓冲区上逐个解码 JSON 值，并记录缓冲区起点的字节偏移
+
+    def __init__(self, f, offset: int = 0):
+        self.f = f
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.byte_offset = offset
+        self.eof = False
+        f.seek(offset)
+        if offset == 0:
+            head = f.read(len(_UTF8_BOM))
+            if head == _UTF8_BOM:
+                self.byte_offset = len(_UTF8_BOM)
+            else:
+                f.seek(0)
+
+    def fill(self) -> bool:
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.decoder.decode(b"", final=True)
+            return False
+        self.buffer += self.decoder.decode(chunk)
+        return True
+
+    def trim(self):
+        # 丢弃已解析的部分，保证内存占用只和单条记录的大小有关
+        self.byte_offset += len(self.buffer[:self.pos].encode("utf-8"))
+        self.buffer = self.buffer[self.pos:]
+        self.pos = 0
+
+    def tell(self) -> int:
+        return self.byte_offset + len(self.buffer[:self.pos].encode("utf-8"))
+
+    def peek(self) -> str:
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.trim()
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        ch = self.peek()
+        if not ch or ch not in chars:
+            raise DatasetError(f"JSON 格式错误：在字节 {self.tell()} 处应为 {' 或 '.join(chars)}")
+        self.pos += 1
+        return ch
+
+    def decode_value(self) -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+                # 值恰好到缓冲区末尾时（例如数字）可能被截断，读入更多数据后再解析
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError as e:
+                if self.eof:
+                    raise DatasetError(f"JSON 格式错误：{e}")
+            self.fill()
+
+
+def iter_json_object(path: str) -> Iterator[Tuple[str, Any, int]]:
+    # 增量解析顶层 JSON 对象，逐个产出 (qid, 问题, 问题值的字节偏移)
+    with open(path, "rb") as f:
+        stream = _JSONStream(f)
+        stream.expect("{")
+        if stream.peek() == "}":
+            return
+        while True:
+            qid = stream.decode_value()
+            if not isinstance(qid, str):
+                raise DatasetError(f"JSON 格式错误：在字节 {stream.tell()} 处应为字符串键")
+            stream.expect(":")
+            stream.peek()
+            offset = stream.tell()
+            question = stream.decode_value()
+            yield qid, question, offset
+            stream.trim()
+            if stream.expect(",}") == "}":
+                return
+
+
+def _read_json_value(path: str, offset: int) -> Any:
+    with open(path, "rb") as f:
+        return _JSONStream(f, offset).decode_value()
+
+
+class QuestionSource:
+    # 问题集文件的惰性视图：像 dict 一样支持 items()/len()/in/[]，
+    # 但问题内容只在需要时从文件中逐条读取，不会一次性载入内存
+
+    def __init__(self, path: str):
+        self.path = path
+        self.jsonl = is_jsonl(path)
+        self._count: Optional[int] = None
+        self._index: Optional[Dict[str, int]] = None
+
+    def _records(self) -> Iterator[Tuple[str, Any, int]]:
+        return iter_jsonl(self.path) if self.jsonl else iter_json_object(self.path)
+
+    def items(self) -> Iterator[Tuple[str, Any]]:
+        for qid, question, _ in self._records():
+            yield qid, question
+
+    def __iter__(self) -> Iterator[str]:
+        for qid, _ in self.items():
+            yield qid
+
+    def keys(self) -> Iterator[str]:
+        return iter(self)
+
+    def preview(self, limit: int) -> Dict[str, Any]:
+        return dict(islice(self.items(), limit))
+
+    def __len__(self) -> int:
+        if self._count is None:
+            if self._index is not None:
+                self._count = len(self._index)
+            elif self.jsonl:
+                # 只数非空行，不解析内容
+                with open(self.path, "rb") as f:
+                    self._count = sum(1 for line in f if line.strip())
+            else:
+                self._count = sum(1 for _ in self._records())
+        return self._count
+
+    def _ensure_index(self) -> Dict[str, int]:
+        # qid -> 字节偏移的索引，只保存键和整数，第一次按 qid 访问时建立
+        if self._index is None:
+            self._index = {qid: offset for qid, _, offset in self._records()}
+        return self._index
+
+    def __contains__(self, qid) -> bool:
+        return qid in self._ensure_index()
+
+    def __getitem__(self, qid: str) -> Any:
+        offset = self._ensure_index()[qid]
+        if self.jsonl:
+            return next(iter_jsonl(self.path, offset))[1]
+        return _read_json_value(self.path, offset)
+
+    def get(self, qid: str, default: Any = None) -> Any:
+        try:
+            return self[qid]
+        except KeyError:
+            return default
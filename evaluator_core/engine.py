@@ -0,0 +1,80 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+# 默认最大并发请求数，可通过 OPENAI_MAX_IN_FLIGHT 环境变量或设置界面调整
+DEFAULT_MAX_IN_FLIGHT = 8
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_max_in_flight() -> int:
+    try:
+        value = int(os.getenv("OPENAI_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT))
+    except ValueError:
+        value = DEFAULT_MAX_IN_FLIGHT
+    return max(1, value)
+
+
+def get_loop() -> asyncio.AbstractEventLoop:
+    # 整个进程共用一个后台事件循环，QThread 和 Flask 线程都把协程提交到这里执行
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            thread = threading.Thread(target=_loop.run_forever, name="evaluator-engine", daemon=True)
+            thread.start()
+    return _loop
+
+
+def submit(coro: Awaitable) -> concurrent.futures.Future:
+    # 把协程提交到共享事件循环，返回的 Future 可以在任意线程中等待；取消它会取消协程，
+    # 协程中在途的 HTTP 请求随之中止
+    return asyncio.run_coroutine_threadsafe(coro, get_loop())
+
+
+def run(coro: Awaitable) -> Any:
+    # 在共享事件循环上执行协程，并阻塞当前线程直到拿到结果
+    return submit(coro).result()
+
+
+async def run_bounded(
+    items: Iterable[Tuple[str, Any]],
+    worker: Callable[[str, Any], Awaitable[Any]],
+    results: Dict[str, Any],
+    max_in_flight: Optional[int] = None,
+    on_progress: Optional[Callable[[int], None]] = None,
+    on_failure: Optional[Callable[[str, Any, Exception], None]] = None,
+) -> Dict[str, Any]:
+    # 用固定数量的协程从同一个迭代器中取任务，保证同时在途的请求不超过 max_in_flight。
+    # 结果写入调用方传入的 results，出错时已完成的部分不会丢失。
+    # 指定 on_failure 时单个任务出错只调用 on_failure(qid, item, 异常)，其余任务继续执行
+    iterator = iter(items)
+    completed = 0
+
+    async def drain():
+        nonlocal completed
+        for qid, item in iterator:
+            try:
+                results[qid] = await worker(qid, item)
+            except Exception as e:
+                if on_failure is None:
+                    raise
+                on_failure(qid, item, e)
+                continue
+            completed += 1
+            if on_progress:
+                on_progress(completed)
+
+    workers = [asyncio.create_task(drain()) for _ in range(max_in_flight or get_max_in_flight())]
+    try:
+        await asyncio.gather(*workers)
+    except BaseException:
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        raise
+    return results
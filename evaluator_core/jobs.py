@@ -0,0 +1,249 @@
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# 同时执行的任务数和排队上限，超出上限的提交会被拒绝而不是无限堆积线程
+DEFAULT_JOB_WORKERS = 2
+DEFAULT_JOB_QUEUE = 16
+# 已结束的任务最多保留的数量，超出后丢弃最早结束的
+DEFAULT_JOB_RETENTION = 200
+# 任务结束超过该秒数后压缩事件：逐题结果的内容已在最终结果中，事件只保留序号和阶段、问题 ID，
+# 并且最多保留最近的 DEFAULT_JOB_EVENT_LIMIT 条
+DEFAULT_JOB_EVENT_GRACE = 60
+DEFAULT_JOB_EVENT_LIMIT = 1000
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINAL_STATES = (SUCCEEDED, FAILED, CANCELLED)
+
+
+class JobQueueFull(RuntimeError):
+    pass
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+class Job:
+    # 任务的进度和逐题结果以事件的形式发布，事件带有递增的序号，订阅者可以从任意序号继续读取。
+    # keep_events=False 时只有一个订阅者，读取过的事件随即丢弃；keep_result=False 时不保留最终结果，
+    # 用于结果全部通过事件流发出的任务
+
+    def __init__(self, kind: str, keep_events: bool = True, keep_result: bool = True):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.state = QUEUED
+        self.progress = 0
+        self.result = None
+        self.error: Optional[str] = None
+        self.warnings: List[str] = []
+        self.costs = None  # costs.CostTracker，由处理函数设置
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.cancel_event = threading.Event()
+        self.keep_events = keep_events
+        self.keep_result = keep_result
+        self._events: List[Dict[str, Any]] = []
+        self._first_seq = 0  # _events[0] 的序号
+        self._compacted = False
+        self._cond = threading.Condition()
+        self._cancel_callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINAL_STATES
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def set_progress(self, value: int):
+        value = max(self.progress, min(100, int(value)))
+        if value != self.progress:
+            self.progress = value
+            self.publish("progress", progress=value)
+
+    def warn(self, message: str):
+        self.warnings.append(message)
+        self.publish("warning", message=message)
+
+    def publish(self, event: str, **data):
+        with self._cond:
+            seq = self._first_seq + len(self._events)
+            self._events.append({"event": event, "seq": seq, **data})
+            self._cond.notify_all()
+
+    def iter_events(self, since: int = 0, heartbeat: float = 15.0) -> Iterator[Optional[Dict[str, Any]]]:
+        # 依次产出序号不小于 since 的事件，产出 end 事件后结束；超过 heartbeat 秒没有新事件时产出 None
+        while True:
+            with self._cond:
+                since = max(since, self._first_seq)
+                if since - self._first_seq >= len(self._events):
+                    self._cond.wait(heartbeat)
+                events = self._events[since - self._first_seq:]
+                if not self.keep_events:
+                    del self._events[:since - self._first_seq + len(events)]
+                    self._first_seq = since + len(events)
+            if not events:
+                yield None
+                continue
+            for event in events:
+                yield event
+                if event["event"] == "end":
+                    return
+            since = events[-1]["seq"] + 1
+
+    def compact(self, limit: int):
+        # 已结束的任务丢弃 result 事件的 value，只保留最近 limit 条事件；从更早的序号继续读取时从第一条保留的事件开始
+        with self._cond:
+            if self._compacted:
+                return
+            dropped = max(0, len(self._events) - limit)
+            self._events = [{k: v for k, v in event.items() if k != "value"} for event in self._events[dropped:]]
+            self._first_seq += dropped
+            self._compacted = True
+
+    def on_cancel(self, callback: Callable[[], None]):
+        # 任务运行时注册取消回调，已经取消的任务立即回调
+        with self._lock:
+            self._cancel_callbacks.append(callback)
+            cancelled = self.cancel_event.is_set()
+        if cancelled:
+            callback()
+
+    def cancel(self):
+        with self._lock:
+            self.cancel_event.set()
+            callbacks = list(self._cancel_callbacks)
+        for callback in callbacks:
+            callback()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "progress": self.progress,
+            "error": self.error,
+            "warnings": self.warnings,
+            "costs": self.costs.summary(per_question=False) if self.costs is not None else None,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+        }
+
+
+class JobManager:
+    # 所有任务共用一个固定大小的线程池；排队和运行中的任务总数受 max_queue + max_workers 限制
+
+    def __init__(self, max_workers: Optional[int] = None, max_queue: Optional[int] = None,
+                 retention: Optional[int] = None, event_grace: Optional[float] = None,
+                 event_limit: Optional[int] = None):
+        self.max_workers = max_workers or _env_int("OPENAI_JOB_WORKERS", DEFAULT_JOB_WORKERS)
+        self.max_queue = max_queue or _env_int("OPENAI_JOB_QUEUE", DEFAULT_JOB_QUEUE)
+        self.retention = retention or _env_int("OPENAI_JOB_RETENTION", DEFAULT_JOB_RETENTION)
+        self.event_grace = _env_int("OPENAI_JOB_EVENT_GRACE", DEFAULT_JOB_EVENT_GRACE) if event_grace is None else event_grace
+        self.event_limit = event_limit or _env_int("OPENAI_JOB_EVENT_LIMIT", DEFAULT_JOB_EVENT_LIMIT)
+        self.executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="evaluator-job")
+        self._slots = threading.BoundedSemaphore(self.max_workers + self.max_queue)
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def submit(self, kind: str, fn: Callable[[Job], Any], keep_events: bool = True,
+               keep_result: bool = True) -> Job:
+        if not self._slots.acquire(blocking=False):
+            raise JobQueueFull(f"任务队列已满（最多 {self.max_workers + self.max_queue} 个未完成的任务）")
+        job = Job(kind, keep_events, keep_result)
+        self._prune()
+        with self._lock:
+            self._jobs[job.id] = job
+        try:
+            self.executor.submit(self._run, job, fn)
+        except BaseException:
+            self._slots.release()
+            raise
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]):
+        try:
+            if job.cancelled:
+                job.state = CANCELLED
+                return
+            job.state = RUNNING
+            job.started_at = time.time()
+            try:
+                result = fn(job)
+                if job.keep_result:
+                    job.result = result
+            except Exception as e:
+                job.error = str(e)
+                job.state = FAILED
+            else:
+                # 取消的任务保留已完成的部分结果
+                job.state = CANCELLED if job.cancelled else SUCCEEDED
+                if job.state == SUCCEEDED:
+                    job.set_progress(100)
+        finally:
+            job.finished_at = time.time()
+            job.publish("end", state=job.state, error=job.error)
+            self._slots.release()
+            self._prune()
+
+    def _prune(self):
+        # 丢弃超出保留数量的已结束任务；其余已结束的任务过了宽限期后压缩事件，宽限期内仍在读取事件流的订阅者不受影响
+        now = time.time()
+        with self._lock:
+            finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+            for job_id in finished[:max(0, len(finished) - self.retention)]:
+                del self._jobs[job_id]
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if job.finished_at is not None and now - job.finished_at >= self.event_grace:
+                job.compact(self.event_limit)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def counts(self) -> Dict[str, int]:
+        # 各状态的任务数，queued 即排队深度
+        counts = dict.fromkeys((QUEUED, RUNNING) + FINAL_STATES, 0)
+        for job in self.list():
+            counts[job.state] += 1
+        return counts
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is not None and not job.finished:
+            job.cancel()
+        return job
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_manager() -> JobManager:
+    # 进程内共用一个任务管理器
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+    return _manager
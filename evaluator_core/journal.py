@@ -0,0 +1,38 @@
+import os
+from typing import Any, Container, Dict, Optional
+
+from evaluator_core.sink import STAGES, ResultStreamWriter, add_record, read_records
+
+
+def journal_path(questions_path: str) -> str:
+    return f"{questions_path}.journal.jsonl"
+
+
+class RunJournal(ResultStreamWriter):
+    # 检查点日志就是一个结果流：每完成一个问题的某个阶段就写一行，程序崩溃后可据此恢复
+    pass
+
+
+def load_journal(path: str, qids: Optional[Container[str]] = None) -> Dict[str, Any]:
+    # 读取日志并还原成 current_data 的结构。
+    # 指定 qids 时只保留这些问题的记录（问题集文件被修改过的情况）
+    data: Dict[str, Any] = {"answers": {}}
+    if not os.path.exists(path):
+        return data
+    for record in read_records(path):
+        if qids is not None and record["qid"] not in qids:
+            continue
+        try:
+            add_record(data, record["stage"], record["qid"], record["value"])
+        except (KeyError, TypeError):
+            continue
+    return data
+
+
+def count_records(data: Dict[str, Any]) -> Dict[str, int]:
+    counts = {}
+    for stage in STAGES:
+        if stage not in data:
+            continue
+        counts[stage] = len(data[stage]) if stage == "answers" else len(data[stage]["scores"])
+    return counts
@@ -0,0 +1,286 @@
+import bisect
+import contextvars
+from abc import ABC, abstractmethod
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 进程内的运行指标，按 Prometheus 文本格式（version 0.0.4）输出，由 API 服务的 /metrics 接口暴露。
+# 指标只在内存中累计，进程重启后清零，由 Prometheus 负责计算速率和保存历史
+
+# 模型调用耗时从几十毫秒到几分钟不等，桶的范围比 Prometheus 默认的更宽
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0)
+
+# 当前模型调用的 (阶段, 模型)，供 HTTP 层的钩子给首字节时间等指标打标签
+current_call: contextvars.ContextVar[Optional[Tuple[str, str]]] = contextvars.ContextVar(
+    "evaluator_current_call", default=None
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class Metric(ABC):
+    # 各类指标的基类，子类给出 kind 和按 Prometheus 文本格式输出的样本行
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        pass
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self.samples()]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def total(self, **labels) -> float:
+        # 对给定标签之外的维度求和
+        with self._lock:
+            items = list(self._values.items())
+        return sum(value for key, value in items
+                   if all(key[self.labels.index(name)] == str(v) for name, v in labels.items()))
+
+    def label_values(self, name: str) -> List[str]:
+        # 某个标签出现过的取值
+        with self._lock:
+            keys = list(self._values)
+        index = self.labels.index(name)
+        return sorted({key[index] for key in keys})
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Gauge(Metric):
+    kind = "gauge"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 collect: Optional[Callable[[], Dict[Tuple[str, ...], float]]] = None):
+        # collect 不为空时在输出时调用，返回 {标签值元组: 数值}
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._collect = collect
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self):
+        if self._collect is not None:
+            try:
+                values = self._collect()
+            except Exception:
+                values = {}
+        else:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple[str, ...], list] = {}  # [各桶计数（不累计）..., +Inf 桶, 总和]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labels, key, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(counts[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+# ---- 模型调用 ----
+
+REQUESTS = REGISTRY.register(Counter(
+    "evaluator_requests_total", "模型调用次数，outcome 为 ok/error/cached", ("stage", "model", "outcome")))
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "evaluator_request_duration_seconds", "模型调用耗时（含重试和退避等待，不含限流等待和缓存命中）",
+    ("stage", "model")))
+TIME_TO_FIRST_BYTE = REGISTRY.register(Histogram(
+    "evaluator_time_to_first_byte_seconds", "每次 HTTP 请求从发出到收到响应头的时间", ("stage", "model")))
+API_RESPONSES = REGISTRY.register(Counter(
+    "evaluator_api_responses_total", "每次 HTTP 请求的响应状态码（包括被重试的 429/5xx）",
+    ("stage", "model", "status")))
+RETRIES = REGISTRY.register(Counter(
+    "evaluator_retries_total", "连接失败、超时、429、5xx 后退避重试的次数，reason 为 timeout/connection/状态码",
+    ("stage", "model", "reason")))
+RATELIMIT_WAIT = REGISTRY.register(Histogram(
+    "evaluator_ratelimit_wait_seconds", "请求在本地限流器中等待的时间", ("stage", "model")))
+IN_FLIGHT = REGISTRY.register(Gauge(
+    "evaluator_in_flight_requests", "已发出、尚未返回的模型调用数", ("stage", "model")))
+WAITING = REGISTRY.register(Gauge(
+    "evaluator_waiting_requests", "在本地限流器中排队的模型调用数", ("stage", "model")))
+TOKENS = REGISTRY.register(Counter(
+    "evaluator_tokens_total", "响应 usage 中的 token 数，kind 为 prompt/completion", ("stage", "model", "kind")))
+
+# ---- 评分 ----
+
+FORMAT_RETRIES = REGISTRY.register(Counter(
+    "evaluator_format_retries_total", "评分格式错误后重新请求的次数", ("stage", "model")))
+FALLBACKS = REGISTRY.register(Counter(
+    "evaluator_fallback_scores_total", "多次格式错误后使用默认分数或平均分的次数", ("stage", "model")))
+SCORE_PARSES = REGISTRY.register(Counter(
+    "evaluator_score_parses_total",
+    "评分回复的解析结果，outcome 为 json/exact/recovered/invalid，recovered 即容错解析省下的重新请求",
+    ("stage", "model", "outcome")))
+
+
+def _format_retry_ratio():
+    # 每个阶段重新请求次数占评分回复数的比例
+    ratios = {}
+    for stage in SCORE_PARSES.label_values("stage"):
+        total = SCORE_PARSES.total(stage=stage)
+        ratios[(stage,)] = FORMAT_RETRIES.total(stage=stage) / total if total else 0.0
+    return ratios
+
+
+REGISTRY.register(Gauge("evaluator_format_retry_ratio", "进程启动以来格式错误重新请求次数与评分回复数之比",
+                        ("stage",), collect=_format_retry_ratio))
+
+# ---- 缓存 ----
+
+CACHE_LOOKUPS = REGISTRY.register(Counter(
+    "evaluator_cache_lookups_total", "响应缓存查询次数，result 为 hit/miss", ("stage", "model", "result")))
+
+
+def _cache_hit_ratio():
+    hits = CACHE_LOOKUPS.total(result="hit")
+    total = hits + CACHE_LOOKUPS.total(result="miss")
+    return {(): hits / total if total else 0.0}
+
+
+REGISTRY.register(Gauge("evaluator_cache_hit_ratio", "进程启动以来响应缓存的命中率", collect=_cache_hit_ratio))
+
+# ---- HTTP 接口 ----
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "evaluator_http_requests_total", "API 服务收到的请求数", ("route", "method", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "evaluator_http_request_duration_seconds", "API 服务处理请求的时间（流式响应只计到开始发送）",
+    ("route", "method")))
+
+
+def register_gauge(name: str, help_text: str, labels: Sequence[str],
+                   collect: Callable[[], Dict[Tuple[str, ...], float]]) -> Gauge:
+    # 输出时才计算的指标（如任务队列深度），重复注册同名指标时返回已有的
+    with REGISTRY._lock:
+        for metric in REGISTRY._metrics:
+            if metric.name == name:
+                return metric
+    return REGISTRY.register(Gauge(name, help_text, labels, collect))
+
+
+# ---- HTTP 层钩子：在 clients 创建的 httpx 客户端上统计首字节时间和响应状态 ----
+
+_START = "evaluator_started_at"
+
+
+async def on_request(request):
+    request.extensions = {**request.extensions, _START: time.perf_counter()}
+
+
+async def on_response(response):
+    call = current_call.get()
+    if call is None:
+        return
+    stage, model = call
+    started = response.request.extensions.get(_START)
+    if started is not None:
+        TIME_TO_FIRST_BYTE.observe(time.perf_counter() - started, stage=stage, model=model)
+    API_RESPONSES.inc(stage=stage, model=model, status=response.status_code)
@@ -0,0 +1,147 @@
+import asyncio
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from evaluator_core import costs, engine, stages
+
+# 流水线产出的阶段，与 MainWindow.current_data 的键一致
+SCORE_STAGES = ("scores1", "scores2", "final_scores")
+
+
+def init_results(resume: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    # 以已完成的结果为起点，结构与 current_data 相同
+    resume = resume or {}
+    results: Dict[str, Any] = {"answers": dict(resume.get("answers") or {})}
+    for stage in SCORE_STAGES:
+        section = resume.get(stage) or {}
+        results[stage] = {
+            "scores": dict(section.get("scores", {})),
+            "reasons": dict(section.get("reasons", {})),
+        }
+    return results
+
+
+def default_settings() -> Dict[str, Any]:
+    # 流水线使用的模型、提示词和评测方式，默认取自环境变量（设置界面写入的配置）
+    answer_model, answer_content = stages.answer_settings()
+    eval_model, eval_content = stages.eval_settings()
+    quality_model, quality_content = stages.quality_settings()
+    max_judges, target = stages.panel_settings()
+    return {
+        "answer_model": answer_model,
+        "answer_content": answer_content,
+        "eval_model": eval_model,
+        "eval_content": eval_content,
+        "quality_model": quality_model,
+        "quality_content": quality_content,
+        "multi_sample": stages.multi_sample_enabled(),
+        "adaptive_panel": stages.panel_enabled(),
+        "panel_max_judges": max_judges,
+        "panel_se_target": target,
+    }
+
+
+async def process_question(client, qid: str, question: str, results: Dict[str, Any], settings: Dict[str, Any],
+                           on_result: Optional[Callable[[str, str, Any], None]] = None):
+    # 对一个问题依次执行回答→两位评测员并行评分→质检，results 中已有的结果不再请求。
+    # 设置了预算时按花费选择最便宜的路径：接近预算后不再开始新的问题、有分歧的问题不再升级到质检，
+    # 用尽后不再发出任何请求。推迟的问题停在当前阶段，已完成的阶段照常保存，下次运行从这里继续
+    answers = results["answers"]
+    final = results["final_scores"]
+    eval_model, eval_content = settings["eval_model"], settings["eval_content"]
+    tracker = costs.current.get()
+    costs.set_qid(qid)
+
+    def deferred(stage, at_risk=False):
+        if tracker is None or not (tracker.at_risk() if at_risk else tracker.exhausted()):
+            return False
+        tracker.defer(qid, stage)
+        return True
+
+    def report(stage, value):
+        if on_result:
+            on_result(stage, qid, value)
+
+    async def evaluate(evaluator_num):
+        section = results[f"scores{evaluator_num}"]
+        if qid in section["scores"]:
+            return
+        score, reason = await stages.evaluate_answer(client, answers[qid], eval_model, eval_content, evaluator_num)
+        section["scores"][qid] = score
+        section["reasons"][qid] = reason
+        report(f"scores{evaluator_num}", {"score": score, "reason": reason})
+
+    if qid not in answers:
+        if deferred("answers", at_risk=True):
+            return
+        answers[qid] = await stages.answer_question(
+            client, question, settings["answer_model"], settings["answer_content"]
+        )
+        report("answers", answers[qid])
+    # 自适应评测组先只请求第一位评测员，第二位评测员在评分不够明确时由评测组加入
+    evaluators = (1,) if settings["adaptive_panel"] else (1, 2)
+    missing = [n for n in evaluators if qid not in results[f"scores{n}"]["scores"]]
+    if missing and deferred(f"scores{missing[0]}"):
+        return
+    if len(missing) > 1 and settings["multi_sample"]:
+        samples = await stages.evaluate_samples(client, answers[qid], eval_model, eval_content, missing)
+        for evaluator_num, (score, reason) in samples.items():
+            section = results[f"scores{evaluator_num}"]
+            section["scores"][qid] = score
+            section["reasons"][qid] = reason
+            report(f"scores{evaluator_num}", {"score": score, "reason": reason})
+    else:
+        await asyncio.gather(*(evaluate(n) for n in missing))
+    if qid not in final["scores"]:
+        s1, s2 = results["scores1"], results["scores2"]
+        if settings["adaptive_panel"]:
+            escalate = stages.panel_needs_judges(s1["scores"][qid], s2["scores"].get(qid), settings["panel_se_target"])
+        else:
+            escalate = not stages.scores_agree(s1["scores"][qid], s2["scores"][qid])
+        if escalate and deferred("final_scores", at_risk=True):
+            return
+        if settings["adaptive_panel"]:
+            score, reason = await stages.adaptive_panel(
+                client, answers[qid],
+                s1["scores"][qid], s1["reasons"][qid], s2["scores"].get(qid), s2["reasons"].get(qid),
+                eval_model, eval_content, settings["panel_max_judges"], settings["panel_se_target"]
+            )
+        else:
+            score, reason = await stages.check_quality(
+                client, question, answers[qid],
+                s1["scores"][qid], s1["reasons"][qid], s2["scores"][qid], s2["reasons"][qid],
+                settings["quality_model"], settings["quality_content"]
+            )
+        final["scores"][qid] = score
+        final["reasons"][qid] = reason
+        report("final_scores", {"score": score, "reason": reason})
+
+
+async def run_pipeline(client, questions: Iterable[Tuple[str, str]], results: Dict[str, Any],
+                       on_result: Optional[Callable[[str, str, Any], None]] = None,
+                       max_in_flight: Optional[int] = None,
+                       settings: Optional[Dict[str, Any]] = None,
+                       on_failure: Optional[Callable[[str, Any, Exception], None]] = None) -> Dict[str, Any]:
+    # 按问题流水线执行：每个问题生成答案后立即由两位评测员并行评分，两份评分都完成后立即质检。
+    # 不同问题处于不同阶段，回答、评测、质检三个模型同时在工作，不必等上一阶段全部完成。
+    # max_in_flight 限制同时在处理的问题数，每个问题同一时刻最多有两个请求（两位评测员，合并评测时为一个）。
+    # 指定 on_failure 时单个问题出错不影响其他问题，已完成的阶段保留在 results 中
+    settings = settings or default_settings()
+
+    async def process(qid, question):
+        await process_question(client, qid, question, results, settings, on_result)
+
+    await engine.run_bounded(questions, process, {}, max_in_flight, on_failure=on_failure)
+    return results
+
+
+def order_results(results: Dict[str, Any], qids: Iterable[str]) -> Dict[str, Any]:
+    # 按问题顺序整理结果
+    qids = list(qids)
+    ordered: Dict[str, Any] = {"answers": {q: results["answers"][q] for q in qids if q in results["answers"]}}
+    for stage in SCORE_STAGES:
+        section = results[stage]
+        ordered[stage] = {
+            "scores": {q: section["scores"][q] for q in qids if q in section["scores"]},
+            "reasons": {q: section["reasons"][q] for q in qids if q in section["reasons"]},
+        }
+    return ordered
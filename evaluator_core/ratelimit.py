@@ -0,0 +1,147 @@
+import asyncio
+import os
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+# 各阶段使用的模型（环境变量名，默认值），与 stages 中的设置保持一致
+STAGE_MODELS = {
+    "answer": ("OPENAI_ANSWER_MODEL", "gpt-3.5-turbo"),
+    "evaluate": ("OPENAI_EVAL_MODEL", "gpt-4"),
+    "quality": ("OPENAI_QUALITY_MODEL", "gpt-4"),
+}
+# 各阶段的 RPM/TPM 配额环境变量前缀，例如 OPENAI_EVAL_RPM、OPENAI_EVAL_TPM，0 表示不限制
+STAGE_BUDGET_PREFIX = {
+    "answer": "OPENAI_ANSWER",
+    "evaluate": "OPENAI_EVAL",
+    "quality": "OPENAI_QUALITY",
+}
+# 发请求前无法知道回复长度，先按这个数预留，拿到 usage 后再多退少补
+DEFAULT_COMPLETION_TOKENS = 256
+
+_limiters: Dict[str, "RateLimiter"] = {}
+
+
+class TokenBucket:
+    def __init__(self, per_minute: int):
+        self.capacity = per_minute
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def configure(self, per_minute: int):
+        self._refill()
+        # 从不限制切换为限制时按满桶开始
+        self.level = per_minute if not self.capacity else min(self.level, per_minute)
+        self.capacity = per_minute
+
+    def _refill(self):
+        now = time.monotonic()
+        if self.capacity:
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.capacity / 60)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # 返回还需等待多少秒才能取出 amount，配额为 0 表示不限制
+        if not self.capacity:
+            return 0
+        self._refill()
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0
+        return (amount - self.level) * 60 / self.capacity
+
+    def take(self, amount: float):
+        # 允许扣成负数，用于拿到真实 usage 后补扣超出预留的部分
+        if self.capacity:
+            self._refill()
+            self.level -= amount
+
+
+class RateLimiter:
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._lock = asyncio.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.requests.capacity or self.tokens.capacity)
+
+    def configure(self, rpm: int, tpm: int):
+        if rpm != self.requests.capacity:
+            self.requests.configure(rpm)
+        if tpm != self.tokens.capacity:
+            self.tokens.configure(tpm)
+
+    async def acquire(self, estimated_tokens: int):
+        if not self.enabled:
+            return
+        # 持锁等待，保证排队的请求按先来后到放行
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(estimated_tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            self.requests.take(1)
+            self.tokens.take(estimated_tokens)
+
+    def record(self, estimated_tokens: int, actual_tokens: int):
+        # 用响应中的 usage 修正预留的 token 数
+        self.tokens.take(actual_tokens - estimated_tokens)
+
+
+def estimate_tokens(messages: Iterable[dict]) -> int:
+    # 请求占用的 token：提示词加上预留的回复长度
+    return estimate_prompt_tokens(messages) + DEFAULT_COMPLETION_TOKENS
+
+
+def estimate_prompt_tokens(messages: Iterable[dict]) -> int:
+    # 粗略估算：非 ASCII 字符（中文等）约 1 token/字，ASCII 约 4 字符/token
+    ascii_chars = 0
+    other_chars = 0
+    for message in messages:
+        for ch in message.get("content") or "":
+            if ord(ch) < 128:
+                ascii_chars += 1
+            else:
+                other_chars += 1
+    return other_chars + ascii_chars // 4
+
+
+def stage_model(stage: str) -> str:
+    env_name, default = STAGE_MODELS[stage]
+    return os.getenv(env_name, default)
+
+
+def _read_budget(name: str) -> int:
+    try:
+        return max(0, int(os.getenv(name, 0)))
+    except ValueError:
+        return 0
+
+
+def stage_budget(stage: str) -> Tuple[int, int]:
+    prefix = STAGE_BUDGET_PREFIX[stage]
+    return _read_budget(f"{prefix}_RPM"), _read_budget(f"{prefix}_TPM")
+
+
+def _min_positive(values: Iterable[int]) -> int:
+    positive = [v for v in values if v > 0]
+    return min(positive) if positive else 0
+
+
+def get_limiter(stage: str, model: Optional[str] = None) -> RateLimiter:
+    # 服务商按模型计算配额，所以限流器按模型名共享；
+    # 多个阶段使用同一模型时，取这些阶段中配置的最小配额。
+    # model 为本次请求实际使用的模型（调用方可以不用设置中的模型），省略时取该阶段设置的模型。
+    # 只在 engine 的共享事件循环上调用，不需要额外加锁。
+    model = model or stage_model(stage)
+    budgets = [stage_budget(s) for s in STAGE_MODELS if stage_model(s) == model]
+    rpm = _min_positive(b[0] for b in budgets)
+    tpm = _min_positive(b[1] for b in budgets)
+    limiter = _limiters.get(model)
+    if limiter is None:
+        limiter = _limiters[model] = RateLimiter(rpm, tpm)
+    else:
+        limiter.configure(rpm, tpm)
+    return limiter
@@ -0,0 +1,236 @@
+import asyncio
+import email.utils
+import os
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import openai
+
+from evaluator_core import metrics
+
+# 连接失败、超时、429 和 5xx 按指数退避加随机抖动重试，由 create_completion 统一处理（SDK 自带的重试已关闭）。
+# 第 n 次重试前等待 0 到 min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2^n) 之间的随机时间；
+# 响应带 Retry-After（或 retry-after-ms）时至少等待该时长，最长 MAX_RETRY_AFTER 秒
+DEFAULT_MAX_RETRIES = 4
+DEFAULT_RETRY_BASE_DELAY = 0.5
+DEFAULT_RETRY_MAX_DELAY = 30.0
+MAX_RETRY_AFTER = 120.0
+
+# 熔断：同一端点连续失败 BREAKER_THRESHOLD 次后暂停向它发送请求，暂停时长从 BREAKER_COOLDOWN 秒开始按次数翻倍，
+# 最长 MAX_BREAKER_COOLDOWN。到期后先放行一个试探请求，成功即恢复，试探期间其余请求直接失败。
+# 暂停期间剩余时间不超过 BREAKER_MAX_WAIT 的请求原地等待，更长的直接失败，交给调用方稍后重试，
+# 避免端点长时间不可用时所有请求一起挂起
+DEFAULT_BREAKER_THRESHOLD = 5
+DEFAULT_BREAKER_COOLDOWN = 15.0
+MAX_BREAKER_COOLDOWN = 300.0
+DEFAULT_BREAKER_MAX_WAIT = 5.0
+
+# 单个问题出错后，本阶段其余问题完成时再重试的轮数
+DEFAULT_FAILED_RETRY_ROUNDS = 1
+
+
+class CircuitOpen(RuntimeError):
+    pass
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return max(0, int(os.getenv(name, default)))
+    except ValueError:
+        return default
+
+
+def max_retries() -> int:
+    return _int_env("OPENAI_MAX_RETRIES", DEFAULT_MAX_RETRIES)
+
+
+def failed_retry_rounds() -> int:
+    return _int_env("OPENAI_FAILED_RETRY_ROUNDS", DEFAULT_FAILED_RETRY_ROUNDS)
+
+
+def is_retryable(error: BaseException) -> bool:
+    # 连接失败和超时（APITimeoutError 是 APIConnectionError 的子类）、408/409/429 和 5xx 可以重试，其余错误重试也没有用
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    # 计入熔断的失败：端点本身不可用。429 说明端点正常但配额不足，由退避和 Retry-After 处理
+    if isinstance(error, openai.APIConnectionError):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+def retry_after(error: BaseException) -> Optional[float]:
+    # 从错误响应的 retry-after-ms / Retry-After 头取出建议的等待秒数，Retry-After 可以是秒数或 HTTP 日期
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return min(MAX_RETRY_AFTER, max(0.0, float(value) / 1000))
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            seconds = email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(MAX_RETRY_AFTER, max(0.0, seconds))
+
+
+def backoff_delay(attempt: int, suggested: Optional[float] = None) -> float:
+    # 第 attempt 次重试（从 0 开始）前的等待时间
+    base = _float_env("OPENAI_RETRY_BASE_DELAY", DEFAULT_RETRY_BASE_DELAY)
+    cap = _float_env("OPENAI_RETRY_MAX_DELAY", DEFAULT_RETRY_MAX_DELAY)
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if suggested is not None:
+        # 按服务端建议的时间等待，再加一点抖动，避免所有请求在同一时刻重新发出
+        delay = suggested + random.uniform(0, base)
+    return delay
+
+
+class CircuitBreaker:
+    # 只在 engine 的共享事件循环上使用，不需要加锁
+
+    def __init__(self, name: str, threshold: Optional[int] = None, cooldown: Optional[float] = None,
+                 max_wait: Optional[float] = None):
+        self.name = name
+        self.threshold = threshold or max(1, _int_env("OPENAI_BREAKER_THRESHOLD", DEFAULT_BREAKER_THRESHOLD))
+        self.cooldown = _float_env("OPENAI_BREAKER_COOLDOWN", DEFAULT_BREAKER_COOLDOWN) if cooldown is None else cooldown
+        self.max_wait = _float_env("OPENAI_BREAKER_MAX_WAIT", DEFAULT_BREAKER_MAX_WAIT) if max_wait is None else max_wait
+        self.failures = 0  # 连续失败次数
+        self.openings = 0  # 连续熔断次数，决定下一次暂停时长
+        self.open_until = 0.0
+        self.probing = False  # 到期后是否已有试探请求在途
+
+    @property
+    def open(self) -> bool:
+        return self.openings > 0
+
+    def remaining(self) -> float:
+        return max(0.0, self.open_until - time.monotonic()) if self.open else 0.0
+
+    async def acquire(self) -> bool:
+        # 请求发出前调用：熔断期间等待到期（剩余时间过长时抛出 CircuitOpen），到期后只放行一个试探请求，
+        # 试探请求在途时其余请求直接抛出 CircuitOpen。返回本次请求是否为试探请求
+        while self.open:
+            remaining = self.remaining()
+            if remaining > self.max_wait:
+                raise CircuitOpen(f"{self.name} 连续失败，已暂停请求，{remaining:.1f} 秒后恢复")
+            if remaining == 0:
+                if self.probing:
+                    raise CircuitOpen(f"{self.name} 连续失败，正在试探是否恢复")
+                self.probing = True
+                return True
+            await asyncio.sleep(remaining)
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.openings = 0
+        self.open_until = 0.0
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        # 试探请求失败或连续失败达到阈值时熔断
+        if self.probing or self.failures >= self.threshold:
+            self.openings += 1
+            self.failures = 0
+            self.open_until = time.monotonic() + min(MAX_BREAKER_COOLDOWN, self.cooldown * 2 ** (self.openings - 1))
+        self.probing = False
+
+    def release(self, probe: bool):
+        # 试探请求因与端点无关的原因（如取消）结束时，让下一个请求重新试探
+        if probe:
+            self.probing = False
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_lock = threading.Lock()
+
+
+def get_breaker(endpoint: str) -> CircuitBreaker:
+    # 同一端点（base_url）在进程内共用一个熔断器
+    with _lock:
+        breaker = _breakers.get(endpoint)
+        if breaker is None:
+            breaker = _breakers[endpoint] = CircuitBreaker(endpoint)
+    return breaker
+
+
+def reset():
+    with _lock:
+        _breakers.clear()
+
+
+def _breaker_state():
+    with _lock:
+        breakers = list(_breakers.values())
+    return {(b.name,): 1.0 if b.open else 0.0 for b in breakers}
+
+
+metrics.register_gauge("evaluator_circuit_open", "端点是否处于熔断暂停状态（1 为暂停）", ("endpoint",), _breaker_state)
+
+
+async def call_with_retry(send, labels: Dict[str, str], breaker: Optional[CircuitBreaker] = None):
+    # send 为无参数的协程函数，每次调用发出一次请求。可重试的错误按退避时间重试，最多 max_retries() 次
+    retries = max_retries()
+    attempt = 0
+    while True:
+        probe = False
+        if breaker is not None:
+            probe = await breaker.acquire()
+        try:
+            result = await send()
+        except Exception as e:
+            if breaker is not None:
+                if is_backend_failure(e):
+                    breaker.record_failure()
+                elif isinstance(e, openai.APIStatusError):
+                    # 端点有响应（如 400、429），说明它本身可用
+                    breaker.record_success()
+                else:
+                    breaker.release(probe)
+            if attempt >= retries or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, retry_after(e))
+            metrics.RETRIES.inc(reason=_reason(e), **labels)
+            attempt += 1
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            if breaker is not None:
+                breaker.release(probe)
+            raise
+        if breaker is not None:
+            breaker.record_success()
+        return result
+
+
+def _reason(error: BaseException) -> str:
+    if isinstance(error, openai.APITimeoutError):
+        return "timeout"
+    if isinstance(error, openai.APIConnectionError):
+        return "connection"
+    return str(getattr(error, "status_code", "error"))
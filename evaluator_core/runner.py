@@ -0,0 +1,422 @@
+import concurrent.futures
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from evaluator_core import backends, batch, clients, costs, engine, pipeline, resilience, stages
+
+# 各阶段的执行逻辑，不依赖 Qt：GUI 的 ModelThread、API 服务和命令行共用。
+# 进度、错误和逐题结果通过回调通知调用方，回调在执行 run() 的线程或共享事件循环线程中调用
+MODEL_TYPES = ("answer", "evaluate", "evaluate_panel", "quality", "pipeline")
+# 失败通知中最多列出的问题数
+MAX_LISTED_FAILURES = 5
+
+
+def _ignore(*args):
+    pass
+
+
+class StageRunner:
+    def __init__(self, input_data: dict, model_type: str, evaluator_num: int = 1, journal=None, resume=None,
+                 use_batch=None, on_progress: Optional[Callable[[int], None]] = None,
+                 on_error: Optional[Callable[[str], None]] = None,
+                 on_result: Optional[Callable[[str, str, Any], None]] = None,
+                 tracker: Optional[costs.CostTracker] = None,
+                 on_warning: Optional[Callable[[str], None]] = None):
+        self.input_data = input_data
+        self.model_type = model_type
+        self.evaluator_num = evaluator_num  # 区分多位评测员，各自的结果分别缓存
+        self.journal = journal  # 检查点日志，每完成一个问题写入一条
+        self.resume = resume  # 之前已完成的结果，格式与本阶段的返回值相同，这些问题不再重新请求
+        self.use_batch = batch.batch_enabled() if use_batch is None else use_batch  # 通过 Batch API 提交
+        self.on_progress = on_progress or _ignore
+        self.on_error = on_error or _ignore
+        self.on_result = on_result or _ignore  # 每完成一个问题的一个阶段调用 (阶段, 问题 ID, 结果)
+        # 不影响其余问题的提示（如个别问题重试后仍然失败），未设置时交给 on_error
+        self.on_warning = on_warning
+        self.cancel_event = threading.Event()  # 取消后不再开始新的问题并中止在途的请求，已完成的部分照常返回
+        self._future = None  # 正在共享事件循环上执行的协程
+        self._lock = threading.Lock()
+        # 费用统计和预算，同一次运行的多个阶段（如两位评测员）共用一个
+        self.tracker = tracker if tracker is not None else costs.CostTracker()
+        self.failed = {}  # 重试后仍然失败的 {问题 ID: 错误}，这些问题没有写入结果
+        self.openai_client = None
+        self.async_client = None
+        self.result = None
+        self.setup_clients()
+
+    def setup_clients(self):
+        try:
+            # Initialize OpenAI client with custom base URL
+            openai_api_key = os.getenv("OPENAI_API_KEY")
+            openai_api_base = os.getenv("OPENAI_API_BASE")
+            
+            # 配置了后端池时所有在线请求都经由后端池分发，批处理使用池中的第一个后端
+            pool = backends.get_pool()
+            if pool is not None:
+                self.openai_client = pool.primary.sync_client
+                self.async_client = pool
+            elif openai_api_key:
+                # 客户端按 (api_key, base_url) 在进程内共享，GUI 和 API 服务复用同一个连接池
+                self.openai_client = clients.get_client(openai_api_key, openai_api_base)
+                self.async_client = clients.get_async_client(openai_api_key, openai_api_base)
+        except Exception as e:
+            self.on_error(f"Error setting up API clients: {str(e)}")
+
+    def run(self):
+        # 返回本阶段的结果；出错的问题通过 on_error 报告，客户端未初始化时返回 None
+        try:
+            if not self.openai_client:
+                self.on_error("API client not initialized. Please set up API keys.")
+                return None
+
+            if self.model_type == "answer":
+                self.result = self.generate_answers()
+            elif self.model_type == "evaluate":
+                self.result = self.evaluate_answers()
+            elif self.model_type == "evaluate_panel":
+                self.result = self.evaluate_panel()
+            elif self.model_type == "quality":
+                self.result = self.quality_check()
+            elif self.model_type == "pipeline":
+                self.result = self.run_pipeline()
+        except Exception as e:
+            self.on_error(str(e))
+        return self.result
+
+    def cancel(self):
+        # 可以在任意线程中调用：停止供给新的问题，并取消正在执行的协程，在途的 HTTP 请求随之中止。
+        # 已完成的问题已经写入结果和检查点，run() 照常返回这些部分结果
+        with self._lock:
+            self.cancel_event.set()
+            future = self._future
+        if future is not None:
+            future.cancel()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    def until_cancelled(self, items):
+        # 并发执行时按需从这里取下一个问题，取消后停止供给；接近预算（已花费加在途预估）后其余问题记为推迟，
+        # 不再请求，为在途的请求留出余量。流水线的预算由 pipeline.process_question 按阶段处理
+        for item in items:
+            if self.cancel_event.is_set():
+                return
+            if self.model_type != "pipeline" and self.tracker.at_risk():
+                self.tracker.defer(item[0], self.defer_stage())
+                continue
+            yield item
+
+    def defer_stage(self) -> str:
+        return "scores1" if self.model_type == "evaluate_panel" else self.journal_stage()
+
+    def run_async(self, coro):
+        # 在共享事件循环上执行，期间的模型调用计入本次运行的费用。取消时返回 None
+        with self._lock:
+            if self.cancel_event.is_set():
+                coro.close()
+                return None
+            future = self._future = engine.submit(costs.bind(self.tracker, coro))
+        try:
+            return future.result()
+        except concurrent.futures.CancelledError:
+            if not self.cancel_event.is_set():
+                raise
+            return None
+        finally:
+            with self._lock:
+                self._future = None
+
+    def warn(self, message: str):
+        (self.on_warning or self.on_error)(message)
+
+    def run_isolated(self, items, run, on_progress: Optional[Callable[[int], None]] = None):
+        # run(items, on_progress, on_failure) 返回并发处理这些问题的协程。单个问题出错（重试用尽、熔断等）时
+        # 记录下来继续处理其他问题，本轮结束后失败的问题再重试 failed_retry_rounds() 轮；仍然失败的问题
+        # 不写入结果，通过 warn 报告，重新运行（从检查点恢复）时补齐。on_progress 收到累计完成的问题数
+        failed = {}
+        done = 0
+
+        def progress(_):
+            nonlocal done
+            done += 1
+            if on_progress:
+                on_progress(done)
+
+        def on_failure(qid, item, error):
+            failed[qid] = (item, error)
+
+        self.run_async(run(items, progress, on_failure))
+        for _ in range(resilience.failed_retry_rounds()):
+            if not failed or self.cancel_event.is_set():
+                break
+            retry = dict(failed)
+            failed.clear()
+            self.run_async(run(self.until_cancelled((qid, item) for qid, (item, _) in retry.items()),
+                               progress, on_failure))
+        self.report_failed({qid: str(error) for qid, (_, error) in failed.items()})
+
+    def report_failed(self, failed: Dict[str, str]):
+        # 记录重试后仍然失败的问题并提示，这些问题没有写入结果和检查点
+        if not failed:
+            return
+        self.failed.update(failed)
+        listed = "；".join(f"{qid}: {error}" for qid, error in list(failed.items())[:MAX_LISTED_FAILURES])
+        more = " 等" if len(failed) > MAX_LISTED_FAILURES else ""
+        self.warn(f"{len(failed)} 个问题请求失败，已跳过（{listed}{more}）；重新运行即可从检查点继续")
+
+    def run_workers(self, items, worker, results, on_progress: Optional[Callable[[int], None]] = None):
+        self.run_isolated(
+            items,
+            lambda items, progress, on_failure: engine.run_bounded(
+                items, worker, results, on_progress=progress, on_failure=on_failure
+            ),
+            on_progress
+        )
+
+    def journal_stage(self) -> str:
+        return {
+            "answer": "answers",
+            "evaluate": f"scores{self.evaluator_num}",
+            "quality": "final_scores",
+        }[self.model_type]
+
+    def record_result(self, qid, value, stage=None):
+        stage = stage or self.journal_stage()
+        if self.journal:
+            self.journal.append(stage, qid, value)
+        self.on_result(stage, qid, value)
+
+    def run_pipeline(self) -> dict:
+        # 按问题流水线执行回答→两位评测员并行评分→质检，input_data 为问题集，resume 为 current_data 结构
+        results = pipeline.init_results(self.resume)
+        try:
+            if self.use_batch:
+                raise RuntimeError("批处理模式下无法使用流水线，请分阶段执行")
+            total = len(self.input_data) * 4  # 每个问题 4 个结果：答案、两份评分、最终评分
+            done = len(results['answers']) + sum(len(results[k]['scores']) for k in pipeline.SCORE_STAGES)
+
+            def on_result(stage, qid, value):
+                nonlocal done
+                done += 1
+                self.record_result(qid, value, stage)
+                self.on_progress(min(100, int(done * 100 / total)))
+
+            pending = self.until_cancelled(
+                (qid, q) for qid, q in self.input_data.items() if qid not in results['final_scores']['scores']
+            )
+            self.run_isolated(
+                pending,
+                lambda items, _, on_failure: pipeline.run_pipeline(
+                    self.async_client, items, results, on_result, on_failure=on_failure
+                )
+            )
+        except Exception as e:
+            self.on_error(f"流水线评测出错: {str(e)}")
+        return pipeline.order_results(results, self.input_data)
+
+    def batch_runner(self) -> batch.BatchRunner:
+        return batch.BatchRunner(self.openai_client, self.model_type, tracker=self.tracker,
+                                 cancel_event=self.cancel_event)
+
+    def generate_answers(self) -> dict:
+        answers = dict(self.resume or {})
+        try:
+            model_name, system_content = stages.answer_settings()
+            total = len(self.input_data)
+
+            async def answer_one(qid, question):
+                costs.set_qid(qid)
+                answer = await stages.answer_question(self.async_client, question, model_name, system_content)
+                self.record_result(qid, answer)
+                return answer
+
+            # 已恢复的问题不再请求；在共享事件循环上并发请求，同时在途的请求数受并发数限制
+            finished = len(answers)
+            pending = self.until_cancelled((qid, q) for qid, q in self.input_data.items() if qid not in answers)
+            if self.use_batch:
+                def on_answer(qid, answer):
+                    answers[qid] = answer
+                    self.record_result(qid, answer)
+                    self.on_progress(int(len(answers) * 100 / total))
+
+                self.report_failed(
+                    batch.batch_answers(self.batch_runner(), pending, model_name, system_content, on_answer)
+                )
+            else:
+                self.run_workers(
+                    pending, answer_one, answers,
+                    on_progress=lambda done: self.on_progress(int((finished + done) * 100 / total))
+                )
+        except Exception as e:
+            self.on_error(f"Error generating answers: {str(e)}")
+        # 并发完成顺序不确定，按输入顺序重新整理结果
+        return {qid: answers[qid] for qid in self.input_data if qid in answers}
+
+    def evaluate_answers(self) -> dict:
+        scores = dict((self.resume or {}).get("scores", {}))
+        reasons = dict((self.resume or {}).get("reasons", {}))
+        try:
+            model_name, system_content = stages.eval_settings()
+            total = len(self.input_data)
+
+            async def evaluate_one(qid, answer):
+                costs.set_qid(qid)
+                scores[qid], reasons[qid] = await stages.evaluate_answer(
+                    self.async_client, answer, model_name, system_content, self.evaluator_num
+                )
+                self.record_result(qid, {"score": scores[qid], "reason": reasons[qid]})
+
+            finished = len(scores)
+            pending = self.until_cancelled((qid, a) for qid, a in self.input_data.items() if qid not in scores)
+            if self.use_batch:
+                def on_score(qid, result):
+                    scores[qid], reasons[qid] = result
+                    self.record_result(qid, {"score": scores[qid], "reason": reasons[qid]})
+                    self.on_progress(int(len(scores) * 100 / total))
+
+                self.report_failed(batch.batch_evaluate(
+                    self.batch_runner(), pending, model_name, system_content, self.evaluator_num, on_score
+                ))
+            else:
+                self.run_workers(
+                    pending, evaluate_one, {},
+                    on_progress=lambda done: self.on_progress(int((finished + done) * 100 / total))
+                )
+        except Exception as e:
+            self.on_error(f"评测过程出错: {str(e)}")
+        return {
+            "scores": {qid: scores[qid] for qid in self.input_data if qid in scores},
+            "reasons": {qid: reasons[qid] for qid in self.input_data if qid in reasons}
+        }
+
+    def evaluate_panel(self) -> dict:
+        # 两位评测员合并为一次 n=2 的请求，返回 {"scores1": ..., "scores2": ...}，resume 格式相同
+        sections = {}
+        for n in (1, 2):
+            section = (self.resume or {}).get(f"scores{n}") or {}
+            sections[n] = {"scores": dict(section.get("scores", {})), "reasons": dict(section.get("reasons", {}))}
+        try:
+            model_name, system_content = stages.eval_settings()
+            total = len(self.input_data)
+
+            def missing(qid):
+                return [n for n in (1, 2) if qid not in sections[n]["scores"]]
+
+            def on_score(qid, evaluator_num, result):
+                section = sections[evaluator_num]
+                section["scores"][qid], section["reasons"][qid] = result
+                self.record_result(qid, {"score": result[0], "reason": result[1]}, f"scores{evaluator_num}")
+
+            async def evaluate_one(qid, answer):
+                costs.set_qid(qid)
+                results = await stages.evaluate_samples(
+                    self.async_client, answer, model_name, system_content, missing(qid)
+                )
+                for evaluator_num, result in results.items():
+                    on_score(qid, evaluator_num, result)
+
+            finished = sum(1 for qid in self.input_data if not missing(qid))
+            pending = self.until_cancelled((qid, a) for qid, a in self.input_data.items() if missing(qid))
+            if self.use_batch:
+                def on_batch_score(qid, evaluator_num, result):
+                    on_score(qid, evaluator_num, result)
+                    done = sum(1 for q in self.input_data if not missing(q))
+                    self.on_progress(int(done * 100 / total))
+
+                self.report_failed(batch.batch_evaluate_panel(
+                    self.batch_runner(), ((qid, missing(qid), a) for qid, a in pending),
+                    model_name, system_content, on_batch_score
+                ))
+            else:
+                self.run_workers(
+                    pending, evaluate_one, {},
+                    on_progress=lambda done: self.on_progress(int((finished + done) * 100 / total))
+                )
+        except Exception as e:
+            self.on_error(f"评测过程出错: {str(e)}")
+        return {
+            f"scores{n}": {
+                "scores": {qid: sections[n]["scores"][qid] for qid in self.input_data if qid in sections[n]["scores"]},
+                "reasons": {qid: sections[n]["reasons"][qid] for qid in self.input_data if qid in sections[n]["reasons"]}
+            }
+            for n in (1, 2)
+        }
+
+    def quality_check(self) -> dict:
+        final_scores = dict((self.resume or {}).get("scores", {}))
+        reasons = dict((self.resume or {}).get("reasons", {}))
+        try:
+            adaptive = stages.panel_enabled()
+            if adaptive:
+                # 自适应评测组：分歧大的问题追加评测员，追加的评测员使用评测模型和提示词
+                model_name, system_content = stages.eval_settings()
+            else:
+                model_name, system_content = stages.quality_settings()
+            questions = self.input_data['questions']
+            answers = self.input_data['answers']
+            # 自适应评测组从第一位评测员的评分开始，第二份评分可以没有（需要时由评测组请求）
+            section2 = self.input_data.get('scores2') if adaptive else self.input_data['scores2']
+            section2 = section2 or {'scores': {}, 'reasons': {}}
+            scores1 = self.input_data['scores1']['scores']
+            scores2 = section2['scores']
+            reasons1 = self.input_data['scores1']['reasons']
+            reasons2 = section2['reasons']
+
+            total = len(questions)
+
+            async def check_one(qid, _):
+                costs.set_qid(qid)
+                if adaptive:
+                    escalate = stages.panel_needs_judges(scores1[qid], scores2.get(qid), stages.panel_settings()[1])
+                else:
+                    escalate = not stages.scores_agree(scores1[qid], scores2[qid])
+                if escalate and self.tracker.at_risk():
+                    # 预算接近上限：有分歧的问题不再升级到质检（或追加评测员），推迟到下次运行
+                    self.tracker.defer(qid, "final_scores")
+                    return
+                if adaptive:
+                    final_scores[qid], reasons[qid] = await stages.adaptive_panel(
+                        self.async_client, answers[qid],
+                        scores1[qid], reasons1[qid], scores2.get(qid), reasons2.get(qid),
+                        model_name, system_content
+                    )
+                else:
+                    final_scores[qid], reasons[qid] = await stages.check_quality(
+                        self.async_client, questions[qid], answers[qid],
+                        scores1[qid], reasons1[qid], scores2[qid], reasons2[qid],
+                        model_name, system_content
+                    )
+                self.record_result(qid, {"score": final_scores[qid], "reason": reasons[qid]})
+
+            finished = len(final_scores)
+            pending = self.until_cancelled((qid, None) for qid in questions if qid not in final_scores)
+            if self.use_batch:
+                def on_final(qid, result):
+                    final_scores[qid], reasons[qid] = result
+                    self.record_result(qid, {"score": final_scores[qid], "reason": reasons[qid]})
+                    self.on_progress(int(len(final_scores) * 100 / total))
+
+                if adaptive:
+                    failed = batch.batch_adaptive_panel(
+                        self.batch_runner(), [qid for qid, _ in pending], answers,
+                        scores1, reasons1, scores2, reasons2, model_name, system_content, on_final
+                    )
+                else:
+                    failed = batch.batch_quality(
+                        self.batch_runner(), (qid for qid, _ in pending), questions, answers,
+                        scores1, reasons1, scores2, reasons2, model_name, system_content, on_final
+                    )
+                self.report_failed(failed)
+            else:
+                self.run_workers(
+                    pending, check_one, {},
+                    on_progress=lambda done: self.on_progress(int((finished + done) * 100 / total))
+                )
+        except Exception as e:
+            self.on_error(f"Error in quality check: {str(e)}")
+        return {
+            "scores": {qid: final_scores[qid] for qid in self.input_data.get('questions', {}) if qid in final_scores},
+            "reasons": {qid: reasons[qid] for qid in self.input_data.get('questions', {}) if qid in reasons}
+        }
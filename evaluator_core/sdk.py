@@ -0,0 +1,193 @@
+import asyncio
+from typing import Any, AsyncIterator, Dict, Optional
+
+from evaluator_core import backends, clients, costs, engine, pipeline
+from evaluator_core.sink import SECTIONS
+
+# 供其他程序直接调用的异步接口：
+#
+#     evaluator = Evaluator(eval_model="gpt-4o", max_in_flight=16)
+#     async for result in evaluator.run(questions):
+#         print(result["qid"], result["final_evaluation"]["score"])
+#
+# questions 可以是 {qid: 问题} 映射，或者产出 (qid, 问题) 的同步/异步迭代器，只在有空闲并发时才读取下一个问题；
+# 问题也可以是 {"question": ..., "answer": ...}，已有答案（例如训练中的模型自己生成的）时跳过回答阶段。
+# 每个问题完成全部阶段后立即产出，顺序与完成顺序一致。调用方处理得慢时，已完成但未取走的结果
+# 最多缓存 buffer_size 个，之后暂停读取新的问题。
+# 所有选项都只作用于本次调用，不修改 os.environ；未指定的选项取环境变量中的设置。
+# budget（美元）限制本次调用的花费：接近预算后不再开始新的问题、有分歧的问题不再质检，这些问题的结果中
+# deferred 为停在的阶段、缺少的评分为 None。每个结果的 usage 为该问题的 token 用量和费用，
+# 本次调用的汇总在 evaluator.costs 中。
+# 单个问题的请求在退避重试后仍然失败时不影响其他问题，该问题的结果中 error 为错误信息，缺少的阶段为 None。
+# 传入的 client 会在共享事件循环上使用，不要与调用方自己事件循环中的客户端混用。
+
+# 按问题流水线的选项，含义见 pipeline.default_settings
+SETTING_NAMES = (
+    "answer_model", "answer_content", "eval_model", "eval_content", "quality_model", "quality_content",
+    "multi_sample", "adaptive_panel", "panel_max_judges", "panel_se_target",
+)
+OPTION_NAMES = SETTING_NAMES + ("api_key", "base_url", "client", "max_in_flight", "buffer_size", "budget")
+
+# 每个结果中的评分字段：(阶段, 字段名)
+SCORE_SECTIONS = tuple((stage, name) for stage, name in SECTIONS if stage in pipeline.SCORE_STAGES)
+
+_DONE = object()
+
+
+class _Failure:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+
+def _split_item(item) -> tuple:
+    # 返回 (问题, 已有答案)
+    if isinstance(item, dict):
+        return item.get("question"), item.get("answer")
+    return item, None
+
+
+class Evaluator:
+    def __init__(self, **options):
+        self.options = self._check(options)
+        self.costs = None  # 最近一次调用的 costs.CostTracker
+
+    @staticmethod
+    def _check(options: Dict[str, Any]) -> Dict[str, Any]:
+        unknown = sorted(set(options) - set(OPTION_NAMES))
+        if unknown:
+            raise TypeError(f"未知的选项：{', '.join(unknown)}")
+        return {name: value for name, value in options.items() if value is not None}
+
+    def resolve(self, **overrides) -> Dict[str, Any]:
+        # 合并默认设置、构造时的选项和本次调用的选项
+        options = pipeline.default_settings()
+        options.update(self.options)
+        options.update(self._check(overrides))
+        return options
+
+    @staticmethod
+    def client_for(options: Dict[str, Any]):
+        if options.get("client") is not None:
+            return options["client"]
+        if options.get("api_key"):
+            # 客户端按 (api_key, base_url) 在进程内共享
+            return clients.get_async_client(options["api_key"], options.get("base_url"))
+        return backends.default_client()
+
+    async def run(self, questions, **options) -> AsyncIterator[Dict[str, Any]]:
+        options = self.resolve(**options)
+        client = self.client_for(options)
+        settings = {name: options[name] for name in SETTING_NAMES}
+        workers = max(1, int(options.get("max_in_flight") or engine.get_max_in_flight()))
+        buffer_size = max(1, int(options.get("buffer_size") or workers))
+        tracker = self.costs = costs.CostTracker(budget=options.get("budget"))
+
+        # 请求在共享事件循环上执行（与 GUI、API 服务共用客户端和限流器），结果经有界队列交给调用方的事件循环
+        caller_loop = asyncio.get_running_loop()
+        loop = engine.get_loop()
+        state: Dict[str, Any] = {}
+
+        async def next_question():
+            # 多个协程共用一个输入迭代器，依次取下一个问题
+            async with state["lock"]:
+                if "aiter" in state:
+                    try:
+                        if caller_loop is loop:
+                            return await state["aiter"].__anext__()
+                        return await asyncio.wrap_future(
+                            asyncio.run_coroutine_threadsafe(state["aiter"].__anext__(), caller_loop)
+                        )
+                    except StopAsyncIteration:
+                        return None
+                return next(state["iter"], None)
+
+        async def produce():
+            queue = state["queue"]
+
+            async def work():
+                while True:
+                    item = await next_question()
+                    if item is None:
+                        return
+                    qid, item = item
+                    question, answer = _split_item(item)
+                    results = pipeline.init_results({"answers": {qid: answer}} if answer is not None else None)
+                    error = None
+                    try:
+                        await pipeline.process_question(client, qid, question, results, settings)
+                    except Exception as e:
+                        # 单个问题重试用尽后仍然出错时只标记这个问题，已完成的阶段照常返回
+                        error = str(e)
+                    await queue.put(self.result_record(qid, question, results, tracker, error))
+
+            tasks = [asyncio.create_task(work()) for _ in range(workers)]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException as e:
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+                await queue.put(_Failure(e))
+                return
+            await queue.put(_DONE)
+
+        async def start():
+            state["lock"] = asyncio.Lock()
+            state["queue"] = asyncio.Queue(buffer_size)
+            return asyncio.ensure_future(costs.bind(tracker, produce()))
+
+        if hasattr(questions, "__aiter__"):
+            state["aiter"] = questions.__aiter__()
+        else:
+            state["iter"] = iter(questions.items() if hasattr(questions, "items") else questions)
+
+        def call(coro):
+            # 在共享事件循环上执行协程并在调用方的事件循环中等待
+            if caller_loop is loop:
+                return coro
+            return asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, loop))
+
+        producer = await call(start())
+        try:
+            while True:
+                record = await call(state["queue"].get())
+                if record is _DONE:
+                    return
+                if isinstance(record, _Failure):
+                    raise record.error
+                yield record
+        finally:
+            # 调用方提前退出（break、异常或取消）时停止剩余的请求
+            loop.call_soon_threadsafe(producer.cancel)
+
+    @staticmethod
+    def result_record(qid: str, question: str, results: Dict[str, Any],
+                      tracker: Optional[costs.CostTracker] = None, error: Optional[str] = None) -> Dict[str, Any]:
+        record = {"qid": qid, "question": question, "answer": results["answers"].get(qid), "error": error}
+        for stage, name in SCORE_SECTIONS:
+            section = results[stage]
+            record[name] = None
+            if qid in section["scores"]:
+                record[name] = {"score": section["scores"][qid], "reason": section["reasons"][qid]}
+        if tracker is not None:
+            record["deferred"] = tracker.deferred.get(qid)
+            record["usage"] = dict(tracker.questions.get(qid) or costs.empty_usage())
+        return record
+
+    async def evaluate(self, questions, **options) -> Dict[str, Any]:
+        # 等待全部问题完成，按 GUI 保存格式的结构（answers/evaluation_1/evaluation_2/final_evaluation）返回
+        output: Dict[str, Any] = {"answers": {}}
+        for _, name in SCORE_SECTIONS:
+            output[name] = {"scores": {}, "reasons": {}}
+        async for record in self.run(questions, **options):
+            qid = record["qid"]
+            if record["answer"] is not None:
+                output["answers"][qid] = record["answer"]
+            for _, name in SCORE_SECTIONS:
+                if record[name] is None:
+                    continue
+                output[name]["scores"][qid] = record[name]["score"]
+                output[name]["reasons"][qid] = record[name]["reason"]
+        return output
@@ -0,0 +1,202 @@
+import json
+import time
+
+from flask import Flask, Response, g, jsonify, request
+
+from evaluator_core import backends, costs, jobs, metrics
+from evaluator_core.service import HANDLERS, REQUIRED_FIELDS, missing_fields
+
+# HTTP 接口，GUI 的"API 服务"和命令行的 serve 子命令共用。Flask 只在这里导入，不启动服务时不加载
+
+
+def _job_counts():
+    return {(state,): count for state, count in jobs.get_manager().counts().items()}
+
+
+def _backend_outstanding():
+    pool = backends.get_pool()
+    return {(b.name,): b.outstanding for b in pool.backends} if pool else {}
+
+
+def create_app() -> Flask:
+    app = Flask(__name__)
+    metrics.register_gauge("evaluator_jobs", "后台任务数，state=queued 即排队深度", ("state",), _job_counts)
+    metrics.register_gauge("evaluator_backend_outstanding_requests", "后端池中各后端的在途请求数", ("backend",),
+                           _backend_outstanding)
+
+    @app.before_request
+    def start_timer():
+        g.started_at = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        # 按路由模板（如 /jobs/<job_id>）统计，避免每个任务 ID 产生一组指标
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.HTTP_REQUESTS.inc(route=route, method=request.method, status=response.status_code)
+        started = g.get("started_at")
+        if started is not None:
+            metrics.HTTP_LATENCY.observe(time.perf_counter() - started, route=route, method=request.method)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def prometheus_metrics():
+        return Response(metrics.render(), mimetype='text/plain', content_type=metrics.CONTENT_TYPE)
+
+    def run_sync(kind):
+        # 同步接口：在请求线程中等待全部结果
+        try:
+            data = request.get_json()
+            missing = missing_fields(kind, data)
+            if missing:
+                return jsonify({
+                    "status": "error",
+                    "message": f"Missing required fields. Need: {', '.join(REQUIRED_FIELDS[kind])}"
+                }), 400
+            tracker = costs.CostTracker(budget=data.get('budget'))
+            result = HANDLERS[kind](data, tracker=tracker)
+            return jsonify({"status": "success", "data": result, "costs": tracker.summary()})
+        except KeyError as e:
+            return jsonify({"status": "error", "message": f"Missing required field: {str(e)}"}), 400
+        except RuntimeError as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+
+    @app.route('/generate', methods=['POST'])
+    def generate():
+        return run_sync('generate')
+
+    @app.route('/evaluate', methods=['POST'])
+    def evaluate():
+        return run_sync('evaluate')
+
+    @app.route('/quality-check', methods=['POST'])
+    def quality_check():
+        return run_sync('quality-check')
+
+    @app.route('/pipeline', methods=['POST'])
+    def run_pipeline():
+        return run_sync('pipeline')
+
+    def stream_format():
+        fmt = request.args.get('format')
+        if fmt in ('sse', 'ndjson'):
+            return fmt
+        return 'ndjson' if 'application/x-ndjson' in request.headers.get('Accept', '') else 'sse'
+
+    def event_stream(job, fmt, since=0, cancel_on_close=False):
+        # 把任务事件逐条写给客户端：SSE 或每行一个 JSON 的 NDJSON，长时间没有事件时发送心跳
+        def generate():
+            try:
+                for event in job.iter_events(since):
+                    if fmt == 'ndjson':
+                        yield json.dumps(event or {"event": "heartbeat"}, ensure_ascii=False) + "\n"
+                    elif event is None:
+                        yield ": heartbeat\n\n"
+                    else:
+                        data = json.dumps(event, ensure_ascii=False)
+                        yield f"id: {event['seq']}\nevent: {event['event']}\ndata: {data}\n\n"
+            finally:
+                # 只通过事件流返回结果的任务，客户端断开后没有必要继续执行
+                if cancel_on_close and not job.finished:
+                    job.cancel()
+
+        mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'text/event-stream'
+        return Response(generate(), mimetype=mimetype,
+                        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+    # 异步任务接口：提交后立即返回任务 ID，在共享的后台线程池中执行
+    @app.route('/jobs/<kind>', methods=['POST'])
+    def submit_job(kind):
+        if kind not in HANDLERS:
+            return jsonify({"status": "error", "message": f"Unknown job type: {kind}"}), 404
+        data = request.get_json(silent=True)
+        missing = missing_fields(kind, data)
+        if missing:
+            return jsonify({
+                "status": "error",
+                "message": f"Missing required fields. Need: {', '.join(REQUIRED_FIELDS[kind])}"
+            }), 400
+        # ?stream=1 时响应本身就是事件流，逐题结果只通过事件发出，服务端不保留事件和最终结果
+        stream = request.args.get('stream', '').lower()
+        streaming = stream in ('1', 'true', 'sse', 'ndjson')
+        try:
+            job = jobs.get_manager().submit(
+                kind, lambda job: HANDLERS[kind](data, job),
+                keep_events=not streaming, keep_result=not streaming
+            )
+        except jobs.JobQueueFull as e:
+            return jsonify({"status": "error", "message": str(e)}), 429
+        if streaming:
+            return event_stream(job, stream if stream in ('sse', 'ndjson') else stream_format(),
+                                cancel_on_close=True)
+        return jsonify({"status": "success", "data": job.to_dict()}), 202
+
+    @app.route('/jobs', methods=['GET'])
+    def list_jobs():
+        return jsonify({"status": "success", "data": [job.to_dict() for job in jobs.get_manager().list()]})
+
+    @app.route('/jobs/<job_id>', methods=['GET'])
+    def job_status(job_id):
+        job = jobs.get_manager().get(job_id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        return jsonify({"status": "success", "data": job.to_dict()})
+
+    @app.route('/jobs/<job_id>/result', methods=['GET'])
+    def job_result(job_id):
+        job = jobs.get_manager().get(job_id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        if not job.finished:
+            return jsonify({"status": "error", "message": f"Job is {job.state}", "data": job.to_dict()}), 409
+        if job.state == jobs.FAILED:
+            return jsonify({"status": "error", "message": job.error, "data": job.to_dict()}), 500
+        # 取消的任务返回已完成的部分结果
+        data = {**job.to_dict(), "result": job.result}
+        if job.costs is not None:
+            data["costs"] = job.costs.summary()
+        return jsonify({"status": "success", "data": data})
+
+    @app.route('/jobs/<job_id>/events', methods=['GET'])
+    def job_events(job_id):
+        job = jobs.get_manager().get(job_id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        if not job.keep_events:
+            return jsonify({"status": "error", "message": "Job events are streamed to the submitter only"}), 409
+        # 支持 SSE 断线重连：从 Last-Event-ID 之后继续
+        last_id = request.headers.get('Last-Event-ID')
+        since = int(last_id) + 1 if last_id and last_id.isdigit() else request.args.get('since', 0, type=int)
+        return event_stream(job, stream_format(), since)
+
+    @app.route('/jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        job = jobs.get_manager().cancel(job_id)
+        if job is None:
+            return jsonify({"status": "error", "message": "Job not found"}), 404
+        return jsonify({"status": "success", "data": job.to_dict()})
+
+    @app.route('/backends', methods=['GET'])
+    def backend_status():
+        # 后端池中各后端的在途请求数、错误数和摘除状态
+        try:
+            pool = backends.get_pool()
+        except Exception as e:
+            return jsonify({"status": "error", "message": str(e)}), 500
+        return jsonify({"status": "success", "data": pool.status() if pool else []})
+
+    # 添加关闭服务器的路由
+    @app.route('/shutdown', methods=['GET'])
+    def shutdown():
+        func = request.environ.get('werkzeug.server.shutdown')
+        if func is None:
+            return jsonify({"status": "error", "message": "Not running with werkzeug server"}), 500
+        func()
+        return jsonify({"status": "success", "message": "Server shutting down..."})
+
+    return app
+
+
+def serve(host: str = '0.0.0.0', port: int = 5000):
+    create_app().run(host=host, port=port, threaded=True)
@@ -0,0 +1,174 @@
+import threading
+from typing import Any, Dict, List
+
+from evaluator_core import answers as answer_store
+from evaluator_core import costs, stages
+from evaluator_core.runner import StageRunner
+from evaluator_core.sink import SECTIONS
+
+# API 服务和命令行共用的处理逻辑，输入输出与 HTTP 接口的 JSON 结构一致。
+# job 为 jobs.Job（或提供 set_progress / warn / publish / on_cancel / cancelled 的对象），为 None 时只返回结果。
+# tracker 为本次请求的 costs.CostTracker，为 None 时按请求中的 budget 字段新建；
+# 请求中已有的结果（answers、evaluation_1 等，字段名与返回值相同）视为已完成，不再重新请求
+
+# 各接口必需的字段
+REQUIRED_FIELDS = {
+    'generate': ['questions'],
+    'evaluate': ['answers'],
+    'quality-check': ['questions', 'evaluation_1', 'evaluation_2'],
+    'pipeline': ['questions'],
+}
+
+# 事件中的阶段名与接口返回的字段名一致
+SECTION_NAMES = dict(SECTIONS)
+
+
+def missing_fields(kind: str, data) -> List[str]:
+    return [field for field in REQUIRED_FIELDS[kind] if field not in (data or {})]
+
+
+def cost_tracker(data, job=None, tracker=None) -> costs.CostTracker:
+    # 一次请求的所有阶段共用一个费用统计和预算，任务状态中可以看到实时的花费
+    if tracker is None:
+        tracker = costs.CostTracker(budget=data.get('budget'))
+    if job is not None:
+        job.costs = tracker
+    return tracker
+
+
+def report_deferred(tracker: costs.CostTracker, job=None):
+    if tracker.deferred and job is not None:
+        job.warn(tracker.deferred_notice())
+
+
+def resume_data(data) -> Dict[str, Any]:
+    # 请求中已有的结果，转成 current_data 的结构
+    return {stage: data[name] for stage, name in SECTIONS if data.get(name)}
+
+
+def run_runners(runners: List[StageRunner], job=None, start: int = 0, end: int = 100) -> List[Any]:
+    # 同时运行多个 StageRunner 并等待全部结果。作为后台任务运行时，
+    # 各阶段进度的平均值映射到任务进度的 [start, end] 区间，逐题结果作为事件发布，取消任务会转给每个阶段
+    if job is not None:
+        progress = [0] * len(runners)
+        for i, runner in enumerate(runners):
+            def update(value, i=i):
+                progress[i] = value
+                job.set_progress(start + (end - start) * sum(progress) / (100 * len(runners)))
+            runner.on_progress = update
+            runner.on_error = job.warn
+            runner.on_result = lambda stage, qid, value: job.publish(
+                "result", stage=SECTION_NAMES[stage], qid=qid, value=value
+            )
+            job.on_cancel(runner.cancel)
+    if len(runners) == 1:
+        return [runners[0].run()]
+    threads = [threading.Thread(target=runner.run, daemon=True) for runner in runners]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [runner.result for runner in runners]
+
+
+def generate_data(data, job=None, tracker=None):
+    tracker = cost_tracker(data, job, tracker)
+    resume = resume_data(data)
+    result, = run_runners([
+        StageRunner(data['questions'], "answer", resume=resume.get('answers'), tracker=tracker)
+    ], job)
+    if result is None:
+        raise RuntimeError("Failed to generate answers")
+    report_deferred(tracker, job)
+    return result
+
+
+def evaluate_data(data, job=None, tracker=None):
+    tracker = cost_tracker(data, job, tracker)
+    resume = resume_data(data)
+    if stages.multi_sample_enabled():
+        # 一次 n=2 的请求同时取得两位评测员的评分
+        result, = run_runners([StageRunner(
+            data['answers'], "evaluate_panel",
+            resume={k: resume.get(k) for k in ('scores1', 'scores2')}, tracker=tracker
+        )], job)
+        if result is None:
+            raise RuntimeError("Failed to evaluate answers")
+        report_deferred(tracker, job)
+        return {"evaluation_1": result['scores1'], "evaluation_2": result['scores2']}
+
+    # 两位评测员同时运行
+    result1, result2 = run_runners([
+        StageRunner(data['answers'], "evaluate", evaluator_num=n, resume=resume.get(f'scores{n}'), tracker=tracker)
+        for n in (1, 2)
+    ], job)
+    if result1 is None or result2 is None:
+        raise RuntimeError("Failed to evaluate answers")
+    report_deferred(tracker, job)
+    return {"evaluation_1": result1, "evaluation_2": result2}
+
+
+def quality_data(data, job=None, tracker=None):
+    # 质检应针对被评分的那份答案：优先使用请求中的 answers，其次是参考答案库中
+    # 同一问题、同一回答模型生成过的答案，只为仍然缺少答案的问题重新生成
+    tracker = cost_tracker(data, job, tracker)
+    questions = data['questions']
+    answers = {qid: a for qid, a in (data.get('answers') or {}).items() if qid in questions}
+    missing = {qid: q for qid, q in questions.items() if qid not in answers}
+    if missing:
+        answers.update(answer_store.lookup(missing, *stages.answer_settings()))
+        missing = {qid: q for qid, q in missing.items() if qid not in answers}
+    if missing:
+        generated, = run_runners([StageRunner(missing, "answer", tracker=tracker)], job, 0, 50)
+        if generated is None:
+            raise RuntimeError("Failed to generate answers")
+        answers.update(generated)
+    answers = {qid: answers[qid] for qid in questions if qid in answers}
+    if job is not None and job.cancelled:
+        return {"answers": answers, "scores": {}, "reasons": {}}
+
+    # 重新组织数据结构以匹配质量检查的处理逻辑
+    check_data = {
+        'questions': questions,
+        'answers': answers,
+        'scores1': data['evaluation_1'],
+        'scores2': data['evaluation_2']
+    }
+
+    # 进行质量检查
+    resume = resume_data(data).get('final_scores')
+    result, = run_runners([StageRunner(check_data, "quality", resume=resume, tracker=tracker)], job, 50, 100)
+    if result is None:
+        raise RuntimeError("Failed to perform quality check")
+    report_deferred(tracker, job)
+
+    # 返回质检结果，包含生成的答案
+    return {
+        "answers": answers,
+        "scores": result["scores"],
+        "reasons": result["reasons"]
+    }
+
+
+def pipeline_data(data, job=None, tracker=None):
+    tracker = cost_tracker(data, job, tracker)
+    result, = run_runners([
+        StageRunner(data['questions'], "pipeline", resume=resume_data(data), tracker=tracker)
+    ], job)
+    if result is None:
+        raise RuntimeError("Failed to run pipeline")
+    report_deferred(tracker, job)
+    return {
+        "answers": result['answers'],
+        "evaluation_1": result['scores1'],
+        "evaluation_2": result['scores2'],
+        "final_evaluation": result['final_scores']
+    }
+
+
+HANDLERS: Dict[str, Any] = {
+    'generate': generate_data,
+    'evaluate': evaluate_data,
+    'quality-check': quality_data,
+    'pipeline': pipeline_data,
+}
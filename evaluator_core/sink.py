@@ -0,0 +1,196 @@
+import argparse
+import json
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+# 结果流中的阶段名与 MainWindow.current_data 的键一致，合并时映射为保存文件中的字段名
+SECTIONS = (
+    ("answers", "answers"),
+    ("scores1", "evaluation_1"),
+    ("scores2", "evaluation_2"),
+    ("final_scores", "final_evaluation"),
+)
+STAGES = tuple(stage for stage, _ in SECTIONS)
+# 默认每条记录都 flush（进程崩溃不丢数据），fsync 最多每秒一次（断电最多丢 1 秒）
+DEFAULT_FLUSH_EVERY = 1
+DEFAULT_FSYNC_INTERVAL = 1.0
+
+
+class ResultStreamWriter:
+    # 逐条追加写入结果流（JSONL），每个问题的每个阶段完成后写一行紧凑的记录：
+    # {"stage":"answers","qid":"q1","value":"..."}
+
+    def __init__(self, path: str, fresh: bool = False, flush_every: int = DEFAULT_FLUSH_EVERY,
+                 fsync_interval: float = DEFAULT_FSYNC_INTERVAL):
+        self.path = path
+        self.flush_every = max(1, flush_every)
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._pending = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        repair = not fresh and _ends_with_partial_line(path)
+        self._file = open(path, "w" if fresh else "a", encoding="utf-8")
+        self._last_sync = time.monotonic()
+        if repair:
+            # 上次崩溃时最后一行没写完，先换行，避免新记录接在半行后面
+            self._file.write("\n")
+            self._file.flush()
+
+    def append(self, stage: str, qid: str, value: Any):
+        line = json.dumps({"stage": stage, "qid": qid, "value": value}, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + "\n")
+            self._pending += 1
+            if self._pending >= self.flush_every:
+                self._file.flush()
+                self._pending = 0
+            now = time.monotonic()
+            if self.fsync_interval >= 0 and now - self._last_sync >= self.fsync_interval:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._last_sync = now
+
+    def flush(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._pending = 0
+                self._last_sync = time.monotonic()
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+
+def _ends_with_partial_line(path: str) -> bool:
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return False
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) != b"\n"
+
+
+def read_records(path: str) -> Iterator[dict]:
+    # 逐条读取结果流；最后一行可能因崩溃只写了一半，直接跳过
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+                record["stage"], record["qid"], record["value"]
+            except (ValueError, KeyError, TypeError):
+                continue
+            yield record
+
+
+def add_record(data: Dict[str, Any], stage: str, qid: str, value: Any):
+    # 把一条记录合并进 current_data 结构（answers 为 {qid: 答案}，其余为 {"scores":…, "reasons":…}）
+    if stage == "answers":
+        data.setdefault("answers", {})[qid] = value
+    elif stage in STAGES:
+        result = data.setdefault(stage, {"scores": {}, "reasons": {}})
+        result["scores"][qid] = value["score"]
+        result["reasons"][qid] = value["reason"]
+
+
+def load_stage(path: str, stage: str) -> Optional[Any]:
+    data: Dict[str, Any] = {}
+    for record in read_records(path):
+        if record["stage"] == stage:
+            try:
+                add_record(data, stage, record["qid"], record["value"])
+            except (KeyError, TypeError):
+                continue
+    return data.get(stage)
+
+
+def write_stream(path: str, data: Dict[str, Any]):
+    # 把 current_data 结构中的结果逐条写成结果流
+    writer = ResultStreamWriter(path, fresh=True, flush_every=1000, fsync_interval=-1)
+    try:
+        for stage in STAGES:
+            section = data.get(stage)
+            if not section:
+                continue
+            if stage == "answers":
+                for qid, answer in section.items():
+                    writer.append(stage, qid, answer)
+            else:
+                for qid, score in section["scores"].items():
+                    writer.append(stage, qid, {"score": score, "reason": section["reasons"].get(qid, "")})
+    finally:
+        writer.close()
+
+
+def _write_mapping(f, items: Iterable, indent: str):
+    f.write("{")
+    first = True
+    for key, value in items:
+        f.write("\n" if first else ",\n")
+        f.write(f"{indent}  {json.dumps(key, ensure_ascii=False)}: {json.dumps(value, ensure_ascii=False)}")
+        first = False
+    f.write("{}}}".format("" if first else f"\n{indent}"))
+
+
+def _ordered(mapping: Dict[str, Any], order: Optional[Iterable[str]]) -> Iterator:
+    if order is None:
+        return iter(mapping.items())
+    return ((qid, mapping[qid]) for qid in order if qid in mapping)
+
+
+def write_combined(path: str, questions, load_section: Callable[[str], Optional[Any]]):
+    # 按原有的保存格式（questions/answers/evaluation_1/evaluation_2/final_evaluation）
+    # 逐条写出合并后的 JSON，不在内存中拼出完整的字符串；一次只加载一个阶段的结果
+    order = (lambda: iter(questions)) if questions is not None else (lambda: None)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write('{\n  "questions": ')
+        _write_mapping(f, questions.items() if questions is not None else (), "  ")
+        for stage, name in SECTIONS:
+            section = load_section(stage)
+            if not section:
+                continue
+            f.write(f',\n  "{name}": ')
+            if stage == "answers":
+                _write_mapping(f, _ordered(section, order()), "  ")
+            else:
+                f.write('{\n    "scores": ')
+                _write_mapping(f, _ordered(section["scores"], order()), "    ")
+                f.write(',\n    "reasons": ')
+                _write_mapping(f, _ordered(section["reasons"], order()), "    ")
+                f.write("\n  }")
+        f.write("\n}\n")
+    os.replace(tmp_path, path)
+
+
+def merge_stream(stream_path: str, output_path: str, questions=None):
+    write_combined(output_path, questions, lambda stage: load_stage(stream_path, stage))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把结果流（JSONL）合并为原有的完整 JSON 结果格式")
+    parser.add_argument("stream", help="结果流文件，例如 questions.json.journal.jsonl")
+    parser.add_argument("-q", "--questions", help="问题集文件（.json/.jsonl），用于写入问题并按原顺序排列")
+    parser.add_argument("-o", "--output", required=True, help="输出的 JSON 文件")
+    args = parser.parse_args()
+
+    questions = None
+    if args.questions:
+        from evaluator_core.dataset import QuestionSource
+        questions = QuestionSource(args.questions)
+    merge_stream(args.stream, args.output, questions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,513 @@
+import asyncio
+import json
+import math
+import os
+import re
+import statistics
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import openai
+
+from evaluator_core import answers as answer_store
+from evaluator_core import costs, metrics
+from evaluator_core.completions import create_completion
+
+# 评分格式错误时最多请求的次数
+MAX_FORMAT_RETRIES = 3
+# 多次评分格式错误时使用的默认分数
+DEFAULT_SCORE = 2.5
+# 两位评测员的分数差小于该值时直接取平均，不再进行质检
+AGREEMENT_THRESHOLD = 0.5
+
+# 自适应评测组：评分均值的标准误低于目标时停止追加评测员。
+# 两位评测员时标准误为 |s1 - s2| / 2，默认 0.25 与 AGREEMENT_THRESHOLD 等价
+DEFAULT_PANEL_MAX_JUDGES = 5
+DEFAULT_PANEL_SE_TARGET = AGREEMENT_THRESHOLD / 2
+# 评测组从一位评测员开始：只有一个评分时无法估计标准误，评分落在 0-5 分两端
+# PANEL_CLEAR_MARGIN 以内（明显很好或很差）即停止，否则追加第二位评测员
+MAX_SCORE = 5
+PANEL_CLEAR_MARGIN = AGREEMENT_THRESHOLD
+
+DEFAULT_ANSWER_MODEL = "gpt-3.5-turbo"
+DEFAULT_EVAL_MODEL = "gpt-4"
+DEFAULT_QUALITY_MODEL = "gpt-4"
+
+DEFAULT_ANSWER_CONTENT = "You are a helpful assistant that provides clear and concise answers."
+DEFAULT_EVAL_CONTENT = """你是一位专业的评测专家。请严格按照以下格式对答案进行评分。注意：你必须严格遵守格式要求，否则评分将被拒绝并要求重新评分。
+
+格式要求：
+1. 必须首先输出"[分析理由]"标记，后跟详细分析
+2. 必须最后输出"[评分]"标记，后跟0-5之间的分数（可带一位小数）
+3. 不允许输出任何其他格式的内容
+4. 不允许更改标记的文字或格式
+
+评分标准：
+- 5分：完美的答案，准确、完整、清晰
+- 4分：很好的答案，有小的改进空间
+- 3分：基本合格的答案，但有明显缺陷
+- 2分：答案不够好，有重要内容缺失
+- 1分：答案质量差，大部分内容有问题
+- 0分：完全错误或文不对题
+
+分析要求：
+1. 分析必须具体指出答案的优点和缺点
+2. 分析必须与最终评分相符
+3. 分析必须客观公正，有理有据
+
+示例格式：
+[分析理由]该答案结构清晰，论述准确，但在细节描述上略有不足。优点：1. 主要概念解释准确；2. 逻辑性强。缺点：1. 缺少具体示例；2. 部分专业术语解释不够详细。
+[评分]4.5"""
+DEFAULT_QUALITY_CONTENT = """你是一位资深的质量控制专家。请严格按照以下格式对存在分歧的评分进行分析。注意：你必须严格遵守格式要求，否则分析将被拒绝并要求重新评分。
+
+格式要求：
+1. 必须首先输出"[分析理由]"标记，后跟详细分析
+2. 必须最后输出"[评分]"标记，后跟0-5之间的分数（可带一位小数）
+3. 不允许输出任何其他格式的内容
+4. 不允许更改标记的文字或格式
+
+分析要求：
+1. 必须分析两位评分员的观点差异
+2. 必须结合问题和答案进行综合判断
+3. 必须给出详细的理由支持你的最终评分
+4. 分析必须客观公正，有理有据
+
+评分标准：
+- 5分：完美的答案，准确、完整、清晰
+- 4分：很好的答案，有小的改进空间
+- 3分：基本合格的答案，但有明显缺陷
+- 2分：答案不够好，有重要内容缺失
+- 1分：答案质量差，大部分内容有问题
+- 0分：完全错误或文不对题
+
+示例格式：
+[分析理由]评分员1给出4.5分，认为答案结构清晰但细节不足；评分员2给出3.5分，认为答案有明显疏漏。经过分析，我同意评分员1的观点，因为：1. 答案确实结构完整；2. 细节虽有不足但不影响整体质量；3. 评分员2对细节问题的考虑过重。
+[评分]4.2"""
+
+EVAL_FALLBACK_REASON = "多次评分格式错误，使用默认分数"
+QUALITY_FALLBACK_REASON = "多次质检格式错误，取平均值"
+
+# 结构化评分：用 response_format 的 JSON schema 约束回复为 {"reason": ..., "score": ...}，
+# 模型不会再输出格式错误的评分，省去重新请求。提示词中的 [分析理由]/[评分] 格式要求改由附加说明覆盖
+SCORE_RESPONSE_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "score",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "reason": {"type": "string", "description": "分析理由"},
+                "score": {"type": "number", "description": "0-5 之间的分数，可带一位小数"},
+            },
+            "required": ["reason", "score"],
+            "additionalProperties": False,
+        },
+    },
+}
+STRUCTURED_INSTRUCTION = "\n\n本次请以 JSON 格式输出：reason 字段填写分析理由，score 字段填写 0-5 之间的评分，不需要 [分析理由]/[评分] 标记。"
+
+# 容错解析：全角括号、"4.5分"、"4/5"、评分后的多余文字、Markdown 加粗等接近正确的格式直接取出分数，不再重新请求。
+# 没有括号的标记必须带冒号（"评分：4.5"），避免把理由中的"评分1原因"之类误认为分数
+_SCORE_MARK = re.compile(
+    r"(?:[\[【［]\s*(?:最终)?(?:评分|分数|得分)\s*[\]】］]\s*[:：]?|(?:最终)?(?:评分|分数|得分)\s*[:：]|score\s*[:：])"
+    r"\s*(\d+(?:\.\d+)?)(?:\s*(?:分|/\s*5(?:\.0+)?(?![\d.])|points?))?(?!\s*/\s*\d)(?![\d.])",
+    re.IGNORECASE,
+)
+_REASON_MARK = re.compile(r"^\s*[\[【［]?\s*分析理由\s*[\]】］]?\s*[:：]?")
+_CODE_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+# 错误信息中单独出现的 n，即请求的 n 参数（如 "Invalid 'n'"、"n must be 1"）
+_N_PARAM = re.compile(r"\bn\b")
+
+
+# 已确认不支持 n 参数（一次请求返回多个独立回复）的 (base_url, model)
+_multi_sample_unsupported = set()
+# 已确认不支持结构化输出（response_format 为 json_schema）的 (base_url, model)
+_structured_unsupported = set()
+
+
+def multi_sample_enabled() -> bool:
+    # 多位评测员的评分是否合并为一次 n>1 的请求
+    return os.getenv("OPENAI_EVAL_MULTI_SAMPLE", "1").lower() not in ("0", "false", "no")
+
+
+def multi_sample_supported(base_url: str, model: str) -> bool:
+    return (base_url, model) not in _multi_sample_unsupported
+
+
+def mark_multi_sample_unsupported(base_url: str, model: str):
+    _multi_sample_unsupported.add((base_url, model))
+
+
+def n_rejected(message: Optional[str], param: Optional[str] = None) -> bool:
+    # 400 错误指向 n 参数时才说明后端不支持一次请求多个回复；其他 400（如答案过长）只与这一个问题有关
+    return param == "n" or _N_PARAM.search(message or "") is not None
+
+
+def structured_enabled() -> bool:
+    # 评测和质检是否请求结构化输出，后端不支持时自动退回文本格式
+    return os.getenv("OPENAI_STRUCTURED_SCORES", "1").lower() not in ("0", "false", "no")
+
+
+def panel_enabled() -> bool:
+    # 质检阶段改为自适应评测组：分歧大的问题追加评测员，而不是交给质检模型
+    return os.getenv("OPENAI_PANEL_ADAPTIVE", "0").lower() in ("1", "true", "yes")
+
+
+def _int_env(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def panel_settings() -> Tuple[int, float]:
+    # (评测员上限, 标准误目标)，取值无效时使用默认值，目标必须大于 0
+    max_judges = _int_env("OPENAI_PANEL_MAX_JUDGES", DEFAULT_PANEL_MAX_JUDGES)
+    target = _float_env("OPENAI_PANEL_SE_TARGET", DEFAULT_PANEL_SE_TARGET)
+    if not target > 0:
+        target = DEFAULT_PANEL_SE_TARGET
+    return max(2, max_judges), target
+
+
+def answer_settings() -> Tuple[str, str]:
+    return (
+        os.getenv("OPENAI_ANSWER_MODEL", DEFAULT_ANSWER_MODEL),
+        os.getenv("OPENAI_ANSWER_CONTENT", DEFAULT_ANSWER_CONTENT),
+    )
+
+
+def eval_settings() -> Tuple[str, str]:
+    return (
+        os.getenv("OPENAI_EVAL_MODEL", DEFAULT_EVAL_MODEL),
+        os.getenv("OPENAI_EVAL_CONTENT", DEFAULT_EVAL_CONTENT),
+    )
+
+
+def quality_settings() -> Tuple[str, str]:
+    return (
+        os.getenv("OPENAI_QUALITY_MODEL", DEFAULT_QUALITY_MODEL),
+        os.getenv("OPENAI_QUALITY_CONTENT", DEFAULT_QUALITY_CONTENT),
+    )
+
+
+def answer_messages(system_content: str, question: str) -> list:
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": question}
+    ]
+
+
+def evaluate_messages(system_content: str, answer: str) -> list:
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": f"需要评分的答案: {answer}"}
+    ]
+
+
+def quality_messages(system_content: str, question: str, answer: str,
+                     score1: float, reason1: str, score2: float, reason2: str) -> list:
+    return [
+        {"role": "system", "content": system_content},
+        {"role": "user", "content": f"Question: {question}\nAnswer: {answer}\nScore 1: {score1} (Reason: {reason1})\nScore 2: {score2} (Reason: {reason2})\nAnalyze the scores and provide your final score with reasoning."}
+    ]
+
+
+def evaluate_salt(evaluator_num: int, attempt: int) -> str:
+    # 两位评测员、每次格式重试分别缓存
+    return f"evaluator-{evaluator_num}-attempt-{attempt}"
+
+
+def panel_salt(evaluator_nums: Sequence[int], attempt: int) -> str:
+    return f"panel-{'-'.join(str(n) for n in evaluator_nums)}-attempt-{attempt}"
+
+
+def quality_salt(attempt: int) -> str:
+    return f"attempt-{attempt}"
+
+
+def _parse_exact(response: str) -> Optional[Tuple[str, float]]:
+    # 严格的 "[分析理由]...[评分]4.5" 格式
+    if '[分析理由]' not in response or '[评分]' not in response:
+        return None
+    reason = response.split('[评分]')[0].replace('[分析理由]', '').strip()
+    score_text = response.split('[评分]')[1].strip()
+    try:
+        score = float(score_text)
+    except ValueError:
+        return None
+    return reason, score
+
+
+def _parse_json(response: str) -> Optional[Tuple[str, float]]:
+    # 结构化输出 {"reason": ..., "score": ...}，也接受包在 ```json 代码块中的 JSON
+    text = _CODE_FENCE.sub("", response)
+    if not text.startswith("{"):
+        return None
+    try:
+        data = json.loads(text)
+        score = float(data["score"])
+    except (ValueError, TypeError, KeyError):
+        return None
+    reason = data.get("reason")
+    return (reason if isinstance(reason, str) else "").strip(), score
+
+
+def _parse_tolerant(response: str) -> Optional[Tuple[str, float]]:
+    text = response.replace("**", "")
+    matches = list(_SCORE_MARK.finditer(text))
+    if not matches:
+        return None
+    # 取最后一个评分标记，理由为它之前的内容
+    match = matches[-1]
+    reason = _REASON_MARK.sub("", text[:match.start()], count=1).strip()
+    return reason, float(match.group(1))
+
+
+def parse_score(response: Optional[str]) -> Optional[Tuple[str, float, str]]:
+    # 返回 (理由, 分数, 解析方式)，解析方式为 json / exact / recovered；无法解析或分数越界时返回 None
+    if not response:
+        return None
+    response = response.strip()
+    for how, parse in (("json", _parse_json), ("exact", _parse_exact), ("recovered", _parse_tolerant)):
+        parsed = parse(response)
+        if parsed and 0 <= parsed[1] <= 5:
+            return parsed[0], parsed[1], how
+    return None
+
+
+def _tracker(tracker: Optional[costs.CostTracker]) -> Optional[costs.CostTracker]:
+    return tracker if tracker is not None else costs.current.get()
+
+
+def score_content(content: Optional[str], stage: str, model: str,
+                  tracker: Optional[costs.CostTracker] = None) -> Optional[Tuple[str, float]]:
+    # 解析一个评分回复，并按解析方式计入指标和本次运行的统计
+    parsed = parse_score(content)
+    outcome = parsed[2] if parsed else "invalid"
+    metrics.SCORE_PARSES.inc(stage=stage, model=model, outcome=outcome)
+    tracker = _tracker(tracker)
+    if tracker is not None:
+        tracker.count_scoring(outcome)
+    return (parsed[0], parsed[1]) if parsed else None
+
+
+def count_retries(stage: str, model: str, count: int = 1, tracker: Optional[costs.CostTracker] = None):
+    metrics.FORMAT_RETRIES.inc(count, stage=stage, model=model)
+    tracker = _tracker(tracker)
+    if tracker is not None:
+        tracker.count_scoring("retries", count)
+
+
+def count_fallback(stage: str, model: str, tracker: Optional[costs.CostTracker] = None):
+    metrics.FALLBACKS.inc(stage=stage, model=model)
+    tracker = _tracker(tracker)
+    if tracker is not None:
+        tracker.count_scoring("fallbacks")
+
+
+def structured_params(params: dict) -> dict:
+    # 在评分请求上加 response_format，并在系统提示词后附上 JSON 输出说明
+    messages = [dict(m) for m in params["messages"]]
+    if messages and messages[0].get("role") == "system":
+        messages[0]["content"] = (messages[0].get("content") or "") + STRUCTURED_INSTRUCTION
+    return {**params, "messages": messages, "response_format": SCORE_RESPONSE_FORMAT}
+
+
+def structured_supported(base_url: str, model: str) -> bool:
+    return structured_enabled() and (base_url, model) not in _structured_unsupported
+
+
+def mark_structured_unsupported(base_url: str, model: str):
+    _structured_unsupported.add((base_url, model))
+
+
+def mark_structured_supported(base_url: str, model: str):
+    _structured_unsupported.discard((base_url, model))
+
+
+async def scoring_completion(client, stage: str, cache_salt: str, **params):
+    # 评分请求：后端支持时使用结构化输出；返回 400 时记住该后端不支持并改用文本格式重发。
+    # 文本格式也返回 400 时说明是其他参数（如 n）的问题，撤销记录并抛出
+    base_url = str(getattr(client, "base_url", ""))
+    model = params.get("model") or ""
+    if structured_supported(base_url, model):
+        try:
+            return await create_completion(client, stage, cache_salt=cache_salt, **structured_params(params))
+        except openai.BadRequestError as e:
+            if "n" in params and n_rejected(e.message, e.param):
+                # 被拒绝的是 n 而不是结构化输出，由调用方改为逐个请求
+                raise
+            mark_structured_unsupported(base_url, model)
+            try:
+                return await create_completion(client, stage, cache_salt=cache_salt, **params)
+            except openai.BadRequestError:
+                mark_structured_supported(base_url, model)
+                raise
+    return await create_completion(client, stage, cache_salt=cache_salt, **params)
+
+
+def scores_agree(score1: float, score2: float) -> bool:
+    return abs(score1 - score2) < AGREEMENT_THRESHOLD
+
+
+def agreement_result(score1: float, reason1: str, score2: float, reason2: str) -> Tuple[float, str]:
+    return (score1 + score2) / 2, f"评分接近，取平均值。\n评分1原因：{reason1}\n评分2原因：{reason2}"
+
+
+def quality_result(score: float, reason: str, reason1: str, reason2: str) -> Tuple[float, str]:
+    return score, f"质检分析：{reason}\n原评分1原因：{reason1}\n原评分2原因：{reason2}"
+
+
+def panel_standard_error(scores: Sequence[float]) -> float:
+    if len(scores) < 2:
+        return math.inf
+    return statistics.stdev(scores) / math.sqrt(len(scores))
+
+
+def panel_converged(scores: Sequence[float], target: float) -> bool:
+    if len(scores) == 1:
+        return scores[0] <= PANEL_CLEAR_MARGIN or scores[0] >= MAX_SCORE - PANEL_CLEAR_MARGIN
+    return panel_standard_error(scores) < target
+
+
+def panel_needs_judges(score1: float, score2: Optional[float], target: float) -> bool:
+    # 评测组是否需要请求新的评测员：已有的第二份评分（score2）在需要第二位评测员时直接使用，不算新的请求
+    scores = [score1]
+    if not panel_converged(scores, target) and score2 is not None:
+        scores.append(score2)
+    return not panel_converged(scores, target)
+
+
+def panel_result(scores: Sequence[float], reasons: Sequence[str], converged: bool) -> Tuple[float, str]:
+    # 最终分数取评测组均值，原因中记录使用的评测员数量和各自的评分
+    mean = sum(scores) / len(scores)
+    status = "" if converged else "（已达上限，仍存在分歧）"
+    header = f"评测组共 {len(scores)} 位评测员{status}，评分：{'、'.join(str(s) for s in scores)}，取平均值。"
+    details = "\n".join(f"评分{i}原因：{reason}" for i, reason in enumerate(reasons, 1))
+    return mean, f"{header}\n{details}"
+
+
+async def answer_question(client, question: str, model: str, system_content: str) -> str:
+    completion = await create_completion(
+        client, "answer",
+        model=model,
+        messages=answer_messages(system_content, question)
+    )
+    answer = completion.choices[0].message.content
+    await asyncio.to_thread(answer_store.remember, question, model, system_content, answer)
+    return answer
+
+
+async def evaluate_answer(client, answer: str, model: str, system_content: str,
+                          evaluator_num: int = 1) -> Tuple[float, str]:
+    for attempt in range(MAX_FORMAT_RETRIES):
+        if attempt:
+            count_retries("evaluate", model)
+        completion = await scoring_completion(
+            client, "evaluate",
+            cache_salt=evaluate_salt(evaluator_num, attempt),
+            model=model,
+            messages=evaluate_messages(system_content, answer)
+        )
+        parsed = score_content(completion.choices[0].message.content, "evaluate", model)
+        if parsed:
+            reason, score = parsed
+            return score, reason
+    count_fallback("evaluate", model)
+    return DEFAULT_SCORE, EVAL_FALLBACK_REASON
+
+
+async def evaluate_samples(client, answer: str, model: str, system_content: str,
+                           evaluator_nums: Sequence[int]) -> Dict[int, Tuple[float, str]]:
+    # 用一次 n=len(evaluator_nums) 的请求同时取得多位评测员的独立评分，省去重复的提示词 token 和往返；
+    # 格式错误的评分只为缺少的评测员重新请求。后端不支持 n（报错指向 n 或只返回一个回复）时记住该后端，
+    # 退回逐个请求；其他 400 错误只让这一个问题退回逐个请求
+    results: Dict[int, Tuple[float, str]] = {}
+    backend = (str(getattr(client, "base_url", "")), model)
+    if len(evaluator_nums) > 1 and multi_sample_supported(*backend):
+        for attempt in range(MAX_FORMAT_RETRIES):
+            missing = [n for n in evaluator_nums if n not in results]
+            if not missing:
+                break
+            if attempt:
+                count_retries("evaluate", model)
+            params = {"model": model, "messages": evaluate_messages(system_content, answer)}
+            if len(missing) > 1:
+                params["n"] = len(missing)
+            try:
+                completion = await scoring_completion(
+                    client, "evaluate", cache_salt=panel_salt(missing, attempt), **params
+                )
+            except openai.BadRequestError as e:
+                if "n" in params and n_rejected(e.message, e.param):
+                    mark_multi_sample_unsupported(*backend)
+                break
+            parsed = [score_content(choice.message.content, "evaluate", model) for choice in completion.choices]
+            valid = [p for p in parsed if p]
+            for evaluator_num, (reason, score) in zip(missing, valid):
+                results[evaluator_num] = (score, reason)
+            if len(missing) > 1 and len(completion.choices) < len(missing):
+                mark_multi_sample_unsupported(*backend)
+                break
+        else:
+            for n in evaluator_nums:
+                if n not in results:
+                    count_fallback("evaluate", model)
+                    results[n] = (DEFAULT_SCORE, EVAL_FALLBACK_REASON)
+
+    missing = [n for n in evaluator_nums if n not in results]
+    if missing:
+        separate = await asyncio.gather(*(
+            evaluate_answer(client, answer, model, system_content, n) for n in missing
+        ))
+        results.update(zip(missing, separate))
+    return results
+
+
+async def adaptive_panel(client, answer: str, score1: float, reason1: str,
+                         score2: Optional[float], reason2: Optional[str],
+                         model: str, system_content: str, max_judges: Optional[int] = None,
+                         target: Optional[float] = None) -> Tuple[float, str]:
+    # 以第一位评测员的评分为起点，评分不够明确时才加入第二位评测员（已有 score2 时直接使用），
+    # 之后分歧仍超过目标时逐个追加评测员，直到收敛或达到上限
+    default_max, default_target = panel_settings()
+    max_judges = default_max if max_judges is None else max_judges
+    target = default_target if target is None else target
+    scores: List[float] = [score1]
+    reasons: List[str] = [reason1]
+    while not panel_converged(scores, target) and len(scores) < max_judges:
+        if len(scores) == 1 and score2 is not None:
+            score, reason = score2, reason2
+        else:
+            score, reason = await evaluate_answer(client, answer, model, system_content, len(scores) + 1)
+        scores.append(score)
+        reasons.append(reason)
+    return panel_result(scores, reasons, panel_converged(scores, target))
+
+
+async def check_quality(client, question: str, answer: str, score1: float, reason1: str,
+                        score2: float, reason2: str, model: str, system_content: str) -> Tuple[float, str]:
+    if scores_agree(score1, score2):
+        return agreement_result(score1, reason1, score2, reason2)
+    for attempt in range(MAX_FORMAT_RETRIES):
+        if attempt:
+            count_retries("quality", model)
+        completion = await scoring_completion(
+            client, "quality",
+            cache_salt=quality_salt(attempt),
+            model=model,
+            messages=quality_messages(system_content, question, answer, score1, reason1, score2, reason2)
+        )
+        parsed = score_content(completion.choices[0].message.content, "quality", model)
+        if parsed:
+            reason, score = parsed
+            return quality_result(score, reason, reason1, reason2)
+    count_fallback("quality", model)
+    return (score1 + score2) / 2, QUALITY_FALLBACK_REASON
@@ -0,0 +1,459 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from evaluator_core import backends, engine, stages
+from evaluator_core.sink import write_combined
+
+# 多台机器/多个进程共用的工作队列，保存在共享文件系统上的 SQLite（WAL）文件中。
+# 每个问题的每个阶段是一个工作项 (stage, qid)，阶段名与结果流一致：
+# answers 完成后加入 scores1、scores2，两者都完成后加入 final_scores。
+# 工作进程按租约领取工作项并定期续约，进程退出或失联后租约过期，工作项会被重新领取。
+
+DEFAULT_LEASE_SECONDS = 120.0
+DEFAULT_MAX_ATTEMPTS = 5
+DEFAULT_POLL_INTERVAL = 2.0
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    qid TEXT PRIMARY KEY,
+    question TEXT NOT NULL,
+    position INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    stage TEXT NOT NULL,
+    qid TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'pending',
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    value TEXT,
+    error TEXT,
+    updated REAL NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (stage, qid)
+);
+CREATE INDEX IF NOT EXISTS items_state ON items (state, lease_until);
+CREATE INDEX IF NOT EXISTS items_lease ON items (state, priority, lease_until);
+CREATE TABLE IF NOT EXISTS workers (
+    worker TEXT PRIMARY KEY,
+    host TEXT,
+    pid INTEGER,
+    started REAL NOT NULL,
+    heartbeat REAL NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# 领取时优先处理靠后的阶段，让已经开始的问题尽快完成。
+# 优先级存在 priority 列中，领取时按 (state, priority) 索引取前几条，不必每次扫描全表
+_STAGE_PRIORITY = {"final_scores": 0, "scores1": 1, "scores2": 1, "answers": 2}
+
+
+class WorkQueue:
+    def __init__(self, path: str, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connect().executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=60, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # BEGIN IMMEDIATE 一开始就拿写锁，多个进程同时领取时不会领到同一个工作项
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def add_questions(self, questions: Iterable[Tuple[str, str]], batch_size: int = 1000) -> int:
+        # 重复加入同一个问题集不会产生重复的工作项
+        added = 0
+        batch: List[Tuple[str, str]] = []
+
+        def flush():
+            nonlocal added
+            with self._transaction() as conn:
+                position = conn.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM questions").fetchone()[0]
+                for offset, (qid, question) in enumerate(batch):
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO questions (qid, question, position) VALUES (?, ?, ?)",
+                        (qid, question, position + offset),
+                    )
+                    if cursor.rowcount:
+                        added += 1
+                        conn.execute(
+                            "INSERT OR IGNORE INTO items (stage, qid, updated, priority) VALUES ('answers', ?, ?, ?)",
+                            (qid, time.time(), _STAGE_PRIORITY["answers"]),
+                        )
+            batch.clear()
+
+        for qid, question in questions:
+            batch.append((str(qid), question))
+            if len(batch) >= batch_size:
+                flush()
+        if batch:
+            flush()
+        return added
+
+    def register(self, worker: str):
+        now = time.time()
+        self._connect().execute(
+            "INSERT OR REPLACE INTO workers (worker, host, pid, started, heartbeat) VALUES (?, ?, ?, ?, ?)",
+            (worker, socket.gethostname(), os.getpid(), now, now),
+        )
+
+    def lease(self, worker: str, limit: int, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> List[Dict[str, Any]]:
+        # 领取待处理的工作项，以及租约已过期（原工作进程失联）的工作项。
+        # 过期的工作项先领取（它们已经开始过），其余按阶段优先级从 pending 中取。
+        # 已领取 max_attempts 次仍未完成的过期工作项（例如每次都让工作进程崩溃）标记为失败，不再领取
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE items SET state = 'failed', worker = NULL, lease_until = NULL, "
+                "error = COALESCE(error, '租约多次过期'), updated = ? "
+                "WHERE state = 'leased' AND lease_until < ? AND attempts >= ?",
+                (now, now, self.max_attempts),
+            )
+            rows = conn.execute(
+                "SELECT stage, qid FROM items WHERE state = 'leased' AND lease_until < ? LIMIT ?", (now, limit)
+            ).fetchall()
+            if len(rows) < limit:
+                rows += conn.execute(
+                    "SELECT stage, qid FROM items WHERE state = 'pending' ORDER BY priority LIMIT ?",
+                    (limit - len(rows),),
+                ).fetchall()
+            conn.executemany(
+                "UPDATE items SET state = 'leased', worker = ?, lease_until = ?, attempts = attempts + 1, "
+                "updated = ? WHERE stage = ? AND qid = ?",
+                [(worker, now + lease_seconds, now, stage, qid) for stage, qid in rows],
+            )
+            return [self._payload(conn, stage, qid) for stage, qid in rows]
+
+    def _payload(self, conn: sqlite3.Connection, stage: str, qid: str) -> Dict[str, Any]:
+        # 工作项需要的输入：问题、答案，质检还需要两份评分
+        item: Dict[str, Any] = {"stage": stage, "qid": qid}
+        item["question"] = conn.execute("SELECT question FROM questions WHERE qid = ?", (qid,)).fetchone()[0]
+        if stage != "answers":
+            item["answer"] = self._value(conn, "answers", qid)
+        if stage == "final_scores":
+            item["scores1"] = self._value(conn, "scores1", qid)
+            item["scores2"] = self._value(conn, "scores2", qid)
+        return item
+
+    def _value(self, conn: sqlite3.Connection, stage: str, qid: str) -> Any:
+        row = conn.execute(
+            "SELECT value FROM items WHERE stage = ? AND qid = ? AND state = 'done'", (stage, qid)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def heartbeat(self, worker: str, lease_seconds: float = DEFAULT_LEASE_SECONDS):
+        # 为本进程持有的工作项续约
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE items SET lease_until = ? WHERE worker = ? AND state = 'leased'",
+                (now + lease_seconds, worker),
+            )
+            conn.execute("UPDATE workers SET heartbeat = ? WHERE worker = ?", (now, worker))
+
+    def complete(self, worker: str, stage: str, qid: str, value: Any) -> bool:
+        # 同一工作项被重新领取后可能完成两次，以先完成的为准
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "UPDATE items SET state = 'done', value = ?, worker = ?, error = NULL, updated = ? "
+                "WHERE stage = ? AND qid = ? AND state != 'done'",
+                (json.dumps(value, ensure_ascii=False), worker, now, stage, qid),
+            )
+            if not cursor.rowcount:
+                return False
+            conn.execute("UPDATE workers SET completed = completed + 1 WHERE worker = ?", (worker,))
+            if stage == "answers":
+                conn.executemany(
+                    "INSERT OR IGNORE INTO items (stage, qid, updated, priority) VALUES (?, ?, ?, ?)",
+                    [(stage, qid, now, _STAGE_PRIORITY[stage]) for stage in ("scores1", "scores2")],
+                )
+            elif stage in ("scores1", "scores2"):
+                done = conn.execute(
+                    "SELECT COUNT(*) FROM items WHERE qid = ? AND stage IN ('scores1', 'scores2') AND state = 'done'",
+                    (qid,),
+                ).fetchone()[0]
+                if done == 2:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO items (stage, qid, updated, priority) VALUES ('final_scores', ?, ?, ?)",
+                        (qid, now, _STAGE_PRIORITY["final_scores"]),
+                    )
+        return True
+
+    def fail(self, worker: str, stage: str, qid: str, error: str):
+        # 失败的工作项放回队列，超过最大尝试次数后标记为失败
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, error = ?, updated = ? "
+                "WHERE stage = ? AND qid = ? AND worker = ? AND state = 'leased'",
+                (self.max_attempts, error, time.time(), stage, qid, worker),
+            )
+
+    def requeue_expired(self) -> int:
+        # 把租约过期的工作项放回队列（领取时也会自动接手，这里用于让状态统计及时反映），
+        # 超过最大尝试次数的标记为失败
+        now = time.time()
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE items SET state = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END, "
+                "worker = NULL, lease_until = NULL, updated = ? WHERE state = 'leased' AND lease_until < ?",
+                (self.max_attempts, now, now),
+            ).rowcount
+
+    def retry_failed(self) -> int:
+        with self._transaction() as conn:
+            return conn.execute(
+                "UPDATE items SET state = 'pending', attempts = 0, updated = ? WHERE state = 'failed'", (time.time(),)
+            ).rowcount
+
+    def finished(self) -> bool:
+        row = self._connect().execute("SELECT 1 FROM items WHERE state IN ('pending', 'leased') LIMIT 1").fetchone()
+        return row is None
+
+    def stats(self, alive_seconds: float = DEFAULT_LEASE_SECONDS) -> Dict[str, Any]:
+        conn = self._connect()
+        stages_count: Dict[str, Dict[str, int]] = {}
+        for stage, state, count in conn.execute("SELECT stage, state, COUNT(*) FROM items GROUP BY stage, state"):
+            stages_count.setdefault(stage, {})[state] = count
+        workers = [
+            {"worker": w, "host": h, "pid": p, "completed": c, "alive": time.time() - hb < alive_seconds}
+            for w, h, p, c, hb in conn.execute("SELECT worker, host, pid, completed, heartbeat FROM workers")
+        ]
+        return {
+            "questions": conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0],
+            "stages": stages_count,
+            "workers": workers,
+        }
+
+    def questions(self) -> "QueueQuestions":
+        return QueueQuestions(self)
+
+    def load_section(self, stage: str) -> Optional[Any]:
+        # 按结果流的格式读出一个阶段的结果，供 write_combined 合并
+        rows = self._connect().execute(
+            "SELECT qid, value FROM items WHERE stage = ? AND state = 'done'", (stage,)
+        ).fetchall()
+        if not rows:
+            return None
+        if stage == "answers":
+            return {qid: json.loads(value) for qid, value in rows}
+        section: Dict[str, Dict[str, Any]] = {"scores": {}, "reasons": {}}
+        for qid, value in rows:
+            value = json.loads(value)
+            section["scores"][qid] = value["score"]
+            section["reasons"][qid] = value["reason"]
+        return section
+
+
+class QueueQuestions:
+    # 按加入顺序逐条读取队列中的问题，不一次性加载到内存
+
+    def __init__(self, queue: WorkQueue):
+        self.queue = queue
+
+    def items(self) -> Iterator[Tuple[str, str]]:
+        return iter(self.queue._connect().execute("SELECT qid, question FROM questions ORDER BY position"))
+
+    def __iter__(self) -> Iterator[str]:
+        return (qid for qid, _ in self.items())
+
+
+async def process_items(client, items: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Any]:
+    # 处理同一个问题的一组工作项；同时领到两份评分时合并为一次 n=2 的请求
+    first = items[0]
+    results: Dict[Tuple[str, str], Any] = {}
+    stage = first["stage"]
+    if stage == "answers":
+        model, content = stages.answer_settings()
+        results[("answers", first["qid"])] = await stages.answer_question(client, first["question"], model, content)
+    elif stage in ("scores1", "scores2"):
+        model, content = stages.eval_settings()
+        nums = [int(item["stage"][-1]) for item in items]
+        if stages.multi_sample_enabled():
+            scored = await stages.evaluate_samples(client, first["answer"], model, content, nums)
+        else:
+            scored = {n: await stages.evaluate_answer(client, first["answer"], model, content, n) for n in nums}
+        for n, (score, reason) in scored.items():
+            results[(f"scores{n}", first["qid"])] = {"score": score, "reason": reason}
+    else:
+        s1, s2 = first["scores1"], first["scores2"]
+        if stages.panel_enabled():
+            model, content = stages.eval_settings()
+            score, reason = await stages.adaptive_panel(
+                client, first["answer"], s1["score"], s1["reason"], s2["score"], s2["reason"], model, content
+            )
+        else:
+            model, content = stages.quality_settings()
+            score, reason = await stages.check_quality(
+                client, first["question"], first["answer"],
+                s1["score"], s1["reason"], s2["score"], s2["reason"], model, content
+            )
+        results[("final_scores", first["qid"])] = {"score": score, "reason": reason}
+    return results
+
+
+def group_items(items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for item in items:
+        kind = "scores" if item["stage"] in ("scores1", "scores2") else item["stage"]
+        groups.setdefault((kind, item["qid"]), []).append(item)
+    return list(groups.values())
+
+
+def run_worker(queue: WorkQueue, worker: Optional[str] = None, concurrency: Optional[int] = None,
+               lease_seconds: float = DEFAULT_LEASE_SECONDS, poll_interval: float = DEFAULT_POLL_INTERVAL,
+               wait: bool = False, log=print) -> int:
+    # 循环领取并处理工作项，直到队列中没有待处理的工作项（wait=True 时持续等待新的工作项）。
+    # 返回本进程完成的工作项数量
+    worker = worker or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    concurrency = concurrency or engine.get_max_in_flight()
+    client = backends.default_client()
+    queue.register(worker)
+    stop = threading.Event()
+    completed = 0
+
+    def keep_alive():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                queue.heartbeat(worker, lease_seconds)
+            except sqlite3.Error as e:
+                log(f"[{worker}] 续约失败: {e}")
+
+    heartbeat_thread = threading.Thread(target=keep_alive, name="workqueue-heartbeat", daemon=True)
+    heartbeat_thread.start()
+
+    pending: List[List[Dict[str, Any]]] = []
+    lease_lock = asyncio.Lock()
+    drained = False
+
+    def slots():
+        # 每当有协程空出来就交出一个位置，由 handle 领取下一组工作项。
+        # 领取和检查队列是阻塞的 SQLite 调用，放在 handle 中经 asyncio.to_thread 执行，不占用事件循环
+        while not drained:
+            # 结果由 handle 直接写回队列，这里用同一个键，避免 results 随工作项数增长
+            yield "", None
+
+    async def next_group() -> Optional[List[Dict[str, Any]]]:
+        # 手头的工作项用完时再领取一批，不必等上一批全部完成；同一时刻只有一个协程去领取
+        nonlocal pending, drained
+        async with lease_lock:
+            if not pending:
+                items = await asyncio.to_thread(queue.lease, worker, concurrency, lease_seconds)
+                if items:
+                    pending = group_items(items)
+                    pending.reverse()
+                    log(f"[{worker}] 已完成 {completed} 个工作项")
+                elif not wait and await asyncio.to_thread(queue.finished):
+                    drained = True
+            return pending.pop() if pending else None
+
+    async def handle(_, __):
+        nonlocal completed
+        group = await next_group()
+        if group is None:
+            # 暂时没有可领取的工作项，等待 poll_interval 后再试
+            if not drained:
+                await asyncio.sleep(poll_interval)
+            return
+        try:
+            results = await process_items(client, group)
+        except Exception as e:
+            for item in group:
+                await asyncio.to_thread(queue.fail, worker, item["stage"], item["qid"], str(e))
+            log(f"[{worker}] {group[0]['stage']} {group[0]['qid']} 失败: {e}")
+            return
+        for (stage, qid), value in results.items():
+            if await asyncio.to_thread(queue.complete, worker, stage, qid, value):
+                completed += 1
+
+    try:
+        engine.run(engine.run_bounded(slots(), handle, {}, concurrency))
+    finally:
+        stop.set()
+    return completed
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="多进程/多机器共用的评测工作队列")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    init = sub.add_parser("init", help="把问题集加入队列")
+    init.add_argument("queue", help="队列文件（SQLite），多台机器使用时放在共享文件系统上")
+    init.add_argument("-q", "--questions", required=True, help="问题集文件（.json/.jsonl）")
+
+    work = sub.add_parser("worker", help="启动工作进程，领取并处理工作项")
+    work.add_argument("queue")
+    work.add_argument("--id", help="工作进程名称，默认为 主机名-进程号")
+    work.add_argument("--concurrency", type=int, help="同时处理的工作项数，默认为 OPENAI_MAX_IN_FLIGHT")
+    work.add_argument("--lease", type=float, default=DEFAULT_LEASE_SECONDS, help="租约时长（秒）")
+    work.add_argument("--wait", action="store_true", help="队列处理完后继续等待新的工作项")
+
+    status = sub.add_parser("status", help="查看各阶段进度和工作进程")
+    status.add_argument("queue")
+
+    requeue = sub.add_parser("requeue", help="把租约过期的工作项放回队列")
+    requeue.add_argument("queue")
+    requeue.add_argument("--failed", action="store_true", help="同时重试已标记为失败的工作项")
+
+    merge = sub.add_parser("merge", help="把队列中的结果合并为完整的 JSON 结果")
+    merge.add_argument("queue")
+    merge.add_argument("-o", "--output", required=True)
+
+    args = parser.parse_args(argv)
+    queue = WorkQueue(args.queue)
+    if args.command == "init":
+        from evaluator_core.dataset import QuestionSource
+        print(f"新加入 {queue.add_questions(QuestionSource(args.questions).items())} 个问题")
+    elif args.command == "worker":
+        completed = run_worker(queue, args.id, args.concurrency, args.lease, wait=args.wait,
+                               log=lambda message: print(message, file=sys.stderr))
+        print(f"完成 {completed} 个工作项")
+    elif args.command == "status":
+        print(json.dumps(queue.stats(), ensure_ascii=False, indent=2))
+    elif args.command == "requeue":
+        count = queue.requeue_expired()
+        if args.failed:
+            count += queue.retry_failed()
+        print(f"放回 {count} 个工作项")
+    elif args.command == "merge":
+        write_combined(args.output, queue.questions(), queue.load_section)
+
+
+if __name__ == "__main__":
+    main()
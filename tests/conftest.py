@@ -0,0 +1,35 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# 测试不读写用户目录下的响应缓存和参考答案库
+os.environ["OPENAI_CACHE_ENABLED"] = "0"
+os.environ["OPENAI_ANSWER_STORE_ENABLED"] = "0"
+os.environ.pop("OPENAI_BACKENDS", None)
+os.environ.pop("OPENAI_BACKENDS_FILE", None)
+
+from benchmarks import mock_openai_server as mock  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def mock_server():
+    # 整个测试会话共用一个本地模拟服务，在途请求统一指向它
+    server = mock.start_server(seed=1)
+    os.environ["OPENAI_API_KEY"] = "test-key"
+    os.environ["OPENAI_API_BASE"] = server.base_url
+    yield server
+    server.shutdown()
+
+
+@pytest.fixture
+def server_state(mock_server):
+    # 单个测试可以修改延迟和错误比例，结束后恢复
+    state = mock_server.state
+    saved = state.latency, state.rate_429, state.rate_5xx, state.malformed_rate, state.near_miss_rate
+    state.reset_stats()
+    yield state
+    state.latency, state.rate_429, state.rate_5xx, state.malformed_rate, state.near_miss_rate = saved
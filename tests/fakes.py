@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from openai.types.chat import ChatCompletion
+
+
+def completion(*contents, model="m"):
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test", "object": "chat.completion", "created": 0, "model": model,
+        "choices": [{"index": i, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}
+                    for i, content in enumerate(contents)],
+    })
+
+
+def scored(score):
+    return f"[分析理由]理由 {score}\n[评分]{score}"
+
+
+class FakeClient:
+    # 按顺序返回预先准备好的回复（回复内容列表或异常），记录每次请求的参数
+    def __init__(self, *replies):
+        self.base_url = "http://backend.test/v1"
+        self.replies = list(replies)
+        self.calls = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **params):
+        self.calls.append(params)
+        reply = self.replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return completion(*reply, model=params["model"])
+
+
+class FakeRunner:
+    # 批处理：按轮次返回预先准备好的回复，记录每轮提交了哪些请求。
+    # 回复为 (状态码, 错误信息) 时该条目失败，原因记入 errors
+    cancelled = False
+    client = None
+
+    def __init__(self, rounds, tracker=None):
+        self.rounds = rounds
+        self.tracker = tracker
+        self.submitted = []
+        self.bodies = {}
+        self.errors = {}
+
+    def complete(self, requests):
+        replies = self.rounds[len(self.submitted)]
+        self.submitted.append([custom_id for custom_id, _, _ in requests])
+        self.bodies = {custom_id: body for custom_id, body, _ in requests}
+        results = {}
+        for custom_id, _, _ in requests:
+            reply = replies.get(custom_id)
+            if isinstance(reply, tuple):
+                self.errors[custom_id] = reply
+                reply = None
+            results[custom_id] = reply
+        return results
+
+    # 评分请求不区分结构化输出
+    complete_scores = complete
+
+    def error(self, custom_id):
+        return f"{custom_id} 请求失败"
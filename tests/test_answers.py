@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from fakes import FakeClient, FakeRunner, completion
+
+from evaluator_core import answers, batch, stages
+from evaluator_core.answers import AnswerStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    path = str(tmp_path / "answers.sqlite")
+    monkeypatch.setenv("OPENAI_ANSWER_STORE_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_ANSWER_STORE_PATH", path)
+    return answers.get_store()
+
+
+def test_store_is_keyed_by_model_and_prompt(tmp_path):
+    store = AnswerStore(str(tmp_path / "answers.sqlite"))
+    store.put("问题", "gpt-4", "提示词", "答案")
+    assert store.get("问题", "gpt-4", "提示词") == "答案"
+    assert store.get("问题", "gpt-3.5-turbo", "提示词") is None
+    assert store.get("问题", "gpt-4", "其他提示词") is None
+    assert store.lookup({"q1": "问题", "q2": "没有记录"}, "gpt-4", "提示词") == {"q1": "答案"}
+    # 重新生成的答案替换之前记录的答案
+    store.put("问题", "gpt-4", "提示词", "新答案")
+    assert store.get("问题", "gpt-4", "提示词") == "新答案"
+    # 同一个文件可以被多个实例共用
+    assert AnswerStore(store.path).get("问题", "gpt-4", "提示词") == "新答案"
+
+
+def test_generated_answers_are_remembered(store):
+    client = FakeClient(["在线答案"])
+    assert asyncio.run(stages.answer_question(client, "问题一", "gpt-4", "提示词")) == "在线答案"
+    runner = FakeRunner([{"q2": completion("批处理答案")}])
+    batch.batch_answers(runner, [("q2", "问题二")], "gpt-4", "提示词", lambda qid, answer: None)
+    assert store.lookup({"q1": "问题一", "q2": "问题二"}, "gpt-4", "提示词") == {"q1": "在线答案", "q2": "批处理答案"}
+
+
+def test_disabled_store():
+    assert answers.get_store() is None
+    # 未启用时记录直接忽略
+    answers.remember("问题", "gpt-4", "提示词", "答案")
+
+
+def test_unusable_store_is_disabled(tmp_path, monkeypatch):
+    # 答案库所在目录无法创建时按未启用处理，不影响生成答案
+    (tmp_path / "file").write_text("")
+    monkeypatch.setenv("OPENAI_ANSWER_STORE_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_ANSWER_STORE_PATH", str(tmp_path / "file" / "answers.sqlite"))
+    assert answers.get_store() is None
+    assert answers.lookup({"q1": "问题"}, "gpt-4", "提示词") == {}
+    answers.remember("问题", "gpt-4", "提示词", "答案")
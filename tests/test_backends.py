@@ -0,0 +1,97 @@
+import socket
+import time
+
+import openai
+import pytest
+
+from evaluator_core import backends, engine
+from evaluator_core.backends import Backend, BackendPool, NoBackendAvailable
+
+MESSAGES = [{"role": "user", "content": "你好"}]
+
+
+def unused_url():
+    # 没有服务监听的端口，请求立即以连接错误失败
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def test_select_balances_by_weight():
+    light, heavy = Backend("light", "k"), Backend("heavy", "k", weight=3)
+    pool = BackendPool([light, heavy], health_interval=0)
+    heavy.outstanding = 2
+    # 按 (在途 + 1) / 权重 选择：两者都为 1 时随机选一个，light 多一个在途请求后选 heavy
+    assert pool.select("m") in (light, heavy)
+    light.outstanding = 1
+    assert pool.select("m") is heavy
+    assert pool.select("m", exclude=[heavy]) is light
+
+
+def test_select_respects_models_and_ejection():
+    gpt, qwen = Backend("gpt", "k", models=["gpt-4"]), Backend("qwen", "k", models=["qwen"])
+    pool = BackendPool([gpt, qwen], eject_after=1, eject_seconds=60, health_interval=0)
+    assert pool.select("qwen") is qwen
+    with pytest.raises(NoBackendAvailable):
+        pool.select("llama")
+    qwen.record_failure(pool.eject_after, pool.eject_seconds)
+    assert qwen.ejected
+    # 全部被摘除时选最早到期的后端试一试
+    assert pool.select("qwen") is qwen
+
+
+def test_ejection_backs_off_and_recovers():
+    backend = Backend("b", "k")
+    backend.record_failure(2, 0.05)
+    assert not backend.ejected
+    backend.record_failure(2, 0.05)
+    assert backend.ejected
+    assert not backend.available(time.monotonic())
+    time.sleep(0.06)
+    assert backend.available(time.monotonic())
+    # 试探失败后摘除时长翻倍
+    backend.record_failure(2, 0.05)
+    assert backend.ejections == 2
+    assert backend.ejected_until - time.monotonic() > 0.06
+    backend.record_success()
+    assert not backend.ejected and backend.available(time.monotonic())
+
+
+def test_pool_ejects_unreachable_backend(mock_server):
+    down = Backend("down", "k", base_url=unused_url(), weight=100)
+    up = Backend("up", "k", base_url=mock_server.base_url)
+    pool = BackendPool([down, up], eject_after=2, eject_seconds=60, health_interval=0)
+    for _ in range(6):
+        completion = engine.run(pool.create(10, model="gpt-3.5-turbo", messages=MESSAGES))
+        assert completion.choices[0].message.content
+    # 权重高的后端连不上时换到另一个后端，连续失败两次后摘除，不再分到请求
+    assert down.ejected
+    assert down.requests == 2 and down.errors == 2
+    assert up.requests == 6
+    status = {item["name"]: item for item in pool.status()}
+    assert status["down"]["ejected"] and status["down"]["ejected_for"] > 0
+    assert not status["up"]["ejected"]
+
+
+def test_pool_raises_when_every_backend_fails():
+    pool = BackendPool([Backend("a", "k", base_url=unused_url()), Backend("b", "k", base_url=unused_url())],
+                       health_interval=0)
+    with pytest.raises(openai.APIConnectionError):
+        engine.run(pool.create(10, model="gpt-3.5-turbo", messages=MESSAGES))
+    assert [b.errors for b in pool.backends] == [1, 1]
+
+
+def test_parse_backends(monkeypatch):
+    monkeypatch.setenv("POOL_KEY", "secret")
+    pool = backends.parse_backends(
+        '[{"name": "a", "base_url": "http://a/v1", "api_key": "EMPTY", "weight": 2, "models": ["m"]},'
+        ' {"name": "b", "api_key_env": "POOL_KEY", "rpm": 10, "limits": {"m": {"rpm": 5}}}]'
+    )
+    assert [b.name for b in pool] == ["a", "b"]
+    assert pool[0].weight == 2 and pool[0].supports("m") and not pool[0].supports("x")
+    assert pool[1].api_key == "secret"
+    assert pool[1].limiter("m").requests.capacity == 5
+    assert pool[1].limiter("x").requests.capacity == 10
+    with pytest.raises(ValueError):
+        BackendPool([])
@@ -0,0 +1,140 @@
+import json
+
+import pytest
+from fakes import FakeRunner, completion
+
+from evaluator_core import batch, clients, stages
+from evaluator_core.batch import BatchRunner
+
+
+def test_batch_round_trip(mock_server, tmp_path):
+    client = clients.get_client("test-key", mock_server.base_url)
+    runner = BatchRunner(client, "answer", poll_interval=0, work_dir=str(tmp_path))
+    answers = {}
+    batch.batch_answers(runner, [("q1", "问题一"), ("q2", "问题二")], "gpt-3.5-turbo", "系统", answers.__setitem__)
+    assert answers == {"q1": "模拟回答：问题一", "q2": "模拟回答：问题二"}
+    # 请求文件按 Batch API 的格式写出，输出文件也保存在工作目录中
+    inputs = [p for p in tmp_path.iterdir() if p.name.count(".") == 1]
+    assert len(inputs) == 1
+    lines = [json.loads(line) for line in inputs[0].read_text(encoding="utf-8").splitlines()]
+    assert [line["custom_id"] for line in lines] == ["q1", "q2"]
+    assert {line["url"] for line in lines} == {batch.BATCH_ENDPOINT}
+
+    scores = {}
+    batch.batch_evaluate(runner, answers.items(), "gpt-4", stages.DEFAULT_EVAL_CONTENT, 1, scores.__setitem__)
+    assert sorted(scores) == ["q1", "q2"]
+    assert all(0 <= score <= 5 and reason.startswith("模拟分析") for score, reason in scores.values())
+
+
+def test_batch_evaluate_resubmits_format_errors():
+    runner = FakeRunner([
+        {"q1": completion("格式错误"), "q2": completion("[分析理由]好\n[评分]4")},
+        {"q1": completion("还是错误")},
+        {"q1": completion("仍然错误")},
+    ])
+    scores = {}
+    batch.batch_evaluate(runner, [("q1", "答案一"), ("q2", "答案二")], "m", "系统", 1, scores.__setitem__)
+    # 每轮只重新提交格式错误的问题，三轮都失败后使用默认分数
+    assert runner.submitted == [["q1", "q2"], ["q1"], ["q1"]]
+    assert scores == {"q2": (4.0, "好"), "q1": (stages.DEFAULT_SCORE, stages.EVAL_FALLBACK_REASON)}
+
+
+def test_batch_evaluate_panel_requests_missing_evaluators():
+    runner = FakeRunner([
+        {"q1": completion("[分析理由]一\n[评分]4", "[分析理由]二\n[评分]3"), "q2": completion("[分析理由]一\n[评分]5", "无效")},
+        {"q2": completion("[分析理由]二\n[评分]2")},
+    ])
+    results = {}
+    batch.batch_evaluate_panel(runner, [("q1", [1, 2], "答案一"), ("q2", [1, 2], "答案二"), ("q3", [], "答案三")],
+                               "m", "系统", lambda qid, num, value: results.__setitem__((qid, num), value))
+    # 一个 n=2 的请求取得两位评测员的评分，格式错误的那一份下一轮单独请求
+    assert runner.submitted == [["q1", "q2"], ["q2"]]
+    assert "n" not in runner.bodies["q2"]
+    assert results == {("q1", 1): (4.0, "一"), ("q1", 2): (3.0, "二"), ("q2", 1): (5.0, "一"), ("q2", 2): (2.0, "二")}
+
+
+@pytest.mark.parametrize("message, remembered", [("Invalid 'n': must be 1", True), ("prompt too long", False)])
+def test_batch_panel_rejected_n_requests_separately(monkeypatch, message, remembered):
+    monkeypatch.setattr(stages, "_multi_sample_unsupported", set())
+    runner = FakeRunner([
+        {"q1": (400, message), "q2": completion("[分析理由]一\n[评分]4", "[分析理由]二\n[评分]3")},
+        {"q1": completion("[分析理由]一\n[评分]5")},
+        {"q1": completion("[分析理由]二\n[评分]2")},
+    ])
+    results = {}
+    failed = batch.batch_evaluate_panel(runner, [("q1", [1, 2], "答案一"), ("q2", [1, 2], "答案二")], "m", "系统",
+                                        lambda qid, num, value: results.__setitem__((qid, num), value))
+    # n=2 的请求返回 400 时该问题改为逐个请求；只有错误指向 n 时才记住该后端不支持
+    assert failed == {}
+    assert runner.submitted == [["q1", "q2"], ["q1"], ["q1"]]
+    assert "n" not in runner.bodies["q1"]
+    assert results[("q1", 1)] == (5.0, "一") and results[("q1", 2)] == (2.0, "二")
+    assert (("", "m") in stages._multi_sample_unsupported) is remembered
+    # 指向 n 的 400 也不会被当作不支持结构化输出
+    assert batch.structured_rejected((400, message)) is not remembered
+
+
+def test_batch_failures_are_not_format_errors():
+    runner = FakeRunner([{"q1": None, "q2": completion("答案")}, {"q1": None}, {"q1": None}])
+    answers = {}
+    failed = batch.batch_answers(runner, [("q1", "问题一"), ("q2", "问题二")], "m", "系统", answers.__setitem__)
+    assert answers == {"q2": "答案"}
+    assert failed == {"q1": "q1 请求失败"}
+
+    # 请求本身失败的问题不重新提交，也不写入默认分数，交给调用方留待下次运行
+    runner = FakeRunner([{"q1": None, "q2": completion("格式错误")}, {"q2": completion("[分析理由]好\n[评分]4")}])
+    scores = {}
+    failed = batch.batch_evaluate(runner, [("q1", "答案一"), ("q2", "答案二")], "m", "系统", 1, scores.__setitem__)
+    assert runner.submitted == [["q1", "q2"], ["q2"]]
+    assert scores == {"q2": (4.0, "好")}
+    assert failed == {"q1": "q1 请求失败"}
+
+
+def test_expired_batch_keeps_partial_output(mock_server, tmp_path, monkeypatch):
+    # 任务执行一条请求后过期：已返回的结果照常使用，其余问题记为失败，不写入默认分数
+    monkeypatch.setattr(mock_server.state, "batch_expire_after", 1)
+    client = clients.get_client("test-key", mock_server.base_url)
+    runner = BatchRunner(client, "evaluate", poll_interval=0, work_dir=str(tmp_path))
+    scores = {}
+    failed = batch.batch_evaluate(runner, [("q1", "答案一"), ("q2", "答案二")], "gpt-4", stages.DEFAULT_EVAL_CONTENT,
+                                  1, scores.__setitem__)
+    assert list(scores) == ["q1"] and scores["q1"][1].startswith("模拟分析")
+    assert list(failed) == ["q2"] and "expired" in failed["q2"]
+
+
+def test_cancelled_batch_skips_fallbacks():
+    # 取消后没有结果的问题既不报错也不写入默认分数，留待重新运行
+    runner = FakeRunner([{}, {}, {}])
+    runner.cancelled = True
+    answers, scores = {}, {}
+    batch.batch_answers(runner, [("q1", "问题一")], "m", "系统", answers.__setitem__)
+    runner.submitted.clear()
+    batch.batch_evaluate(runner, [("q1", "答案一")], "m", "系统", 1, scores.__setitem__)
+    assert answers == {} and scores == {}
+
+
+def test_batch_quality_skips_agreeing_scores():
+    runner = FakeRunner([{"q2": completion("无效")}, {"q2": completion("[分析理由]复核\n[评分]3")}])
+    results = {}
+    batch.batch_quality(runner, ["q1", "q2"], {"q1": "问题一", "q2": "问题二"}, {"q1": "答案一", "q2": "答案二"},
+                        {"q1": 4.0, "q2": 1.0}, {"q1": "a", "q2": "b"}, {"q1": 4.2, "q2": 5.0}, {"q1": "c", "q2": "d"},
+                        "m", "系统", results.__setitem__)
+    # 两位评测员分数接近的问题直接取平均，不提交质检请求
+    assert runner.submitted == [["q2"], ["q2"]]
+    assert results["q1"][0] == pytest.approx(4.1)
+    assert results["q2"][0] == 3.0
+
+
+def test_read_batch_output():
+    ok = {"status_code": 200, "body": completion("答案").model_dump()}
+    text = "\n".join([
+        json.dumps({"custom_id": "a", "response": ok, "error": None}),
+        json.dumps({"custom_id": "b", "response": {"status_code": 500, "body": {}}, "error": None}),
+        json.dumps({"custom_id": "c", "response": None, "error": {"code": "server_error"}}),
+        "not json",
+    ])
+    errors = {}
+    outputs = batch.read_batch_output(text, errors)
+    assert outputs["a"].choices[0].message.content == "答案"
+    assert outputs["b"] is None and outputs["c"] is None
+    assert errors == {"b": (500, "批处理请求失败"), "c": (None, "批处理请求失败")}
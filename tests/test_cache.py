@@ -0,0 +1,87 @@
+import itertools
+import sqlite3
+from types import SimpleNamespace
+
+import pytest
+
+from evaluator_core import cache
+from evaluator_core.cache import CompletionCache, make_key
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    # last_used 用递增的假时间，避免同一时刻写入的条目顺序不确定
+    ticks = itertools.count(1)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(time=lambda: float(next(ticks))))
+
+
+def test_lru_eviction(tmp_path, clock):
+    store = CompletionCache(str(tmp_path / "cache.sqlite"), max_bytes=30)
+    store.put("a", "x" * 10)
+    store.put("b", "y" * 10)
+    store.put("c", "z" * 10)
+    # 读取 a 后它变成最近使用的，写入 d 超出上限时淘汰最久未用的 b
+    assert store.get("a") == "x" * 10
+    store.put("d", "w" * 10)
+    assert store.get("b") is None
+    assert [store.get(key) for key in "acd"] == ["x" * 10, "z" * 10, "w" * 10]
+    stats = store.stats()
+    assert stats["entries"] == 3
+    assert stats["size_bytes"] == 30
+    assert stats["hits"] == 4 and stats["misses"] == 1
+
+
+def test_eviction_counts_utf8_bytes_and_updates(tmp_path, clock):
+    store = CompletionCache(str(tmp_path / "cache.sqlite"), max_bytes=12)
+    store.put("a", "中文")  # 6 字节
+    store.put("b", "中文")
+    assert store.stats()["size_bytes"] == 12
+    # 覆盖写入更大的值时按新大小计算，并淘汰最久未用的条目
+    store.put("b", "中文中文")
+    assert store.get("a") is None
+    assert store.get("b") == "中文中文"
+    assert store.stats()["size_bytes"] == 12
+
+
+def test_oversized_entry_evicts_everything(tmp_path, clock):
+    store = CompletionCache(str(tmp_path / "cache.sqlite"), max_bytes=5)
+    store.put("a", "abc")
+    store.put("b", "x" * 10)
+    assert store.stats()["entries"] == 0
+    assert store.stats()["size_bytes"] == 0
+
+
+def test_shared_file_and_clear(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    CompletionCache(path, max_bytes=1000).put("k", "v")
+    other = CompletionCache(path, max_bytes=1000)
+    assert other.get("k") == "v"
+    other.clear()
+    assert other.get("k") is None
+    assert other.stats()["size_bytes"] == 0
+
+
+def test_make_key():
+    params = {"model": "gpt-4", "messages": [{"role": "user", "content": "问题"}], "temperature": 0.7}
+    assert make_key(params) == make_key(dict(reversed(list(params.items()))))
+    assert make_key(params, "evaluator-1") != make_key(params, "evaluator-2")
+    assert make_key(params) != make_key({**params, "temperature": 0.2})
+
+
+def test_unavailable_cache_is_skipped(tmp_path, monkeypatch):
+    # 缓存目录无法创建（这里路径中间是一个文件）时按未启用缓存运行
+    (tmp_path / "file").write_text("")
+    monkeypatch.setattr(cache, "_caches", {})
+    monkeypatch.setenv("OPENAI_CACHE_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_CACHE_PATH", str(tmp_path / "file" / "cache.sqlite"))
+    assert cache.get_cache() is None
+
+    def full(*args):
+        raise sqlite3.OperationalError("database or disk is full")
+
+    # 读写出错时按未命中处理，不影响调用
+    store = CompletionCache(str(tmp_path / "cache.sqlite"), max_bytes=1000)
+    monkeypatch.setattr(store, "get", full)
+    monkeypatch.setattr(store, "put", full)
+    assert cache.lookup(store, "k") is None
+    cache.store(store, "k", "v")
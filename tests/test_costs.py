@@ -0,0 +1,111 @@
+from types import SimpleNamespace
+
+import pytest
+from fakes import FakeRunner
+
+from evaluator_core import batch, clients, completions, costs, engine, ratelimit
+from evaluator_core.costs import CostTracker
+from evaluator_core.runner import StageRunner
+
+PRICES = {"gpt-4": (30.0, 60.0), "gpt-4o": (2.5, 10.0), "gpt-4o-mini": (0.15, 0.6)}
+
+
+def usage(prompt, completion):
+    return SimpleNamespace(prompt_tokens=prompt, completion_tokens=completion)
+
+
+def test_price_lookup(monkeypatch):
+    # 按最长前缀匹配带日期后缀的快照版本
+    assert costs.price_for("gpt-4o-2024-08-06", PRICES) == (2.5, 10.0)
+    assert costs.price_for("gpt-4o-mini-2024-07-18", PRICES) == (0.15, 0.6)
+    assert costs.price_for("gpt-4", PRICES) == (30.0, 60.0)
+    assert costs.price_for("gpt-40", PRICES) is None
+    monkeypatch.setenv("OPENAI_PRICES", '{"qwen": {"input": 1, "output": 2}, "gpt-4": [1, 1]}')
+    prices = costs.get_prices()
+    assert prices["qwen"] == (1.0, 2.0) and prices["gpt-4"] == (1.0, 1.0)
+    assert prices["gpt-4o"] == costs.DEFAULT_PRICES["gpt-4o"]
+
+
+def test_record_totals():
+    tracker = CostTracker(prices=PRICES)
+    tracker.record("answer", "gpt-4o", usage(1000, 500), qid="q1")
+    tracker.record("answer", "gpt-4o", usage(1000, 500), qid="q1", cached=True)
+    tracker.record("evaluate", "gpt-4", usage(1000, 1000), qid="q2", batch=True)
+    tracker.record("evaluate", "llama", usage(10, 10), qid="q2")
+    # 缓存命中不计费，批处理半价，未定价的模型按 0 计
+    assert tracker.spent == pytest.approx(0.0075 + 0.045)
+    assert tracker.total["calls"] == 4 and tracker.total["cached_calls"] == 1
+    assert tracker.stages["answer"]["prompt_tokens"] == 2000
+    assert tracker.questions["q1"]["cost"] == pytest.approx(0.0075)
+    assert tracker.unpriced == {"llama"}
+    summary = tracker.summary(per_question=False)
+    assert "questions" not in summary and summary["unpriced_models"] == ["llama"]
+
+
+def test_budget_counts_reserved_requests():
+    tracker = CostTracker(budget=1.0, risk=0.8, prices={"m": (1_000_000, 1_000_000)})
+    assert not tracker.at_risk()
+    # 在途请求按输入 token 加上预留的输出 token 计入
+    reserved = tracker.reserve("m", 0.5)
+    assert reserved == 0.5 + costs.RESERVED_COMPLETION_TOKENS
+    assert tracker.exhausted()
+    tracker.release(reserved)
+    assert tracker.committed == 0
+    tracker.record("answer", "m", usage(0, 0.85))
+    assert tracker.at_risk() and not tracker.exhausted()
+    # 有了实际用量后按平均输出 token 预留，n>1 的请求按份数计
+    assert tracker.reserve("m", 0, choices=2) == pytest.approx(1.7)
+    tracker.release(1.7)
+    tracker.defer("q1", "answers")
+    tracker.defer("q1", "final_scores")
+    assert tracker.deferred == {"q1": "answers"}
+    assert "1 个问题推迟到下次运行" in tracker.deferred_notice()
+    assert CostTracker(budget=0).budget is None
+
+
+def test_pipeline_defers_questions_near_budget(mock_server, monkeypatch):
+    # 每个 token 1 美元：回答和评分几次之后就接近预算，其余问题不再开始
+    monkeypatch.setenv("OPENAI_MAX_IN_FLIGHT", "1")
+    tracker = CostTracker(budget=2000, prices={"gpt-3.5-turbo": (1e6, 1e6), "gpt-4": (1e6, 1e6)})
+    questions = {f"q{i}": f"问题 {i}" for i in range(10)}
+    result = StageRunner(questions, "pipeline", tracker=tracker).run()
+    done = set(result["final_scores"]["scores"])
+    assert 0 < len(done) < len(questions)
+    assert tracker.committed >= tracker.budget * tracker.risk
+    # 被推迟的问题没有结果，停在回答阶段，重新运行时补齐
+    assert set(tracker.deferred) | done | set(result["answers"]) == set(questions)
+    assert "answers" in tracker.deferred.values()
+
+
+def test_batch_quality_defers_near_budget():
+    tracker = CostTracker(budget=1.0, prices={})
+    tracker.reserved = 0.9
+    runner = FakeRunner([], tracker)
+    results = {}
+    batch.batch_quality(runner, ["q1", "q2"], {"q1": "", "q2": ""}, {"q1": "", "q2": ""},
+                        {"q1": 4.0, "q2": 1.0}, {"q1": "", "q2": ""}, {"q1": 4.2, "q2": 5.0}, {"q1": "", "q2": ""},
+                        "m", "系统", results.__setitem__)
+    # 接近预算时分数接近的照常取平均，有分歧的不再升级到质检
+    assert runner.submitted == []
+    assert list(results) == ["q1"]
+    assert tracker.deferred == {"q2": "final_scores"}
+
+
+def test_reserve_counts_completion_once(mock_server, monkeypatch):
+    tracker = CostTracker(prices={})
+    reserved = []
+    monkeypatch.setattr(tracker, "reserve", lambda model, tokens, choices=1: reserved.append(tokens) or 0.0)
+    messages = [{"role": "user", "content": "你好"}]
+    client = clients.get_async_client("test-key", mock_server.base_url)
+    engine.run(costs.bind(tracker, completions.create_completion(client, "answer", model="m", messages=messages)))
+    # 预留费用时只传提示词 token，回复长度由 reserve 自己预估，不重复计入
+    assert reserved == [ratelimit.estimate_prompt_tokens(messages)] == [2]
+
+
+def test_staged_runner_defers_near_budget():
+    tracker = CostTracker(budget=1.0, prices={})
+    tracker.reserved = 0.9
+    runner = StageRunner({"q1": "问题"}, "answer", tracker=tracker)
+    # 接近预算（而不是用尽）时就不再开始新的问题
+    assert list(runner.until_cancelled([("q1", "问题")])) == []
+    assert tracker.deferred == {"q1": "answers"}
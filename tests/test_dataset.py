@@ -0,0 +1,81 @@
+import codecs
+import json
+
+import pytest
+
+from evaluator_core import dataset
+from evaluator_core.dataset import DatasetError, QuestionSource
+
+QUESTIONS = {
+    "q1": "什么是量子纠缠？",
+    "q2": "Explain \"escaped\" quotes, \\ and é",
+    "q10": {"text": "嵌套的问题", "tags": ["a", "b"]},
+    "q3": 42,
+    "长键": "emoji 🚀 跨越多个字节",
+}
+
+
+def write_json(path, data, bom=False):
+    text = json.dumps(data, ensure_ascii=False, indent=2)
+    path.write_bytes((codecs.BOM_UTF8 if bom else b"") + text.encode("utf-8"))
+    return str(path)
+
+
+def write_jsonl(path, records, bom=False):
+    text = "\n".join(json.dumps(record, ensure_ascii=False) for record in records) + "\n"
+    path.write_bytes((codecs.BOM_UTF8 if bom else b"") + text.encode("utf-8"))
+    return str(path)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 7, 64, 1 << 20])
+@pytest.mark.parametrize("bom", [False, True])
+def test_json_chunk_boundaries(tmp_path, monkeypatch, chunk_size, bom):
+    # 多字节字符、转义和数字被块边界截断时仍能正确解析
+    monkeypatch.setattr(dataset, "CHUNK_SIZE", chunk_size)
+    source = QuestionSource(write_json(tmp_path / "q.json", QUESTIONS, bom))
+    assert list(source.items()) == list(QUESTIONS.items())
+    assert len(source) == len(QUESTIONS)
+    for qid, question in QUESTIONS.items():
+        assert source[qid] == question
+    assert "q10" in source and "q4" not in source
+    assert source.get("q4", "无") == "无"
+    assert source.preview(2) == {"q1": QUESTIONS["q1"], "q2": QUESTIONS["q2"]}
+
+
+def test_json_empty_and_invalid(tmp_path):
+    assert list(QuestionSource(write_json(tmp_path / "empty.json", {})).items()) == []
+    path = tmp_path / "bad.json"
+    path.write_text('{"q1": "a", "q2" "b"}', encoding="utf-8")
+    with pytest.raises(DatasetError):
+        list(QuestionSource(str(path)).items())
+    path.write_text('["q1"]', encoding="utf-8")
+    with pytest.raises(DatasetError):
+        list(QuestionSource(str(path)).items())
+
+
+@pytest.mark.parametrize("bom", [False, True])
+def test_jsonl(tmp_path, bom):
+    records = [{"id": "q1", "question": "第一题"}, {"q2": "第二题"}, {"qid": 3, "question": "第三题"},
+               {"question": "没有 ID"}]
+    path = write_jsonl(tmp_path / "q.jsonl", records, bom)
+    with open(path, "ab") as f:
+        f.write(b"\n   \n")
+    source = QuestionSource(path)
+    expected = {"q1": "第一题", "q2": "第二题", "3": "第三题", "4": "没有 ID"}
+    assert dict(source.items()) == expected
+    assert len(source) == 4
+    # 按 qid 随机读取走字节偏移索引
+    assert source["q1"] == "第一题"
+    assert source["4"] == "没有 ID"
+    assert list(source) == list(expected)
+
+
+def test_jsonl_invalid_line(tmp_path):
+    path = tmp_path / "bad.ndjson"
+    path.write_text('{"q1": "a"}\n{"q2": \n', encoding="utf-8")
+    source = QuestionSource(str(path))
+    with pytest.raises(DatasetError, match="第 2 行"):
+        list(source.items())
+    path.write_text('{"a": 1, "b": 2}\n', encoding="utf-8")
+    with pytest.raises(DatasetError, match="第 1 行"):
+        list(QuestionSource(str(path)).items())
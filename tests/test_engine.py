@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+from evaluator_core import engine
+
+
+def test_run_bounded_limits_in_flight():
+    in_flight = []
+    peak = [0]
+    progress = []
+
+    async def worker(qid, item):
+        in_flight.append(qid)
+        peak[0] = max(peak[0], len(in_flight))
+        await asyncio.sleep(0.01)
+        in_flight.remove(qid)
+        return item * 2
+
+    items = [(f"q{i}", i) for i in range(10)]
+    results = engine.run(engine.run_bounded(items, worker, {}, max_in_flight=3, on_progress=progress.append))
+    assert results == {f"q{i}": i * 2 for i in range(10)}
+    assert peak[0] == 3
+    assert progress == list(range(1, 11))
+
+
+def test_run_bounded_keeps_partial_results():
+    async def worker(qid, item):
+        if qid == "q3":
+            raise RuntimeError("失败")
+        return item
+
+    # 出错时已完成的结果仍留在调用方传入的 results 中
+    results = {}
+    with pytest.raises(RuntimeError):
+        engine.run(engine.run_bounded(((f"q{i}", i) for i in range(10)), worker, results, max_in_flight=1))
+    assert results == {"q0": 0, "q1": 1, "q2": 2}
+
+
+def test_max_in_flight_from_env(monkeypatch):
+    monkeypatch.setenv("OPENAI_MAX_IN_FLIGHT", "3")
+    assert engine.get_max_in_flight() == 3
+    monkeypatch.setenv("OPENAI_MAX_IN_FLIGHT", "0")
+    assert engine.get_max_in_flight() == 1
+    monkeypatch.setenv("OPENAI_MAX_IN_FLIGHT", "abc")
+    assert engine.get_max_in_flight() == engine.DEFAULT_MAX_IN_FLIGHT
+
+
+def test_run_bounded_on_failure_continues():
+    failures = []
+
+    async def worker(qid, item):
+        if qid == "q3":
+            raise RuntimeError("失败")
+        return item
+
+    # 指定 on_failure 时出错的任务只通知调用方，其余任务照常完成
+    results = engine.run(engine.run_bounded(((f"q{i}", i) for i in range(6)), worker, {}, max_in_flight=2,
+                                            on_failure=lambda qid, item, e: failures.append((qid, item, str(e)))))
+    assert results == {f"q{i}": i for i in range(6) if i != 3}
+    assert failures == [("q3", 3, "失败")]
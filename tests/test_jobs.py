@@ -0,0 +1,120 @@
+import threading
+
+import pytest
+
+from evaluator_core import jobs
+
+
+def finish(manager):
+    manager.executor.shutdown(wait=True)
+
+
+def test_job_result_and_failure():
+    manager = jobs.JobManager(max_workers=1)
+    ok = manager.submit("test", lambda job: {"ok": True})
+    failed = manager.submit("test", lambda job: 1 / 0)
+    finish(manager)
+    assert (ok.state, ok.progress, ok.result) == (jobs.SUCCEEDED, 100, {"ok": True})
+    assert failed.state == jobs.FAILED and "division" in failed.error
+    assert ok.to_dict()["job_id"] == ok.id
+    assert manager.list() == [ok, failed]
+
+
+def test_job_queue_full():
+    manager = jobs.JobManager(max_workers=1, max_queue=1)
+    release = threading.Event()
+    first = manager.submit("test", lambda job: release.wait(5))
+    second = manager.submit("test", lambda job: release.wait(5))
+    with pytest.raises(jobs.JobQueueFull):
+        manager.submit("test", lambda job: None)
+    assert manager.counts()[jobs.QUEUED] + manager.counts()[jobs.RUNNING] == 2
+    release.set()
+    finish(manager)
+    assert first.state == second.state == jobs.SUCCEEDED
+    assert manager.counts()[jobs.SUCCEEDED] == 2
+
+
+def test_cancel_running_and_queued_jobs():
+    manager = jobs.JobManager(max_workers=1)
+    started = threading.Event()
+    cancelled = []
+
+    def work(job):
+        job.on_cancel(lambda: cancelled.append(job.id))
+        job.set_progress(40)
+        started.set()
+        job.cancel_event.wait(5)
+        return {"partial": True}
+
+    running = manager.submit("test", work)
+    queued = manager.submit("test", lambda job: {"ran": True})
+    started.wait(5)
+    manager.cancel(queued.id)
+    manager.cancel(running.id)
+    finish(manager)
+    # 运行中的任务收到取消回调并保留部分结果，排队中的任务不再执行
+    assert cancelled == [running.id]
+    assert (running.state, running.progress, running.result) == (jobs.CANCELLED, 40, {"partial": True})
+    assert queued.state == jobs.CANCELLED and queued.result is None
+    # 已结束的任务再取消不改变状态
+    assert manager.cancel(running.id).state == jobs.CANCELLED
+
+
+def test_finished_jobs_are_pruned():
+    manager = jobs.JobManager(max_workers=1, retention=2)
+    submitted = [manager.submit("test", lambda job: None) for _ in range(4)]
+    finish(manager)
+    assert manager.list() == submitted[2:]
+    assert manager.get(submitted[0].id) is None
+
+
+def test_events_resume_from_seq():
+    manager = jobs.JobManager(max_workers=1)
+
+    def work(job):
+        job.publish("result", qid="q1", value="答案")
+        job.set_progress(50)
+        job.warn("q2 失败")
+        return {}
+
+    job = manager.submit("test", work)
+    finish(manager)
+    events = list(job.iter_events())
+    assert [e["event"] for e in events] == ["result", "progress", "warning", "progress", "end"]
+    assert [e["seq"] for e in events] == list(range(5))
+    assert events[-1] == {"event": "end", "seq": 4, "state": jobs.SUCCEEDED, "error": None}
+    assert job.warnings == ["q2 失败"]
+    # 保留事件的任务可以从任意序号重新读取
+    assert [e["seq"] for e in job.iter_events(since=3)] == [3, 4]
+
+
+def test_finished_job_events_are_compacted():
+    manager = jobs.JobManager(max_workers=1, event_grace=0, event_limit=3)
+
+    def work(job):
+        for i in range(4):
+            job.publish("result", stage="answers", qid=f"q{i}", value="很长的答案" * 100)
+        return {}
+
+    job = manager.submit("test", work)
+    finish(manager)
+    manager._prune()
+    # 宽限期过后只保留最近的事件和序号，结果内容从最终结果中读取
+    events = list(job.iter_events())
+    assert [e["seq"] for e in events] == [3, 4, 5]
+    assert events[0] == {"event": "result", "seq": 3, "stage": "answers", "qid": "q3"}
+    assert events[-1]["event"] == "end"
+    assert [e["seq"] for e in job.iter_events(since=5)] == [5]
+
+
+def test_streaming_job_drops_read_events():
+    manager = jobs.JobManager(max_workers=1)
+    job = manager.submit("test", lambda job: job.publish("result", qid="q1") or {"big": True},
+                         keep_events=False, keep_result=False)
+    events = job.iter_events(heartbeat=0.01)
+    first = next(e for e in events if e is not None)
+    assert first["event"] == "result"
+    assert [e["event"] for e in events if e is not None] == ["progress", "end"]
+    finish(manager)
+    # 读过的事件不再保留，最终结果也只通过事件发出
+    assert job._events == [] and job.result is None
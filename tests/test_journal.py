@@ -0,0 +1,53 @@
+import json
+
+from evaluator_core.journal import RunJournal, count_records, journal_path, load_journal
+
+
+def test_resume_after_partial_line(tmp_path):
+    # 模拟崩溃：最后一行只写了一半。重新打开后先补换行，已写的完整记录和新记录都能读出
+    path = journal_path(str(tmp_path / "questions.json"))
+    journal = RunJournal(path)
+    journal.append("answers", "q1", "答案一")
+    journal.append("scores1", "q1", {"score": 3.5, "reason": "一般"})
+    journal.close()
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"stage":"answers","qid":"q2","val')
+
+    journal = RunJournal(path)
+    journal.append("answers", "q2", "答案二")
+    journal.append("scores2", "q1", {"score": 4.0, "reason": "较好"})
+    journal.close()
+    # 关闭后的写入直接忽略
+    journal.append("answers", "q3", "迟到的答案")
+
+    data = load_journal(path)
+    assert data["answers"] == {"q1": "答案一", "q2": "答案二"}
+    assert data["scores1"] == {"scores": {"q1": 3.5}, "reasons": {"q1": "一般"}}
+    assert data["scores2"]["reasons"] == {"q1": "较好"}
+    assert count_records(data) == {"answers": 2, "scores1": 1, "scores2": 1}
+    # 问题集改动后只保留仍然存在的问题
+    assert load_journal(path, qids={"q2"}) == {"answers": {"q2": "答案二"}}
+
+
+def test_resume_skips_malformed_records(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"stage": "answers", "qid": "q1", "value": "a"}) + "\n")
+        f.write(json.dumps({"stage": "scores1", "qid": "q1", "value": "不是评分"}) + "\n")
+        f.write(json.dumps({"stage": "answers", "qid": "q2"}) + "\n")
+        f.write("not json\n")
+    data = load_journal(path)
+    assert data["answers"] == {"q1": "a"}
+    assert not data.get("scores1", {}).get("scores")
+    assert load_journal(str(tmp_path / "missing.jsonl")) == {"answers": {}}
+
+
+def test_fresh_journal_truncates(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal(path)
+    journal.append("answers", "q1", "旧答案")
+    journal.close()
+    journal = RunJournal(path, fresh=True)
+    journal.append("answers", "q2", "新答案")
+    journal.close()
+    assert load_journal(path)["answers"] == {"q2": "新答案"}
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+from fakes import FakeClient, scored
+
+from evaluator_core import metrics, stages
+from evaluator_core.metrics import Counter, Gauge, Histogram, Metric, Registry
+from evaluator_core.server import create_app
+
+
+def test_exposition_format():
+    registry = Registry()
+    counter = registry.register(Counter("test_total", "计数", ("stage",)))
+    counter.inc(stage="answer")
+    counter.inc(2, stage='a"b')
+    registry.register(Gauge("test_depth", "深度", collect=lambda: {(): 3}))
+    histogram = registry.register(Histogram("test_seconds", "耗时", ("stage",), buckets=(0.1, 1.0)))
+    histogram.observe(0.05, stage="answer")
+    histogram.observe(0.5, stage="answer")
+    histogram.observe(5, stage="answer")
+    assert registry.render().splitlines() == [
+        "# HELP test_total 计数",
+        "# TYPE test_total counter",
+        'test_total{stage="a\\"b"} 2',
+        'test_total{stage="answer"} 1',
+        "# HELP test_depth 深度",
+        "# TYPE test_depth gauge",
+        "test_depth 3",
+        "# HELP test_seconds 耗时",
+        "# TYPE test_seconds histogram",
+        'test_seconds_bucket{stage="answer",le="0.1"} 1',
+        'test_seconds_bucket{stage="answer",le="1"} 2',
+        'test_seconds_bucket{stage="answer",le="+Inf"} 3',
+        'test_seconds_sum{stage="answer"} 5.55',
+        'test_seconds_count{stage="answer"} 3',
+    ]
+    assert counter.total() == 3
+    assert counter.total(stage="answer") == 1
+    # 输出时计算的指标出错时不输出样本，不影响其他指标
+    assert Gauge("broken", "出错", collect=lambda: 1 / 0).render() == ["# HELP broken 出错", "# TYPE broken gauge"]
+
+
+def test_metric_requires_samples():
+    # 基类只定义输出格式，没有实现 samples 的指标不能创建
+    with pytest.raises(TypeError):
+        Metric("test_total", "计数")
+
+
+def test_format_retries_and_fallbacks():
+    retries = metrics.FORMAT_RETRIES.total(stage="evaluate", model="metrics-model")
+    fallbacks = metrics.FALLBACKS.total(stage="evaluate", model="metrics-model")
+    client = FakeClient(["格式错误"], [scored(4)], ["错误"], ["错误"], ["错误"])
+    assert asyncio.run(stages.evaluate_answer(client, "答案", "metrics-model", "系统"))[0] == 4.0
+    assert asyncio.run(stages.evaluate_answer(client, "答案", "metrics-model", "系统"))[0] == stages.DEFAULT_SCORE
+    assert metrics.FORMAT_RETRIES.total(stage="evaluate", model="metrics-model") - retries == 3
+    assert metrics.FALLBACKS.total(stage="evaluate", model="metrics-model") - fallbacks == 1
+    assert metrics.REQUESTS.total(stage="evaluate", model="metrics-model", outcome="ok") >= 5
+
+
+def test_metrics_endpoint(mock_server):
+    client = create_app().test_client()
+    response = client.post("/generate", json={"questions": {"q1": "问题"}})
+    assert response.status_code == 200
+    response = client.get("/metrics")
+    assert response.content_type == metrics.CONTENT_TYPE
+    text = response.get_data(as_text=True)
+    assert 'evaluator_requests_total{stage="answer",model="gpt-3.5-turbo",outcome="ok"}' in text
+    assert 'evaluator_api_responses_total{stage="answer",model="gpt-3.5-turbo",status="200"}' in text
+    assert 'evaluator_time_to_first_byte_seconds_count{stage="answer",model="gpt-3.5-turbo"}' in text
+    assert 'evaluator_http_requests_total{route="/generate",method="POST",status="200"}' in text
+    assert 'evaluator_jobs{state="queued"}' in text
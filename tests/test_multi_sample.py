@@ -0,0 +1,80 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from fakes import FakeClient, scored
+
+from evaluator_core import clients, engine, stages
+
+REQUEST = httpx.Request("POST", "http://backend.test/v1/chat/completions")
+
+
+def bad_request(message):
+    response = httpx.Response(400, request=REQUEST)
+    return openai.BadRequestError(message, response=response, body=None)
+
+
+@pytest.fixture(autouse=True)
+def fresh_backends(monkeypatch):
+    # 结构化输出的回退见 test_stages，这里只看 n 参数
+    monkeypatch.setenv("OPENAI_STRUCTURED_SCORES", "0")
+    monkeypatch.setattr(stages, "_multi_sample_unsupported", set())
+
+
+def evaluate(client, evaluator_nums=(1, 2)):
+    return asyncio.run(stages.evaluate_samples(client, "答案", "gpt-4", "系统", list(evaluator_nums)))
+
+
+def test_single_request_for_both_evaluators():
+    client = FakeClient([scored(4), scored(3)])
+    assert evaluate(client) == {1: (4.0, "理由 4"), 2: (3.0, "理由 3")}
+    assert len(client.calls) == 1 and client.calls[0]["n"] == 2
+
+
+def test_format_errors_retry_only_missing_evaluators():
+    client = FakeClient([scored(4), "格式错误"], [scored(2)])
+    assert evaluate(client) == {1: (4.0, "理由 4"), 2: (2.0, "理由 2")}
+    assert "n" not in client.calls[1]
+
+
+def test_rejected_n_falls_back_to_separate_requests():
+    client = FakeClient(bad_request("n is not supported"), [scored(4)], [scored(3)])
+    assert evaluate(client) == {1: (4.0, "理由 4"), 2: (3.0, "理由 3")}
+    assert ("http://backend.test/v1", "gpt-4") in stages._multi_sample_unsupported
+    # 之后对同一后端直接逐个请求
+    client.replies = [[scored(5)], [scored(5)]]
+    evaluate(client)
+    assert [call.get("n") for call in client.calls] == [2, None, None, None, None]
+
+
+def test_other_bad_request_falls_back_for_that_question_only():
+    # 与 n 无关的 400（如答案过长）不说明后端不支持 n，只有这个问题改为逐个请求
+    client = FakeClient(bad_request("context length exceeded"), [scored(4)], [scored(3)])
+    assert evaluate(client) == {1: (4.0, "理由 4"), 2: (3.0, "理由 3")}
+    assert not stages._multi_sample_unsupported
+    client.replies = [[scored(5), scored(5)]]
+    evaluate(client)
+    assert client.calls[-1]["n"] == 2
+
+
+def test_n_rejected():
+    assert stages.n_rejected("Invalid 'n': integer above maximum value")
+    assert stages.n_rejected("请求参数错误", param="n")
+    assert not stages.n_rejected("This model's maximum context length is 8192 tokens")
+    assert not stages.n_rejected(None)
+
+
+def test_ignored_n_keeps_returned_choice():
+    # 后端忽略 n 只返回一个回复：用上这一份，另一位评测员单独请求
+    client = FakeClient([scored(4)], [scored(1)])
+    assert evaluate(client) == {1: (4.0, "理由 4"), 2: (1.0, "理由 1")}
+    assert ("http://backend.test/v1", "gpt-4") in stages._multi_sample_unsupported
+
+
+def test_multi_sample_end_to_end(mock_server):
+    client = clients.get_async_client("test-key", mock_server.base_url)
+    results = engine.run(stages.evaluate_samples(client, "答案", "gpt-4", stages.DEFAULT_EVAL_CONTENT, [1, 2]))
+    assert sorted(results) == [1, 2]
+    assert all(reason.startswith("模拟分析") for _, reason in results.values())
+    assert not stages._multi_sample_unsupported
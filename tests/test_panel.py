@@ -0,0 +1,114 @@
+import asyncio
+
+import pytest
+from fakes import FakeClient, FakeRunner, completion, scored
+
+from evaluator_core import batch, stages
+
+
+def panel(client, score1, score2, **kwargs):
+    return asyncio.run(stages.adaptive_panel(client, "答案", score1, "甲", score2, "乙", "gpt-4", "系统", **kwargs))
+
+
+def test_standard_error():
+    # 两位评测员时标准误为 |s1 - s2| / 2
+    assert stages.panel_standard_error([4.0, 4.4]) == pytest.approx(0.2)
+    assert stages.panel_converged([4.0, 4.4], stages.DEFAULT_PANEL_SE_TARGET)
+    assert not stages.panel_converged([4.0, 4.5], stages.DEFAULT_PANEL_SE_TARGET)
+    # 只有一个评分时，落在量表两端才算明确
+    assert not stages.panel_converged([4.0], 1.0)
+    assert stages.panel_converged([4.8], stages.DEFAULT_PANEL_SE_TARGET)
+    assert stages.panel_converged([0.3], stages.DEFAULT_PANEL_SE_TARGET)
+
+
+def test_clear_score_needs_no_second_judge():
+    client = FakeClient()
+    score, reason = panel(client, 4.8, None)
+    assert score == 4.8
+    assert reason.startswith("评测组共 1 位评测员，")
+    assert client.calls == []
+    assert not stages.panel_needs_judges(4.8, None, stages.DEFAULT_PANEL_SE_TARGET)
+    assert not stages.panel_needs_judges(3.0, 3.2, stages.DEFAULT_PANEL_SE_TARGET)
+    assert stages.panel_needs_judges(3.0, None, stages.DEFAULT_PANEL_SE_TARGET)
+
+
+def test_panel_requests_second_judge_when_needed():
+    client = FakeClient([scored(3.2)])
+    score, reason = panel(client, 3.0, None)
+    # 评分不够明确时才请求第二位评测员，之后照常按标准误判断
+    assert len(client.calls) == 1
+    assert score == pytest.approx(3.1)
+    assert reason.startswith("评测组共 2 位评测员，")
+
+
+def test_agreeing_scores_need_no_extra_judges():
+    client = FakeClient()
+    score, reason = panel(client, 4.0, 4.2)
+    assert score == pytest.approx(4.1)
+    assert reason.startswith("评测组共 2 位评测员，")
+    assert client.calls == []
+
+
+def test_panel_adds_judges_until_converged():
+    client = FakeClient([scored(3)], [scored(3)], [scored(3)])
+    score, reason = panel(client, 1.0, 5.0, max_judges=5, target=1.0)
+    # 1、5、3 的标准误约为 1.15，再加一位 3 分后降到 0.82，低于目标时停止
+    assert len(client.calls) == 2
+    assert score == 3.0
+    assert reason.splitlines()[0] == "评测组共 4 位评测员，评分：1.0、5.0、3.0、3.0，取平均值。"
+    assert reason.splitlines()[1:] == ["评分1原因：甲", "评分2原因：乙", "评分3原因：理由 3", "评分4原因：理由 3"]
+
+
+def test_panel_stops_at_max_judges():
+    client = FakeClient([scored(5)])
+    score, reason = panel(client, 1.0, 5.0, max_judges=3, target=0.1)
+    assert len(client.calls) == 1
+    assert score == pytest.approx(11 / 3)
+    assert "（已达上限，仍存在分歧）" in reason
+
+
+def test_batch_adaptive_panel(monkeypatch):
+    monkeypatch.setenv("OPENAI_PANEL_MAX_JUDGES", "4")
+    monkeypatch.setenv("OPENAI_PANEL_SE_TARGET", "0.9")
+    runner = FakeRunner([
+        {"q2": completion(scored(3)), "q3": completion(scored(3))},
+        {"q2": completion(scored(3)), "q3": completion(scored(1))},
+    ])
+    results = {}
+    batch.batch_adaptive_panel(
+        runner, ["q1", "q2", "q3"], {"q1": "a", "q2": "b", "q3": "c"},
+        {"q1": 4.0, "q2": 1.0, "q3": 1.0}, {"q1": "", "q2": "", "q3": ""},
+        {"q1": 4.2, "q2": 5.0, "q3": 5.0}, {"q1": "", "q2": "", "q3": ""},
+        "m", "系统", results.__setitem__,
+    )
+    # 每轮为尚未收敛的问题各追加一位评测员
+    assert runner.submitted == [["q2", "q3"], ["q2", "q3"]]
+    assert results["q1"][0] == pytest.approx(4.1)
+    assert results["q2"][0] == 3.0
+    assert "（已达上限，仍存在分歧）" in results["q3"][1]
+
+
+def test_batch_adaptive_panel_starts_from_one_score():
+    runner = FakeRunner([{"q2": completion(scored(3.2))}])
+    results = {}
+    batch.batch_adaptive_panel(
+        runner, ["q1", "q2", "q3"], {"q1": "a", "q2": "b", "q3": "c"},
+        {"q1": 5.0, "q2": 3.0, "q3": 3.0}, {"q1": "", "q2": "", "q3": ""},
+        {"q3": 3.2}, {"q3": ""},
+        "m", "系统", results.__setitem__,
+    )
+    # 明确的评分不加第二位评测员，已有第二份评分的问题直接使用，只为其余问题请求
+    assert runner.submitted == [["q2"]]
+    assert results["q1"][0] == 5.0
+    assert results["q2"][0] == pytest.approx(3.1)
+    assert results["q3"][0] == pytest.approx(3.1)
+
+
+def test_panel_settings_fall_back_to_defaults(monkeypatch):
+    monkeypatch.setenv("OPENAI_PANEL_MAX_JUDGES", "many")
+    monkeypatch.setenv("OPENAI_PANEL_SE_TARGET", "0")
+    assert stages.panel_settings() == (stages.DEFAULT_PANEL_MAX_JUDGES, stages.DEFAULT_PANEL_SE_TARGET)
+    monkeypatch.setenv("OPENAI_PANEL_MAX_JUDGES", "1")
+    monkeypatch.setenv("OPENAI_PANEL_SE_TARGET", "abc")
+    # 至少两位评测员
+    assert stages.panel_settings() == (2, stages.DEFAULT_PANEL_SE_TARGET)
@@ -0,0 +1,50 @@
+from evaluator_core import clients, engine, pipeline
+
+
+def run(mock_server, questions, resume=None):
+    client = clients.get_async_client("test-key", mock_server.base_url)
+    events = []
+    results = pipeline.init_results(resume)
+    engine.run(pipeline.run_pipeline(client, questions, results, lambda *event: events.append(event), 2))
+    return results, events
+
+
+def test_pipeline_runs_every_stage_per_question(mock_server):
+    questions = [(f"q{i}", f"问题 {i}") for i in range(4)]
+    results, events = run(mock_server, questions)
+    assert results["answers"] == {qid: f"模拟回答：{question}" for qid, question in questions}
+    for stage in pipeline.SCORE_STAGES:
+        assert sorted(results[stage]["scores"]) == [qid for qid, _ in questions]
+    # 每个问题依次经过回答、两位评测员和质检
+    for qid, _ in questions:
+        stages = [stage for stage, q, _ in events if q == qid]
+        assert stages[0] == "answers" and stages[-1] == "final_scores"
+        assert sorted(stages[1:3]) == ["scores1", "scores2"]
+    ordered = pipeline.order_results(results, ["q3", "q0"])
+    assert list(ordered["answers"]) == ["q3", "q0"]
+    assert list(ordered["final_scores"]["scores"]) == ["q3", "q0"]
+
+
+def test_pipeline_resumes_from_existing_results(mock_server):
+    resume = {
+        "answers": {"q0": "已有答案", "q1": "已有答案"},
+        "scores1": {"scores": {"q0": 4.0}, "reasons": {"q0": "好"}},
+        "scores2": {"scores": {"q0": 4.0}, "reasons": {"q0": "好"}},
+    }
+    results, events = run(mock_server, [("q0", "问题 0"), ("q1", "问题 1"), ("q2", "问题 2")], resume)
+    # 已有的结果直接复用，只补齐缺少的阶段
+    assert [(stage, qid) for stage, qid, _ in events if qid == "q0"] == [("final_scores", "q0")]
+    assert ("answers", "q1") not in [(stage, qid) for stage, qid, _ in events]
+    assert results["answers"]["q1"] == "已有答案"
+    # 两份评分接近时直接取平均
+    assert results["final_scores"]["scores"]["q0"] == 4.0
+    assert sorted(results["final_scores"]["scores"]) == ["q0", "q1", "q2"]
+
+
+def test_adaptive_panel_starts_from_first_evaluator(mock_server, monkeypatch):
+    monkeypatch.setenv("OPENAI_PANEL_ADAPTIVE", "1")
+    results, events = run(mock_server, [("q0", "问题 0")])
+    # 评测组只先请求第一位评测员，第二位评测员在需要时由评测组加入，不单独记为 scores2
+    assert [stage for stage, _, _ in events] == ["answers", "scores1", "final_scores"]
+    assert results["scores2"]["scores"] == {}
+    assert "评测组共" in results["final_scores"]["reasons"]["q0"]
@@ -0,0 +1,95 @@
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from evaluator_core import ratelimit
+from evaluator_core.ratelimit import RateLimiter, TokenBucket
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(ratelimit, "time", SimpleNamespace(monotonic=lambda: now[0]))
+    return now
+
+
+def test_token_bucket_refill(clock):
+    bucket = TokenBucket(60)
+    assert bucket.wait_time(60) == 0
+    bucket.take(60)
+    # 每分钟 60 个即每秒补充 1 个
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock[0] += 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock[0] += 120
+    # 补充不超过容量
+    assert bucket.wait_time(60) == 0
+    assert bucket.level == pytest.approx(60)
+
+
+def test_token_bucket_limits(clock):
+    unlimited = TokenBucket(0)
+    unlimited.take(10 ** 9)
+    assert unlimited.wait_time(10 ** 9) == 0
+    bucket = TokenBucket(60)
+    # 超过容量的请求按容量计算，不会永远等待
+    assert bucket.wait_time(1000) == 0
+    # 按实际 usage 补扣可以扣成负数
+    bucket.take(90)
+    assert bucket.wait_time(1) == pytest.approx(31.0)
+
+
+def test_token_bucket_configure(clock):
+    bucket = TokenBucket(0)
+    bucket.configure(30)
+    assert bucket.level == 30
+    bucket.take(20)
+    # 降低配额时不超过新容量，提高配额时不凭空增加
+    bucket.configure(5)
+    assert bucket.level == 5
+    bucket.configure(100)
+    assert bucket.level == 5
+
+
+def test_rate_limiter_record(clock):
+    limiter = RateLimiter(rpm=10, tpm=1000)
+    assert limiter.enabled
+    asyncio.run(limiter.acquire(300))
+    assert limiter.requests.level == 9
+    assert limiter.tokens.level == 700
+    limiter.record(300, 500)
+    assert limiter.tokens.level == 500
+    limiter.record(300, 100)
+    assert limiter.tokens.level == 700
+    assert not RateLimiter().enabled
+
+
+def test_rate_limiter_waits_in_order():
+    # 每分钟 1200 个请求即每 0.05 秒一个，桶空后排队的请求按先来后到依次放行
+    limiter = RateLimiter(rpm=1200)
+    limiter.requests.take(1200)
+    order = []
+
+    async def request(n):
+        await limiter.acquire(1)
+        order.append((n, time.monotonic()))
+
+    async def main():
+        start = time.monotonic()
+        await asyncio.gather(*(request(n) for n in range(3)))
+        return start
+
+    start = asyncio.run(main())
+    assert [n for n, _ in order] == [0, 1, 2]
+    assert order[-1][1] - start >= 0.14
+
+
+def test_stage_budget(monkeypatch):
+    monkeypatch.setenv("OPENAI_EVAL_RPM", "100")
+    monkeypatch.setenv("OPENAI_EVAL_TPM", "abc")
+    assert ratelimit.stage_budget("evaluate") == (100, 0)
+    # 中文按 1 token/字，ASCII 按 4 字符/token，另加预留的回复长度
+    messages = [{"role": "system", "content": "中文"}, {"role": "user", "content": "a" * 8}]
+    assert ratelimit.estimate_tokens(messages) == 4 + ratelimit.DEFAULT_COMPLETION_TOKENS
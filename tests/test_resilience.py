@@ -0,0 +1,164 @@
+import asyncio
+import time
+
+import httpx
+import openai
+import pytest
+from fakes import completion
+
+from evaluator_core import resilience
+from evaluator_core.runner import StageRunner
+from evaluator_core.resilience import CircuitBreaker, CircuitOpen, call_with_retry
+
+REQUEST = httpx.Request("POST", "http://backend.test/v1/chat/completions")
+
+
+def status_error(status, headers=None):
+    response = httpx.Response(status, headers=headers, request=REQUEST)
+    return openai.APIStatusError(f"status {status}", response=response, body=None)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setenv("OPENAI_RETRY_BASE_DELAY", "0")
+    monkeypatch.setenv("OPENAI_MAX_RETRIES", "3")
+
+
+def test_breaker_opens_after_threshold():
+    breaker = CircuitBreaker("test", threshold=2, cooldown=0.05, max_wait=1)
+    breaker.record_failure()
+    assert not breaker.open
+    breaker.record_failure()
+    assert breaker.open
+    assert 0 < breaker.remaining() <= 0.05
+
+    async def main():
+        # 剩余时间在 max_wait 以内时原地等待，到期后只放行一个试探请求
+        assert await breaker.acquire()
+        with pytest.raises(CircuitOpen, match="试探"):
+            await breaker.acquire()
+
+    asyncio.run(main())
+    breaker.record_success()
+    assert not breaker.open
+    assert asyncio.run(breaker.acquire()) is False
+
+
+def test_breaker_backs_off_and_fails_fast():
+    breaker = CircuitBreaker("test", threshold=1, cooldown=0.05, max_wait=0.06)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert asyncio.run(breaker.acquire())
+    # 试探失败后暂停时长翻倍，超过 max_wait 的请求直接失败而不是挂起
+    breaker.record_failure()
+    assert breaker.openings == 2
+    assert breaker.remaining() > 0.06
+    started = time.monotonic()
+    with pytest.raises(CircuitOpen, match="秒后恢复"):
+        asyncio.run(breaker.acquire())
+    assert time.monotonic() - started < 0.05
+
+
+def test_breaker_release_allows_new_probe():
+    breaker = CircuitBreaker("test", threshold=1, cooldown=0, max_wait=0)
+    breaker.record_failure()
+    assert asyncio.run(breaker.acquire())
+    breaker.release(True)
+    assert asyncio.run(breaker.acquire())
+
+
+def test_call_with_retry_counts_backend_failures():
+    breaker = CircuitBreaker("test", threshold=3, cooldown=60, max_wait=0)
+    calls = []
+
+    async def send():
+        calls.append(1)
+        if len(calls) <= 2:
+            raise status_error(503)
+        return "ok"
+
+    assert asyncio.run(call_with_retry(send, {}, breaker)) == "ok"
+    assert len(calls) == 3
+    assert breaker.failures == 0
+
+    async def down():
+        raise status_error(500)
+
+    # 连续失败达到阈值后熔断，之后的调用不再发出请求
+    with pytest.raises(CircuitOpen):
+        asyncio.run(call_with_retry(down, {}, breaker))
+    assert breaker.open
+
+
+def test_call_with_retry_does_not_trip_on_client_errors():
+    breaker = CircuitBreaker("test", threshold=1, cooldown=60, max_wait=0)
+
+    async def bad_request():
+        raise status_error(400)
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(call_with_retry(bad_request, {}, breaker))
+    assert not breaker.open
+
+    attempts = []
+
+    async def throttled():
+        attempts.append(1)
+        raise status_error(429, {"retry-after-ms": "1"})
+
+    with pytest.raises(openai.APIStatusError):
+        asyncio.run(call_with_retry(throttled, {}, breaker))
+    assert len(attempts) == 4
+    assert not breaker.open
+
+
+def test_retry_after_headers():
+    assert resilience.retry_after(status_error(429, {"retry-after": "2"})) == 2
+    assert resilience.retry_after(status_error(429, {"retry-after-ms": "1500"})) == 1.5
+    assert resilience.retry_after(status_error(429, {"retry-after": "9999"})) == resilience.MAX_RETRY_AFTER
+    assert resilience.retry_after(status_error(429, {"retry-after": "soon"})) is None
+    assert resilience.is_retryable(openai.APIConnectionError(request=REQUEST))
+    assert not resilience.is_retryable(status_error(401))
+
+
+class FlakyClient:
+    # 问题中带“坏”字的请求总是返回 400，其余正常回答
+    base_url = "http://flaky.test/v1"
+
+    def __init__(self):
+        self.calls = []
+        self.chat = self
+
+    @property
+    def completions(self):
+        return self
+
+    async def create(self, **params):
+        question = params["messages"][-1]["content"]
+        self.calls.append(question)
+        if "坏" in question:
+            raise status_error(400)
+        return completion(f"答案：{question}", model=params["model"])
+
+
+def test_stage_isolates_failing_question(mock_server):
+    errors = []
+    questions = {"q0": "问题 0", "q1": "坏问题", "q2": "问题 2"}
+    runner = StageRunner(questions, "answer", use_batch=False, on_error=errors.append)
+    runner.async_client = FlakyClient()
+    answers = runner.run()
+    # 出错的问题在本阶段其余问题完成后再试一轮，仍然失败时跳过并报告，不影响其他问题
+    assert answers == {"q0": "答案：问题 0", "q2": "答案：问题 2"}
+    assert runner.async_client.calls.count("坏问题") == 2
+    assert list(runner.failed) == ["q1"]
+    assert len(errors) == 1 and "q1" in errors[0]
+
+
+def test_stage_failures_go_to_on_warning(mock_server):
+    errors, warnings = [], []
+    runner = StageRunner({"q0": "坏问题"}, "answer", use_batch=False, on_error=errors.append,
+                         on_warning=warnings.append)
+    runner.async_client = FlakyClient()
+    assert runner.run() == {}
+    # 设置了 on_warning 时个别问题的失败只作为提示，不当作整个阶段出错
+    assert errors == [] and len(warnings) == 1 and "q0" in warnings[0]
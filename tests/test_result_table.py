@@ -0,0 +1,100 @@
+import os
+import random
+
+import pytest
+
+pytest.importorskip("PySide6")
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PySide6.QtCore import QPersistentModelIndex, Qt  # noqa: E402
+from PySide6.QtWidgets import QApplication  # noqa: E402
+
+from ai_cluster_evaluator import ResultTableModel  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+def scored(score, reason="理由"):
+    return {"score": score, "reason": reason}
+
+
+def column(model, n):
+    return [model.index(row, n).data() for row in range(model.rowCount())]
+
+
+def test_record_appends_rows_on_flush(app):
+    model = ResultTableModel()
+    model.load({"questions": {"q1": "问题 一", "q2": "问题 二"}, "answers": {"q1": "答案 一"}})
+    assert column(model, 0) == ["q1"]
+    model.record("answers", "q2", "答案 二")
+    model.record("scores1", "q1", scored(4.0))
+    # 结果先累积，刷新后才出现在表格中
+    assert model.rowCount() == 1
+    model.flush()
+    assert column(model, 0) == ["q1", "q2"]
+    assert column(model, 1) == ["问题 一", "问题 二"]
+    assert column(model, 3) == ["4", ""]
+    assert "评测员 1 分数: 4.0" in model.detail("q1")
+    model.record("unknown", "q3", "忽略")
+    model.flush()
+    assert model.rowCount() == 2
+
+
+def test_sort_and_filter(app):
+    model = ResultTableModel()
+    model.load({
+        "answers": {f"q{i}": f"答案 {i}" for i in (10, 2, 1, 3)},
+        "scores1": {"scores": {"q10": 5.0, "q2": 1.0, "q1": 3.0}, "reasons": {}},
+        "scores2": {"scores": {"q10": 1.0, "q2": 1.5, "q1": 3.0}, "reasons": {}},
+    })
+    # 问题 ID 按自然顺序排序
+    model.sort(0)
+    assert column(model, 0) == ["q1", "q2", "q3", "q10"]
+    # 没有分数的问题无论升序降序都排在最后
+    model.sort(3, Qt.DescendingOrder)
+    assert column(model, 0) == ["q10", "q1", "q2", "q3"]
+    model.sort(3, Qt.AscendingOrder)
+    assert column(model, 0) == ["q2", "q1", "q10", "q3"]
+    model.set_min_gap(0.5)
+    assert column(model, 0) == ["q2", "q10"]
+    model.set_min_gap(0)
+    model.sort(-1)
+    assert column(model, 0) == ["q10", "q2", "q1", "q3"]
+
+
+def test_relayout_keeps_selection(app):
+    model = ResultTableModel()
+    model.load({"answers": {f"q{i}": f"答案 {i}" for i in range(5)}})
+    selected = QPersistentModelIndex(model.index(1, 0))
+    model.sort(0, Qt.DescendingOrder)
+    # 重新排序后选中的行跟随问题移动
+    assert selected.row() == 3 and selected.data() == "q1"
+
+
+@pytest.mark.parametrize("sort_column, order, min_gap", [
+    (3, Qt.DescendingOrder, 0), (5, Qt.AscendingOrder, 1.0), (0, Qt.AscendingOrder, 0), (-1, Qt.AscendingOrder, 1.0),
+])
+def test_flush_places_rows_incrementally(app, sort_column, order, min_gap):
+    rng = random.Random(sort_column)
+    model = ResultTableModel()
+    model.load({"answers": {f"q{i}": f"答案 {i}" for i in range(20)}})
+    model.sort(sort_column, order)
+    model.set_min_gap(min_gap)
+    relayouts = []
+    model.layoutChanged.connect(lambda: relayouts.append(1))
+    for _ in range(15):
+        for _ in range(rng.randint(1, 6)):
+            qid = f"q{rng.randrange(30)}"
+            stage = rng.choice(("scores1", "scores2", "final_scores"))
+            model.record(stage, qid, scored(rng.choice((1.0, 2.0, 3.0, 4.0, 5.0))))
+        selected = QPersistentModelIndex(model.index(0, 0)) if model.rowCount() else None
+        chosen = selected.data() if selected else None
+        model.flush()
+        # 逐行放置的结果与整体重新筛选排序一致，选中的行跟随问题移动
+        assert model.order == model.visible()
+        if chosen in model.order:
+            assert model.order[selected.row()] == chosen
+    assert relayouts == []
@@ -0,0 +1,68 @@
+import asyncio
+import os
+
+import pytest
+
+from evaluator_core import Evaluator
+
+QUESTIONS = {f"q{i}": f"问题 {i}" for i in range(5)}
+
+
+@pytest.fixture
+def evaluator(mock_server):
+    return Evaluator(api_key="test-key", base_url=mock_server.base_url, max_in_flight=2)
+
+
+def collect(evaluator, questions, **options):
+    async def main():
+        return [record async for record in evaluator.run(questions, **options)]
+    return asyncio.run(main())
+
+
+def test_run_streams_each_question(evaluator):
+    records = collect(evaluator, {**QUESTIONS, "given": {"question": "问题", "answer": "自带的答案"}})
+    assert sorted(r["qid"] for r in records) == sorted([*QUESTIONS, "given"])
+    for record in records:
+        assert set(record) == {
+            "qid", "question", "answer", "evaluation_1", "evaluation_2", "final_evaluation", "usage", "deferred", "error",
+        }
+        assert 0 <= record["final_evaluation"]["score"] <= 5
+        assert record["deferred"] is None and record["error"] is None and record["usage"]["calls"] >= 1
+    # 自带答案的问题跳过回答阶段
+    given = next(r for r in records if r["qid"] == "given")
+    assert given["answer"] == "自带的答案"
+    assert next(r for r in records if r["qid"] == "q0")["answer"] == "模拟回答：问题 0"
+
+
+def test_async_input_is_read_lazily(evaluator):
+    pulled = []
+
+    async def questions():
+        for qid, question in QUESTIONS.items():
+            pulled.append(qid)
+            yield qid, question
+
+    async def main():
+        async for record in evaluator.run(questions(), max_in_flight=1, buffer_size=1):
+            return record
+
+    # 取到第一个结果就退出：只读取了正在处理和等待取走的几个问题，其余的请求被取消
+    record = asyncio.run(main())
+    assert record["qid"] == "q0"
+    assert len(pulled) < len(QUESTIONS)
+
+
+def test_options_do_not_touch_environment(evaluator):
+    before = dict(os.environ)
+    records = collect(evaluator, [("q0", "问题 0")], answer_model="model-x", multi_sample=False)
+    assert len(records) == 1
+    assert dict(os.environ) == before
+    with pytest.raises(TypeError):
+        Evaluator(unknown_option=1)
+
+
+def test_evaluate_returns_saved_layout(evaluator):
+    output = asyncio.run(evaluator.evaluate(QUESTIONS))
+    assert sorted(output) == ["answers", "evaluation_1", "evaluation_2", "final_evaluation"]
+    assert sorted(output["answers"]) == sorted(QUESTIONS)
+    assert sorted(output["final_evaluation"]["scores"]) == sorted(QUESTIONS)
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+
+import pytest
+
+from benchmarks import mock_openai_server as mock
+from evaluator_core import answers, jobs, stages
+from evaluator_core.server import create_app
+
+QUESTIONS = {f"q{i}": f"问题 {i}" for i in range(4)}
+
+
+@pytest.fixture
+def client(mock_server):
+    return create_app().test_client()
+
+
+def wait_finished(client, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        data = client.get(f"/jobs/{job_id}").get_json()["data"]
+        if data["state"] in jobs.FINAL_STATES:
+            return data
+        time.sleep(0.05)
+    raise AssertionError(f"任务 {job_id} 没有在 {timeout} 秒内结束")
+
+
+def test_job_lifecycle(client, server_state):
+    response = client.post("/jobs/generate", json={"questions": QUESTIONS})
+    assert response.status_code == 202
+    job_id = response.get_json()["data"]["job_id"]
+    assert job_id in [job["job_id"] for job in client.get("/jobs").get_json()["data"]]
+
+    status = wait_finished(client, job_id)
+    assert status["state"] == jobs.SUCCEEDED
+    assert status["progress"] == 100
+    result = client.get(f"/jobs/{job_id}/result").get_json()["data"]
+    assert sorted(result["result"]) == sorted(QUESTIONS)
+    assert "costs" in result
+
+    # 事件流：进度、逐题结果，以 end 结束；支持从指定序号继续
+    lines = client.get(f"/jobs/{job_id}/events?format=ndjson").get_data(as_text=True).splitlines()
+    events = [json.loads(line) for line in lines]
+    assert events[-1] == {"event": "end", "seq": events[-1]["seq"], "state": jobs.SUCCEEDED, "error": None}
+    assert {e["qid"] for e in events if e["event"] == "result"} == set(QUESTIONS)
+    rest = client.get(f"/jobs/{job_id}/events?format=ndjson&since={events[-1]['seq']}").get_data(as_text=True)
+    assert [json.loads(line)["event"] for line in rest.splitlines()] == ["end"]
+    sse = client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": str(events[-2]["seq"])})
+    assert sse.mimetype == "text/event-stream"
+    assert sse.get_data(as_text=True).startswith(f"id: {events[-1]['seq']}\nevent: end\n")
+
+
+def test_cancel_job(client, server_state, monkeypatch):
+    # 每个请求 0.2 秒、同时只有 2 个在途，取消时大部分问题还没有完成
+    monkeypatch.setenv("OPENAI_MAX_IN_FLIGHT", "2")
+    server_state.latency = mock.parse_latency("fixed:0.2")
+    questions = {f"q{i}": f"问题 {i}" for i in range(40)}
+    job_id = client.post("/jobs/generate", json={"questions": questions}).get_json()["data"]["job_id"]
+    time.sleep(0.5)
+    response = client.post(f"/jobs/{job_id}/cancel")
+    assert response.status_code == 200
+    status = wait_finished(client, job_id, timeout=10)
+    assert status["state"] == jobs.CANCELLED
+    # 取消的任务返回已完成的部分结果
+    result = client.get(f"/jobs/{job_id}/result").get_json()["data"]["result"]
+    assert 0 < len(result) < len(questions)
+    assert server_state.stats["completions"] < len(questions)
+    # 已结束的任务再取消不改变状态
+    assert client.post(f"/jobs/{job_id}/cancel").get_json()["data"]["state"] == jobs.CANCELLED
+
+
+def test_streaming_job(client, server_state):
+    response = client.post("/jobs/generate?stream=ndjson", json={"questions": QUESTIONS})
+    assert response.mimetype == "application/x-ndjson"
+    events = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert {e["qid"] for e in events if e["event"] == "result"} == set(QUESTIONS)
+    assert events[-1]["event"] == "end"
+    # 流式任务的结果只通过事件发出，服务端不保留事件和最终结果
+    job = client.get("/jobs").get_json()["data"][-1]
+    assert job["state"] == jobs.SUCCEEDED
+    assert client.get(f"/jobs/{job['job_id']}/result").get_json()["data"]["result"] is None
+    assert client.get(f"/jobs/{job['job_id']}/events").status_code == 409
+
+
+def test_job_errors(client):
+    assert client.post("/jobs/unknown", json={}).status_code == 404
+    response = client.post("/jobs/evaluate", json={"questions": QUESTIONS})
+    assert response.status_code == 400
+    assert "answers" in response.get_json()["message"]
+    for path in ("/jobs/missing", "/jobs/missing/result", "/jobs/missing/events"):
+        assert client.get(path).status_code == 404
+    assert client.post("/jobs/missing/cancel").status_code == 404
+
+
+def test_unfinished_job_result(client):
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(job):
+        started.set()
+        release.wait(5)
+        return {"ok": True}
+
+    job = jobs.get_manager().submit("test", slow)
+    started.wait(5)
+    response = client.get(f"/jobs/{job.id}/result")
+    assert response.status_code == 409
+    assert response.get_json()["data"]["state"] == jobs.RUNNING
+    release.set()
+    assert wait_finished(client, job.id)["state"] == jobs.SUCCEEDED
+    assert client.get(f"/jobs/{job.id}/result").get_json()["data"]["result"] == {"ok": True}
+
+
+def test_quality_check_reuses_answers(client, tmp_path, monkeypatch):
+    monkeypatch.setenv("OPENAI_ANSWER_STORE_ENABLED", "1")
+    monkeypatch.setenv("OPENAI_ANSWER_STORE_PATH", str(tmp_path / "answers.sqlite"))
+    answers.get_store().put(QUESTIONS["q1"], *stages.answer_settings(), "库中的答案")
+    evaluation = {"scores": {qid: 4.0 for qid in QUESTIONS}, "reasons": {qid: "好" for qid in QUESTIONS}}
+    response = client.post("/quality-check", json={
+        "questions": QUESTIONS, "answers": {"q0": "请求中的答案"},
+        "evaluation_1": evaluation, "evaluation_2": evaluation,
+    })
+    data = response.get_json()["data"]
+    # 依次使用请求中的答案、参考答案库中的答案，只为其余问题重新生成
+    assert data["answers"] == {
+        "q0": "请求中的答案", "q1": "库中的答案", "q2": "模拟回答：问题 2", "q3": "模拟回答：问题 3",
+    }
+    assert data["scores"] == {qid: 4.0 for qid in QUESTIONS}
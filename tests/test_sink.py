@@ -0,0 +1,47 @@
+import json
+
+from evaluator_core import sink
+from evaluator_core.journal import count_records, load_journal
+from evaluator_core.sink import ResultStreamWriter
+
+
+def test_stream_round_trip(tmp_path):
+    path = str(tmp_path / "out" / "results.jsonl")
+    writer = ResultStreamWriter(path, fresh=True, flush_every=2, fsync_interval=-1)
+    writer.append("answers", "q1", "答案一")
+    writer.append("scores1", "q1", {"score": 4.0, "reason": "好"})
+    writer.append("answers", "q2", "答案二")
+    writer.close()
+    # 关闭后的写入直接忽略
+    writer.append("answers", "q3", "迟到的答案")
+    data = load_journal(path)
+    assert data["answers"] == {"q1": "答案一", "q2": "答案二"}
+    assert data["scores1"] == {"scores": {"q1": 4.0}, "reasons": {"q1": "好"}}
+    assert count_records(data) == {"answers": 2, "scores1": 1}
+
+
+def test_fresh_writer_truncates(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    writer = ResultStreamWriter(path)
+    writer.append("answers", "q1", "旧答案")
+    writer.close()
+    writer = ResultStreamWriter(path, fresh=True)
+    writer.append("answers", "q2", "新答案")
+    writer.close()
+    assert load_journal(path)["answers"] == {"q2": "新答案"}
+
+
+def test_merge_stream_keeps_question_order(tmp_path):
+    stream = str(tmp_path / "results.jsonl")
+    writer = ResultStreamWriter(stream)
+    for qid in ("q2", "q1"):
+        writer.append("answers", qid, f"答案 {qid}")
+        writer.append("final_scores", qid, {"score": 5.0, "reason": "满分"})
+    writer.close()
+    output = str(tmp_path / "merged.json")
+    sink.merge_stream(stream, output, {"q1": "问题一", "q2": "问题二"})
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert list(merged["answers"]) == ["q1", "q2"]
+    assert merged["final_evaluation"]["scores"] == {"q1": 5.0, "q2": 5.0}
+    assert "evaluation_1" not in merged
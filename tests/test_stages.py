@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+import openai
+import pytest
+from fakes import FakeClient, FakeRunner, completion
+
+from evaluator_core import batch, stages
+from evaluator_core.stages import parse_score
+
+REQUEST = httpx.Request("POST", "http://backend.test/v1/chat/completions")
+
+
+def test_parse_json():
+    assert parse_score('{"reason": "条理清楚", "score": 4.5}') == ("条理清楚", 4.5, "json")
+    assert parse_score('```json\n{"reason": " r ", "score": "3"}\n```') == ("r", 3.0, "json")
+    # 缺少 reason 时理由为空，score 不是数字时不按 JSON 解析
+    assert parse_score('{"score": 2}') == ("", 2.0, "json")
+    assert parse_score('{"reason": "r", "score": "高"}') is None
+
+
+def test_parse_exact():
+    assert parse_score("[分析理由]回答完整。\n[评分]4.5") == ("回答完整。", 4.5, "exact")
+    assert parse_score("  [分析理由] 一般 [评分] 3 \n") == ("一般", 3.0, "exact")
+
+
+@pytest.mark.parametrize("response, expected", [
+    ("【分析理由】内容正确\n【评分】4.5", ("内容正确", 4.5)),
+    ("[分析理由]内容正确\n[评分]4.5分", ("内容正确", 4.5)),
+    ("分析理由：有遗漏\n评分：3/5", ("有遗漏", 3.0)),
+    ("**分析理由**：较好\n**评分**：4 points", ("较好", 4.0)),
+    ("[分析理由]评分1原因是……\n[评分] 2\n以上为评价", ("评分1原因是……", 2.0)),
+    ("分析理由：先给 [评分]1，修正后\n最终评分：3.5", ("先给 [评分]1，修正后", 3.5)),
+])
+def test_parse_tolerant(response, expected):
+    assert parse_score(response) == (*expected, "recovered")
+
+
+@pytest.mark.parametrize("response", [
+    None, "", "   ", "没有评分标记", "[分析理由]r[评分]7", "评分：4/10", "评分1原因：答得不错", '{"score": 9}',
+])
+def test_parse_rejects(response):
+    assert parse_score(response) is None
+
+
+@pytest.fixture
+def structured(monkeypatch):
+    monkeypatch.setenv("OPENAI_STRUCTURED_SCORES", "1")
+    monkeypatch.setattr(stages, "_structured_unsupported", set())
+
+
+def test_structured_scoring_falls_back_to_text(structured):
+    rejected = openai.BadRequestError("response_format", response=httpx.Response(400, request=REQUEST), body=None)
+    client = FakeClient(rejected, ["[分析理由]好\n[评分]4"], ["[分析理由]好\n[评分]5"])
+    assert asyncio.run(stages.evaluate_answer(client, "答案", "gpt-4", "系统")) == (4.0, "好")
+    # 带 response_format 的请求被拒绝后改用文本格式，之后对该后端不再请求结构化输出
+    assert client.calls[0]["response_format"] == stages.SCORE_RESPONSE_FORMAT
+    assert client.calls[0]["messages"][0]["content"].endswith(stages.STRUCTURED_INSTRUCTION)
+    assert "response_format" not in client.calls[1]
+    asyncio.run(stages.evaluate_answer(client, "答案", "gpt-4", "系统"))
+    assert "response_format" not in client.calls[2]
+
+
+class StructuredRunner(FakeRunner):
+    # 带 response_format 的批处理请求都以 status 状态码失败
+    def __init__(self, rounds, status=400):
+        super().__init__(rounds)
+        self.status = status
+        self.errors = {}
+        self.client = FakeClient()
+
+    def complete(self, requests):
+        if any("response_format" in body for _, body, _ in requests):
+            self.errors = {custom_id: (self.status, "请求失败") for custom_id, _, _ in requests}
+            return {custom_id: None for custom_id, _, _ in requests}
+        return super().complete(requests)
+
+    complete_scores = batch.BatchRunner.complete_scores
+
+
+def test_batch_structured_scoring_falls_back_to_text(structured):
+    runner = StructuredRunner([{"q1": completion("[分析理由]好\n[评分]4")}])
+    scores = {}
+    batch.batch_evaluate(runner, [("q1", "答案")], "gpt-4", "系统", 1, scores.__setitem__)
+    assert scores == {"q1": (4.0, "好")}
+    assert not stages.structured_supported("http://backend.test/v1", "gpt-4")
+
+
+def test_batch_server_errors_keep_structured_scoring(structured):
+    # 5xx 等其他失败不说明后端不支持结构化输出，不重新提交，留待下次运行
+    runner = StructuredRunner([], status=500)
+    scores = {}
+    failed = batch.batch_evaluate(runner, [("q1", "答案")], "gpt-4", "系统", 1, scores.__setitem__)
+    assert scores == {} and list(failed) == ["q1"]
+    assert runner.submitted == []
+    assert stages.structured_supported("http://backend.test/v1", "gpt-4")
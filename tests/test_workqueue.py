@@ -0,0 +1,119 @@
+import json
+import time
+
+from evaluator_core import workqueue
+from evaluator_core.workqueue import WorkQueue
+
+
+def make_queue(tmp_path, count=3, **kwargs):
+    queue = WorkQueue(str(tmp_path / "queue.sqlite"), **kwargs)
+    queue.add_questions((f"q{i}", f"问题 {i}") for i in range(count))
+    return queue
+
+
+def states(queue, stage):
+    rows = queue._connect().execute("SELECT qid, state FROM items WHERE stage = ?", (stage,))
+    return dict(rows.fetchall())
+
+
+def test_add_questions_is_idempotent(tmp_path):
+    queue = make_queue(tmp_path)
+    assert queue.add_questions([("q0", "重复"), ("q9", "新问题")]) == 1
+    assert list(queue.questions()) == ["q0", "q1", "q2", "q9"]
+    assert queue.stats()["stages"] == {"answers": {"pending": 4}}
+
+
+def test_lease_expiry_and_requeue(tmp_path):
+    queue = make_queue(tmp_path, count=2)
+    leased = queue.lease("a", 10, lease_seconds=0.05)
+    assert sorted(item["qid"] for item in leased) == ["q0", "q1"]
+    assert leased[0]["question"].startswith("问题")
+    # 租约有效期内其他工作进程领不到
+    assert queue.lease("b", 10) == []
+    time.sleep(0.1)
+    # 过期后由其他工作进程接手
+    taken = queue.lease("b", 1)
+    assert len(taken) == 1
+    assert queue.requeue_expired() == 1
+    assert list(states(queue, "answers").values()).count("pending") == 1
+    # 原工作进程迟到的结果仍然有效，同一工作项只记一次
+    qid = taken[0]["qid"]
+    assert queue.complete("a", "answers", qid, "答案 a")
+    assert not queue.complete("b", "answers", qid, "答案 b")
+    assert queue.load_section("answers") == {qid: "答案 a"}
+
+
+def test_heartbeat_extends_lease(tmp_path):
+    queue = make_queue(tmp_path, count=1)
+    queue.register("a")
+    queue.lease("a", 1, lease_seconds=0.05)
+    queue.heartbeat("a", lease_seconds=60)
+    time.sleep(0.1)
+    assert queue.lease("b", 1) == []
+
+
+def test_fail_requeues_until_max_attempts(tmp_path):
+    queue = make_queue(tmp_path, count=1, max_attempts=2)
+    item, = queue.lease("a", 1)
+    queue.fail("a", "answers", item["qid"], "超时")
+    assert states(queue, "answers") == {"q0": "pending"}
+    queue.lease("a", 1)
+    queue.fail("a", "answers", "q0", "超时")
+    assert states(queue, "answers") == {"q0": "failed"}
+    assert queue.finished()
+    assert queue.retry_failed() == 1
+    assert states(queue, "answers") == {"q0": "pending"}
+
+
+def test_expired_leases_fail_after_max_attempts(tmp_path):
+    # 每次领取后都没有完成（例如工作进程崩溃）的工作项不会被无限次重新领取
+    queue = make_queue(tmp_path, count=1, max_attempts=2)
+    assert len(queue.lease("a", 1, lease_seconds=0.01)) == 1
+    time.sleep(0.02)
+    assert len(queue.lease("b", 1, lease_seconds=0.01)) == 1
+    time.sleep(0.02)
+    assert queue.lease("c", 1) == []
+    assert states(queue, "answers") == {"q0": "failed"}
+    assert queue.finished()
+
+
+def test_stage_progression_and_priority(tmp_path):
+    queue = make_queue(tmp_path, count=2)
+    for item in queue.lease("a", 10):
+        queue.complete("a", "answers", item["qid"], f"答案 {item['qid']}")
+    queue.add_questions([("q5", "后加入的问题")])
+    scores = queue.lease("a", 4)
+    assert {item["stage"] for item in scores} == {"scores1", "scores2"}
+    assert all(item["answer"] == f"答案 {item['qid']}" for item in scores)
+    for item in scores:
+        if item["qid"] == "q0":
+            queue.complete("a", item["stage"], "q0", {"score": 4.0, "reason": item["stage"]})
+    # 已经开始的问题优先：q0 的质检排在 q5 的回答之前
+    final, = queue.lease("a", 1)
+    assert (final["stage"], final["qid"]) == ("final_scores", "q0")
+    assert final["scores1"] == {"score": 4.0, "reason": "scores1"}
+    assert queue.lease("a", 1)[0]["qid"] == "q5"
+
+
+def test_lease_uses_priority_index(tmp_path):
+    queue = make_queue(tmp_path)
+    # 按阶段优先级领取工作项时走索引，不对整张表排序
+    plan = queue._connect().execute(
+        "EXPLAIN QUERY PLAN SELECT stage, qid FROM items WHERE state = 'pending' ORDER BY priority LIMIT 1"
+    ).fetchall()
+    assert "items_lease" in plan[0][-1]
+
+
+def test_run_worker(tmp_path, mock_server):
+    queue = make_queue(tmp_path, count=5)
+    completed = workqueue.run_worker(queue, "w1", concurrency=3, poll_interval=0.05, log=lambda message: None)
+    # 每个问题依次完成回答、两份评分和质检
+    assert completed == 20
+    assert queue.finished()
+    output = str(tmp_path / "merged.json")
+    workqueue.write_combined(output, queue.questions(), queue.load_section)
+    with open(output, encoding="utf-8") as f:
+        merged = json.load(f)
+    assert list(merged["answers"]) == [f"q{i}" for i in range(5)]
+    assert len(merged["final_evaluation"]["scores"]) == 5
+    assert queue.stats()["workers"][0]["completed"] == 20